@@ -486,6 +486,48 @@ def env() -> Mapping[str, Optional[str]]:
         #
         'AZUL_TDR_WORKERS': '1',
 
+        # The maximum combined size, in MiB, of the rows retrieved from TDR
+        # snapshots that are cached in memory by a Lambda function container,
+        # across invocations. Snapshots are immutable, so cached rows never go
+        # stale. The size of a row is estimated from the length of its values.
+        # Set to 0 to disable the cache.
+        #
+        'AZUL_TDR_ROW_CACHE_SIZE': '64',
+
+        # Whether to prefetch the rows needed for emulating all bundles in a
+        # partition of a TDR snapshot during a reindex (1 yes, 0 no). This
+        # trades many small BigQuery queries per bundle for a few large ones per
+        # partition. The rows are prefetched once per partition, by the
+        # invocation of the contribution Lambda function that lists the
+        # bundles in the partition, before it queues the notifications for
+        # them. The prefetched rows are saved to the storage bucket, from where
+        # each Lambda function container that fetches a bundle from the
+        # partition loads them into its row cache, once. The prefetch is
+        # limited to half of the time remaining in that invocation and to
+        # AZUL_TDR_ROW_CACHE_SIZE, and any rows not prefetched as a result are
+        # retrieved per bundle. The cache should be large enough to hold the
+        # rows of as many partitions as a container fetches bundles from
+        # concurrently, i.e., AZUL_CONTRIBUTION_BATCH_SIZE. A warning is logged
+        # when prefetched rows had to be evicted. Only the TDR/HCA repository
+        # plugin prefetches rows. The entities in an AnVIL bundle are found by
+        # a graph traversal that can't be restricted to a partition.
+        #
+        'AZUL_TDR_PREFETCH': '0',
+
+        # Whether to emulate AnVIL bundles by traversing an in-memory index of
+        # the links between all entities in a snapshot (1 yes, 0 no), instead
+        # of querying BigQuery once per level of the entity graph. The index is
+        # built with a few full-table scans when a reindex of a snapshot is
+        # started, outside of any Lambda function, and saved to the storage
+        # bucket. Each Lambda function container that emulates a bundle from
+        # the snapshot loads it from there, once. Indices larger than 16 MiB
+        # aren't saved, and the bundles from such snapshots, like those from
+        # snapshots without an index, are emulated with one query per level.
+        # Snapshots are immutable, so the index never goes stale. The rows of
+        # the entities in a bundle are still retrieved from BigQuery.
+        #
+        'AZUL_TDR_ANVIL_LINK_GRAPH': '0',
+
         # The number of times a deployment has been destroyed and rebuilt. Some
         # services used by Azul do not support the case of a resource being
         # recreated under the same name as a previous incarnation. The name of
@@ -598,6 +640,97 @@ def env() -> Mapping[str, Optional[str]]:
         'AZUL_CONTRIBUTION_CONCURRENCY': '64',
         'AZUL_AGGREGATION_CONCURRENCY': '64',
 
+        # The maximum number of notifications handled by a single invocation of
+        # the non-retry contribution Lambda function. With a value greater than
+        # 1, the bundles referenced by the notifications in a batch are fetched
+        # concurrently, their contributions and replicas are written using as
+        # few bulk requests as possible and a single tally is queued for each
+        # entity affected by any of the bundles. Notifications that fail are
+        # reported individually so that only they are redelivered. The retry
+        # contribution Lambda always handles one notification at a time.
+        #
+        'AZUL_CONTRIBUTION_BATCH_SIZE': '1',
+
+        # Set this variable to 1 to store the state of the accumulators used
+        # for an aggregate alongside that aggregate, so that subsequent
+        # contributions to the aggregated entity can be folded into that state
+        # instead of re-reading and re-aggregating all contributions. The full
+        # re-aggregation is still performed when a bundle is deleted or
+        # superseded by a newer version, and for entities whose aggregation
+        # involves accumulators that don't support saving their state.
+        # Changing this variable requires a reindex.
+        #
+        'AZUL_INCREMENTAL_AGGREGATION': '0',
+
+        # Set this variable to 1 to have the contribution Lambda functions
+        # stage tallies in a DynamoDB table instead of queueing them directly.
+        # Tallies for the same entity are merged in that table, and a scheduled
+        # Lambda function flushes it once a minute, queueing one consolidated
+        # tally per entity. During a reindex, this reduces the number of times
+        # an entity that many bundles contribute to, like a project, is
+        # aggregated, at the expense of up to a minute of added latency.
+        #
+        'AZUL_TALLY_BUFFER': '0',
+
+        # The estimated number of contributions above which the aggregation of
+        # an entity is deferred. The estimate is the number of contributions
+        # reflected in the entity's current aggregate plus its tally. Instead
+        # of aggregating such an entity right away, its tally is moved to a
+        # separate queue that delays it, giving further tallies for the same
+        # entity time to arrive. Tallies leaving that queue are consolidated per
+        # entity and returned to the tallies queue. Set to 0 to aggregate every
+        # entity right away.
+        #
+        'AZUL_DEFERRED_AGGREGATION_THRESHOLD': '0',
+
+        # The number of seconds by which the aggregation of an entity is
+        # deferred, see AZUL_DEFERRED_AGGREGATION_THRESHOLD. SQS limits this to
+        # 15 minutes. An entity whose tallies keep arriving may be deferred
+        # more than once, but never for more than three times this delay.
+        #
+        'AZUL_DEFERRED_AGGREGATION_DELAY': '300',
+
+        # The maximum number of slices in which a single invocation of the
+        # aggregation Lambda function reads the contributions to the entities
+        # it aggregates, and therefore the maximum number of concurrent
+        # requests it makes to Elasticsearch while doing so. Multiply by the
+        # aggregation concurrency to get the worst-case load on the cluster.
+        # Contributions are only read concurrently if there are more of them
+        # than fit on a single page. Set to 1 to always read serially.
+        #
+        'AZUL_CONTRIBUTION_READ_CONCURRENCY': '4',
+
+        # The maximum number of concurrent bulk requests with which the indexer
+        # writes documents to Elasticsearch. Documents are only written in bulk
+        # if there are enough of them. Set to 1 to send bulk requests serially.
+        #
+        'AZUL_ES_BULK_CONCURRENCY': '4',
+
+        # The maximum number of responses to search and summary requests whose
+        # aggregations, i.e., the facets and the summary, are cached in memory
+        # by a service Lambda function container, across invocations. Cached
+        # aggregations are invalidated whenever the aggregate index they were
+        # computed from changes. Set to 0 to disable the cache.
+        #
+        'AZUL_FACET_CACHE_SIZE': '256',
+
+        # Whether to share the aggregations cached by the service Lambda
+        # function containers via the storage bucket (1 yes, 0 no). This
+        # benefits cold containers at the expense of an S3 request for every
+        # aggregation not cached in memory. Has no effect if the in-memory cache
+        # is disabled via AZUL_FACET_CACHE_SIZE.
+        #
+        'AZUL_SHARED_FACET_CACHE': '0',
+
+        # Whether to count all hits matching a search request while retrieving
+        # a page of them (1 yes, 0 no). If 0, counting stops at 10000 hits. If
+        # there are more, the exact total is counted in a separate request
+        # whose result is cached along with the facets, and reused for other
+        # pages of the same search. With the facet cache disabled, the total
+        # is reported as a lower bound instead.
+        #
+        'AZUL_EXACT_TOTAL_HITS': '1',
+
         # Collect and monitor important health metrics of the deployment (1 yes, 0 no).
         # Typically only enabled on main deployments.
         #
@@ -53,6 +53,21 @@ emit({
                     "lambda_memory_size": 6500,
                     "lambda_timeout": config.aggregation_lambda_timeout(retry=True)
                 },
+                indexer.requeue_tallies.name: {
+                    # Few consumers see more deferred tallies for the same
+                    # entity in one batch. Lambda polls a standard queue with
+                    # five concurrent pollers, so fewer would cause throttles.
+                    "reserved_concurrency": 5,
+                    "lambda_memory_size": 256,
+                    "lambda_timeout": config.aggregation_lambda_timeout(retry=False)
+                },
+                indexer.flush_tallies.name: {
+                    # Flushes don't overlap, and a flush shouldn't take longer
+                    # than the interval between two consecutive flushes.
+                    "reserved_concurrency": 1,
+                    "lambda_memory_size": 256,
+                    "lambda_timeout": 60
+                },
                 indexer.update_health_cache.name: {
                     "lambda_memory_size": 128,
                     "lambda_timeout": config.health_cache_lambda_timeout
@@ -234,7 +234,7 @@ def update_health_cache(_event: chalice.app.CloudWatchEvent):
 @app.route(
     '/{catalog}/{action}',
     methods=['POST'],
-    method_spec={
+    method_spec=lambda: {
         'tags': ['Indexing'],
         'summary': 'Notify the indexer to perform an action on a bundle',
         'description': fd('''
@@ -308,10 +308,10 @@ def post_notification(catalog: CatalogName, action: str):
                   threshold=int(96000 / config.contribution_concurrency(retry=False)))
 @app.on_sqs_message(
     queue=config.notifications_queue_name(),
-    batch_size=1
+    batch_size=config.contribution_batch_size
 )
 def contribute(event: chalice.app.SQSEvent):
-    app.index_controller.contribute(event)
+    return app.index_controller.contribute(event)
 
 
 @app.metric_alarm(metric=LambdaMetric.errors,
@@ -326,6 +326,16 @@ def aggregate(event: chalice.app.SQSEvent):
     app.index_controller.aggregate(event)
 
 
+@app.metric_alarm(metric=LambdaMetric.errors,
+                  threshold=1,
+                  period=24 * 60 * 60)
+@app.metric_alarm(metric=LambdaMetric.throttles)
+@app.retry(num_retries=0)
+@app.schedule('rate(1 minute)')
+def flush_tallies(_event: chalice.app.CloudWatchEvent):
+    app.index_controller.flush_tallies()
+
+
 # Any messages in the tallies queue that fail being processed will be retried
 # with more RAM in the tallies_retry queue.
 
@@ -340,6 +350,23 @@ def aggregate_retry(event: chalice.app.SQSEvent):
     app.index_controller.aggregate(event, retry=True)
 
 
+# Tallies for entities that are expensive to aggregate are deferred to the
+# tallies_deferred queue, which delays them. The tallies are then consolidated
+# and returned to the tallies queue.
+
+@app.metric_alarm(metric=LambdaMetric.errors,
+                  threshold=1,
+                  period=24 * 60 * 60)
+@app.metric_alarm(metric=LambdaMetric.throttles)
+@app.on_sqs_message(
+    queue=config.deferred_tallies_queue_name(),
+    batch_size=IndexController.deferred_tally_batch_size,
+    maximum_batching_window_in_seconds=IndexController.deferred_tally_batching_window
+)
+def requeue_tallies(event: chalice.app.SQSEvent):
+    app.index_controller.requeue_deferred_tallies(event)
+
+
 # Any messages in the notifications queue that fail being processed will be
 # retried with more RAM and a longer timeout in the notifications_retry queue.
 
@@ -122,6 +122,7 @@ from azul.strings import (
 from azul.types import (
     AnyJSON,
     JSON,
+    JSONs,
     LambdaContext,
     MutableJSON,
     PrimitiveJSON,
@@ -232,7 +233,7 @@ spec = {
         # changes and reset the minor version to zero. Otherwise, increment only
         # the minor version for backwards compatible changes. A backwards
         # compatible change is one that does not require updates to clients.
-        'version': '9.2'
+        'version': '9.3'
     },
     'tags': [
         {
@@ -874,7 +875,7 @@ def get_integrations():
     '/index/catalogs',
     methods=['GET'],
     cors=True,
-    method_spec={
+    method_spec=lambda: {
         'summary': 'List all available catalogs.',
         'tags': ['Index'],
         'responses': {
@@ -905,26 +906,35 @@ def list_catalogs():
     return app.catalog_controller.list_catalogs()
 
 
-generic_object_spec = schema.object(additional_properties=True)
-array_of_object_spec = schema.array(generic_object_spec)
-hit_spec = schema.object(
-    additional_properties=True,
-    protocols=array_of_object_spec,
-    entryId=str,
-    sources=array_of_object_spec,
-    samples=array_of_object_spec,
-    specimens=array_of_object_spec,
-    cellLines=array_of_object_spec,
-    donorOrganisms=array_of_object_spec,
-    organoids=schema.array(str),
-    cellSuspensions=array_of_object_spec
-)
+def generic_object_spec() -> JSON:
+    return schema.object(additional_properties=True)
 
-page_spec = schema.object(
-    hits=schema.array(hit_spec),
-    pagination=generic_object_spec,
-    termFacets=generic_object_spec
-)
+
+def array_of_object_spec() -> JSON:
+    return schema.array(generic_object_spec())
+
+
+def hit_spec() -> JSON:
+    return schema.object(
+        additional_properties=True,
+        protocols=array_of_object_spec(),
+        entryId=str,
+        sources=array_of_object_spec(),
+        samples=array_of_object_spec(),
+        specimens=array_of_object_spec(),
+        cellLines=array_of_object_spec(),
+        donorOrganisms=array_of_object_spec(),
+        organoids=schema.array(str),
+        cellSuspensions=array_of_object_spec()
+    )
+
+
+def page_spec() -> JSON:
+    return schema.object(
+        hits=schema.array(hit_spec()),
+        pagination=generic_object_spec(),
+        termFacets=generic_object_spec()
+    )
 
 
 def _filter_schema(field_type: FieldType) -> JSON:
@@ -943,66 +953,68 @@ def _filter_schema(field_type: FieldType) -> JSON:
         return {'oneOf': list(map(filter_schema, relations))}
 
 
-types = app.repository_controller.field_types(app.catalog)
+def filters_param_spec() -> JSON:
+    types = app.repository_controller.field_types(app.catalog)
+    return params.query(
+        'filters',
+        schema.optional(application_json(schema.object_type(
+            default='{}',
+            example={'cellCount': {'within': [[10000, 1000000000]]}},
+            properties={
+                field: _filter_schema(types[field])
+                for field in app.fields
+            }
+        ))),
+        description=fd('''
+            Criteria to filter entities from the search results.
+
+            Each filter consists of a field name, a relation (relational operator),
+            and an array of field values. The available relations are "is",
+            "within", "contains", and "intersects". Multiple filters are combined
+            using "and" logic. An entity must match all filters to be included in
+            the response. How multiple field values within a single filter are
+            combined depends on the relation.
+
+            For the "is" relation, multiple values are combined using "or" logic.
+            For example, `{"fileFormat": {"is": ["fastq", "fastq.gz"]}}` selects
+            entities where the file format is either "fastq" or "fastq.gz". For the
+            "within", "intersects", and "contains" relations, the field values must
+            come in nested pairs specifying upper and lower bounds, and multiple
+            pairs are combined using "and" logic. For example, `{"donorCount":
+            {"within": [[1,5], [5,10]]}}` selects entities whose donor organism
+            count falls within both ranges, i.e., is exactly 5.
+
+            The accessions field supports filtering for a specific accession and/or
+            namespace within a project. For example, `{"accessions": {"is": [
+            {"namespace":"array_express"}]}}` will filter for projects that have an
+            `array_express` accession. Similarly, `{"accessions": {"is": [
+            {"accession":"ERP112843"}]}}` will filter for projects that have the
+            accession `ERP112843` while `{"accessions": {"is": [
+            {"namespace":"array_express", "accession": "E-AAAA-00"}]}}` will filter
+            for projects that match both values.
+
+            The organismAge field is special in that it contains two property keys:
+            value and unit. For example, `{"organismAge": {"is": [{"value": "20",
+            "unit": "year"}]}}`. Both keys are required. `{"organismAge": {"is":
+            [null]}}` selects entities that have no organism age.''' + f'''
+
+            Supported field names are: {', '.join(app.fields)}
+        ''')
+    )
 
-filters_param_spec = params.query(
-    'filters',
-    schema.optional(application_json(schema.object_type(
-        default='{}',
-        example={'cellCount': {'within': [[10000, 1000000000]]}},
-        properties={
-            field: _filter_schema(types[field])
-            for field in app.fields
-        }
-    ))),
-    description=fd('''
-        Criteria to filter entities from the search results.
-
-        Each filter consists of a field name, a relation (relational operator),
-        and an array of field values. The available relations are "is",
-        "within", "contains", and "intersects". Multiple filters are combined
-        using "and" logic. An entity must match all filters to be included in
-        the response. How multiple field values within a single filter are
-        combined depends on the relation.
-
-        For the "is" relation, multiple values are combined using "or" logic.
-        For example, `{"fileFormat": {"is": ["fastq", "fastq.gz"]}}` selects
-        entities where the file format is either "fastq" or "fastq.gz". For the
-        "within", "intersects", and "contains" relations, the field values must
-        come in nested pairs specifying upper and lower bounds, and multiple
-        pairs are combined using "and" logic. For example, `{"donorCount":
-        {"within": [[1,5], [5,10]]}}` selects entities whose donor organism
-        count falls within both ranges, i.e., is exactly 5.
-
-        The accessions field supports filtering for a specific accession and/or
-        namespace within a project. For example, `{"accessions": {"is": [
-        {"namespace":"array_express"}]}}` will filter for projects that have an
-        `array_express` accession. Similarly, `{"accessions": {"is": [
-        {"accession":"ERP112843"}]}}` will filter for projects that have the
-        accession `ERP112843` while `{"accessions": {"is": [
-        {"namespace":"array_express", "accession": "E-AAAA-00"}]}}` will filter
-        for projects that match both values.
-
-        The organismAge field is special in that it contains two property keys:
-        value and unit. For example, `{"organismAge": {"is": [{"value": "20",
-        "unit": "year"}]}}`. Both keys are required. `{"organismAge": {"is":
-        [null]}}` selects entities that have no organism age.''' + f'''
-
-        Supported field names are: {', '.join(app.fields)}
-    ''')
-)
 
-catalog_param_spec = params.query(
-    'catalog',
-    schema.optional(schema.with_default(app.catalog,
-                                        type_=schema.enum(*config.catalogs))),
-    description='The name of the catalog to query.')
+def catalog_param_spec() -> JSON:
+    return params.query(
+        'catalog',
+        schema.optional(schema.with_default(app.catalog,
+                                            type_=schema.enum(*config.catalogs))),
+        description='The name of the catalog to query.')
 
 
 def repository_search_params_spec():
     return [
-        catalog_param_spec,
-        filters_param_spec,
+        catalog_param_spec(),
+        filters_param_spec(),
         params.path(
             'entity_type',
             schema.enum(*app.metadata_plugin.exposed_indices.keys()),
@@ -1101,7 +1113,9 @@ def repository_search_spec(*, post: bool):
                     and total number of pages, as well as user-supplied search
                     parameters for page size and sorting behavior. It also
                     provides links for navigating forwards and backwards between
-                    pages of results.
+                    pages of results. If the `approximate` property is present
+                    and true, the total number of hits and pages are lower
+                    bounds.
 
                     The `termFacets` section tabulates the occurrence of unique
                     values within nested fields of the `hits` section across all
@@ -1111,7 +1125,7 @@ def repository_search_spec(*, post: bool):
                     Not every nested field is tabulated, but the set of
                     tabulated fields is consistent between entity types.
                 '''),
-                **responses.json_content(page_spec)
+                **responses.json_content(page_spec())
             }
         }
     }
@@ -1123,7 +1137,7 @@ def repository_id_spec():
         'summary': 'Detailed information on a particular entity.',
         'tags': ['Index'],
         'parameters': [
-            catalog_param_spec,
+            catalog_param_spec(),
             params.path('entity_type', str, description='The type of the desired entity'),
             params.path('entity_id', str, description='The UUID of the desired entity')
         ],
@@ -1151,7 +1165,7 @@ def repository_id_spec():
                     (the field `sampleEntityType` can be used to discriminate
                     between these cases).
                 '''),
-                **responses.json_content(hit_spec)
+                **responses.json_content(hit_spec())
             }
         }
     }
@@ -1181,16 +1195,17 @@ def repository_head_search_spec():
     }
 
 
-repository_summary_spec = {
-    'tags': ['Index'],
-    'parameters': [catalog_param_spec, filters_param_spec]
-}
+def repository_summary_spec() -> JSON:
+    return {
+        'tags': ['Index'],
+        'parameters': [catalog_param_spec(), filters_param_spec()]
+    }
 
 
 @app.route(
     '/index/{entity_type}',
     methods=['GET'],
-    method_spec=repository_search_spec(post=False),
+    method_spec=lambda: repository_search_spec(post=False),
     cors=True
 )
 # FIXME: Properly document the POST version of /index
@@ -1199,19 +1214,19 @@ repository_summary_spec = {
     '/index/{entity_type}',
     methods=['POST'],
     content_types=['application/json'],
-    method_spec=repository_search_spec(post=True),
+    method_spec=lambda: repository_search_spec(post=True),
     cors=True
 )
 @app.route(
     '/index/{entity_type}',
     methods=['HEAD'],
-    method_spec=repository_head_search_spec(),
+    method_spec=repository_head_search_spec,
     cors=True
 )
 @app.route(
     '/index/{entity_type}/{entity_id}',
     methods=['GET'],
-    method_spec=repository_id_spec(),
+    method_spec=repository_id_spec,
     cors=True
 )
 def repository_search(entity_type: str, entity_id: Optional[str] = None) -> JSON:
@@ -1244,7 +1259,7 @@ def _hoist_parameters(query_params, request):
     '/index/summary',
     methods=['GET'],
     cors=True,
-    method_spec={
+    method_spec=lambda: {
         'summary': 'Statistics on the data present across all entities.',
         'responses': {
             '200': {
@@ -1271,8 +1286,8 @@ def _hoist_parameters(query_params, request):
                         additional_properties=True,
                         organTypes=schema.array(str),
                         totalFileSize=float,
-                        fileTypeSummaries=array_of_object_spec,
-                        cellCountSummaries=array_of_object_spec,
+                        fileTypeSummaries=array_of_object_spec(),
+                        cellCountSummaries=array_of_object_spec(),
                         donorCount=int,
                         fileCount=int,
                         labCount=int,
@@ -1283,15 +1298,15 @@ def _hoist_parameters(query_params, request):
                 )
             }
         },
-        **repository_summary_spec
+        **repository_summary_spec()
     }
 )
 @app.route(
     '/index/summary',
     methods=['HEAD'],
-    method_spec={
+    method_spec=lambda: {
         **repository_head_spec(for_summary=True),
-        **repository_summary_spec
+        **repository_summary_spec()
     }
 )
 def get_summary():
@@ -1322,14 +1337,14 @@ def manifest_route(*, fetch: bool, initiate: bool):
         methods=['PUT' if initiate else 'GET'],
         interactive=fetch,
         cors=True,
-        path_spec=None if initiate else {
+        path_spec=None if initiate else lambda: {
             'parameters': [
                 params.path('token', str, description=fd('''
                     An opaque string representing the manifest preparation job
                 '''))
             ]
         },
-        method_spec={
+        method_spec=lambda: {
             'tags': ['Manifests'],
             'summary':
                 (
@@ -1408,8 +1423,8 @@ def manifest_route(*, fetch: bool, initiate: bool):
                 [1]: #operations-Manifests-get_manifest_files
             '''),
             'parameters': [
-                catalog_param_spec,
-                filters_param_spec,
+                catalog_param_spec(),
+                filters_param_spec(),
                 params.query(
                     'format',
                     schema.optional(
@@ -1629,80 +1644,83 @@ def generate_manifest(event: AnyJSON, _context: LambdaContext):
     return app.manifest_controller.get_manifest(event)
 
 
-file_fqid_parameters_spec = [
-    params.path(
-        'file_uuid',
-        str,
-        description='The UUID of the file to be returned.'),
-    params.query(
-        'version',
-        schema.optional(str),
-        description=fd('''
-            The version of the file to be returned. File versions are opaque
-            strings with only one documented property: they can be
-            lexicographically compared with each other in order to determine
-            which version is more recent. If this parameter is omitted then the
-            most recent version of the file is returned.
-        ''')
-    )
-]
-
-repository_files_spec = {
-    'tags': ['Repository'],
-    'parameters': [
-        catalog_param_spec,
-        *file_fqid_parameters_spec,
-        params.query(
-            'fileName',
-            schema.optional(str),
-            description=fd('''
-                The desired name of the file. The given value will be included
-                in the Content-Disposition header of the response. If absent, a
-                best effort to determine the file name from metadata will be
-                made. If that fails, the UUID of the file will be used instead.
-            ''')
-        ),
-        params.query(
-            'wait',
-            schema.optional(int),
-            description=fd('''
-                If 0, the client is responsible for honoring the waiting period
-                specified in the Retry-After response header. If 1, the server
-                will delay the response in order to consume as much of that
-                waiting period as possible. This parameter should only be set to
-                1 by clients who can't honor the `Retry-After` header,
-                preventing them from quickly exhausting the maximum number of
-                redirects. If the server cannot wait the full amount, any amount
-                of wait time left will still be returned in the Retry-After
-                header of the response.
-            ''')
-        ),
+def file_fqid_parameters_spec() -> JSONs:
+    return [
+        params.path(
+            'file_uuid',
+            str,
+            description='The UUID of the file to be returned.'),
         params.query(
-            'replica',
+            'version',
             schema.optional(str),
             description=fd('''
-                If the underlying repository offers multiple replicas of the
-                requested file, use the specified replica. Otherwise, this
-                parameter is ignored. If absent, the only replica — for
-                repositories that don't support replication — or the default
-                replica — for those that do — will be used.
+                The version of the file to be returned. File versions are opaque
+                strings with only one documented property: they can be
+                lexicographically compared with each other in order to determine
+                which version is more recent. If this parameter is omitted then the
+                most recent version of the file is returned.
             ''')
-        ),
-        params.query(
-            'requestIndex',
-            schema.optional(int),
-            description='Do not use. Reserved for internal purposes.'
-        ),
-        params.query(
-            'drsUri',
-            schema.optional(str),
-            description='Do not use. Reserved for internal purposes.'
-        ),
-        params.query('token',
-                     schema.optional(str),
-                     description='Reserved. Do not pass explicitly.')
+        )
     ]
-}
+
+
+def repository_files_spec() -> JSON:
+    return {
+        'tags': ['Repository'],
+        'parameters': [
+            catalog_param_spec(),
+            *file_fqid_parameters_spec(),
+            params.query(
+                'fileName',
+                schema.optional(str),
+                description=fd('''
+                    The desired name of the file. The given value will be included
+                    in the Content-Disposition header of the response. If absent, a
+                    best effort to determine the file name from metadata will be
+                    made. If that fails, the UUID of the file will be used instead.
+                ''')
+            ),
+            params.query(
+                'wait',
+                schema.optional(int),
+                description=fd('''
+                    If 0, the client is responsible for honoring the waiting period
+                    specified in the Retry-After response header. If 1, the server
+                    will delay the response in order to consume as much of that
+                    waiting period as possible. This parameter should only be set to
+                    1 by clients who can't honor the `Retry-After` header,
+                    preventing them from quickly exhausting the maximum number of
+                    redirects. If the server cannot wait the full amount, any amount
+                    of wait time left will still be returned in the Retry-After
+                    header of the response.
+                ''')
+            ),
+            params.query(
+                'replica',
+                schema.optional(str),
+                description=fd('''
+                    If the underlying repository offers multiple replicas of the
+                    requested file, use the specified replica. Otherwise, this
+                    parameter is ignored. If absent, the only replica — for
+                    repositories that don't support replication — or the default
+                    replica — for those that do — will be used.
+                ''')
+            ),
+            params.query(
+                'requestIndex',
+                schema.optional(int),
+                description='Do not use. Reserved for internal purposes.'
+            ),
+            params.query(
+                'drsUri',
+                schema.optional(str),
+                description='Do not use. Reserved for internal purposes.'
+            ),
+            params.query('token',
+                         schema.optional(str),
+                         description='Reserved. Do not pass explicitly.')
+        ]
+    }
 
 
 @app.route(
@@ -1710,8 +1728,8 @@ repository_files_spec = {
     methods=['GET'],
     interactive=False,
     cors=True,
-    method_spec={
-        **repository_files_spec,
+    method_spec=lambda: {
+        **repository_files_spec(),
         'summary': 'Redirect to a URL for downloading a given data file from the '
                    'underlying repository',
         'description': fd('''
@@ -1777,8 +1795,8 @@ def repository_files(file_uuid: str) -> Response:
     '/fetch/repository/files/{file_uuid}',
     methods=['GET'],
     cors=True,
-    method_spec={
-        **repository_files_spec,
+    method_spec=lambda: {
+        **repository_files_spec(),
         'summary': 'Request a URL for downloading a given data file',
         'responses': {
             '200': {
@@ -1863,10 +1881,10 @@ def _repository_files(file_uuid: str, fetch: bool) -> MutableJSON:
     '/repository/sources',
     methods=['GET'],
     cors=True,
-    method_spec={
+    method_spec=lambda: {
         'summary': 'List available data sources',
         'tags': ['Repository'],
-        'parameters': [catalog_param_spec],
+        'parameters': [catalog_param_spec()],
         'responses': {
             '200': {
                 'description': fd('''
@@ -1915,14 +1933,14 @@ drs_spec_description = fd('''
     methods=['GET'],
     enabled=config.is_dss_enabled(),
     cors=True,
-    method_spec={
+    method_spec=lambda: {
         'summary': 'Get file DRS object',
         'tags': ['DRS'],
         'description': fd('''
             This endpoint returns object metadata, and a list of access methods
             that can be used to fetch object bytes.
         ''') + drs_spec_description,
-        'parameters': file_fqid_parameters_spec,
+        'parameters': file_fqid_parameters_spec(),
         'responses': {
             '200': {
                 'description': fd(
@@ -1963,7 +1981,7 @@ def get_data_object(file_uuid):
     methods=['GET'],
     enabled=config.is_dss_enabled(),
     cors=True,
-    method_spec={
+    method_spec=lambda: {
         'summary': 'Get a file with an access ID',
         'description': fd('''
             This endpoint returns a URL that can be used to fetch the bytes of a
@@ -1977,7 +1995,7 @@ def get_data_object(file_uuid):
             time for the DSS to do a checkout.
         ''') + drs_spec_description,
         'parameters': [
-            *file_fqid_parameters_spec,
+            *file_fqid_parameters_spec(),
             params.path('access_id', str, description='Access ID returned from a previous request')
         ],
         'responses': {
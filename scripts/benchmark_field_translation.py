@@ -0,0 +1,132 @@
+"""
+Compare the performance of the generic, interpreting field translation in
+`Document.translate_fields` with that of the compiled `FieldTranslator`, using
+the contributions derived from the canned HCA bundles.
+"""
+import argparse
+import json
+import logging
+from pathlib import (
+    Path,
+)
+import sys
+import time
+from typing import (
+    Callable,
+    Iterator,
+)
+
+from azul import (
+    config,
+)
+from azul.indexer.document import (
+    Document,
+)
+from azul.indexer.index_service import (
+    IndexService,
+)
+from azul.logging import (
+    configure_script_logging,
+)
+from azul.plugins.repository.dss import (
+    DSSBundle,
+    DSSBundleFQID,
+    DSSSourceRef,
+)
+from azul.types import (
+    JSON,
+    JSONs,
+)
+
+log = logging.getLogger(__name__)
+
+canning_suffix = '.' + DSSBundle.canning_qualifier() + '.json'
+
+# Canned bundles whose file name lacks a version are loaded with this one
+#
+default_version = '2018-11-02T11:33:44.698028Z'
+
+
+def main(argv):
+    hca_catalogs = [
+        catalog.name
+        for catalog in config.catalogs.values()
+        if catalog.plugins['metadata'].name == 'hca'
+    ]
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog',
+                        metavar='NAME',
+                        default=hca_catalogs[0] if hca_catalogs else None,
+                        choices=hca_catalogs,
+                        help='The name of the HCA catalog whose field types to use.')
+    parser.add_argument('--repeat',
+                        metavar='N',
+                        type=int,
+                        default=5,
+                        help='The number of times to repeat each measurement. '
+                             'The fastest repetition is reported.')
+    args = parser.parse_args(argv)
+    catalog = args.catalog
+    if catalog is None:
+        parser.error('No HCA catalog is configured in the selected deployment')
+
+    index_service = IndexService()
+    docs = list(load_documents(index_service, catalog))
+    log.info('Loaded %i documents from canned bundles', len(docs))
+
+    field_types = index_service.catalogued_field_types()[catalog]
+    translator = index_service.field_translator(catalog)
+    indexed_docs = list(map(translator.to_index, docs))
+    assert indexed_docs == [
+        Document.translate_fields(doc, field_types, forward=True)
+        for doc in docs
+    ]
+
+    def generic(doc, forward):
+        return Document.translate_fields(doc, field_types, forward=forward)
+
+    for direction, forward, inputs, compiled in [
+        ('to_index', True, docs, translator.to_index),
+        ('from_index', False, indexed_docs, translator.from_index)
+    ]:
+        generic_time = measure(inputs, lambda doc: generic(doc, forward), args.repeat)
+        compiled_time = measure(inputs, compiled, args.repeat)
+        log.info('%s: generic %.3fs, compiled %.3fs, speedup %.2fx',
+                 direction, generic_time, compiled_time, generic_time / compiled_time)
+
+
+def load_documents(index_service: IndexService, catalog: str) -> Iterator[JSON]:
+    source = DSSSourceRef.for_dss_source('https://fake_dss_instance/v1:/2')
+    data_path = Path(config.project_root) / 'test' / 'indexer' / 'data'
+    for path in sorted(data_path.glob('*' + canning_suffix)):
+        uuid, _, version = path.name.removesuffix(canning_suffix).partition('.')
+        fqid = DSSBundleFQID(source=source,
+                             uuid=uuid,
+                             version=version or default_version)
+        with open(path) as f:
+            bundle = DSSBundle.from_json(fqid, json.load(f))
+        try:
+            results = list(index_service.deep_transform(catalog, bundle, delete=False))
+        except Exception:
+            log.warning('Skipping bundle %r that failed to transform',
+                        path.name, exc_info=True)
+        else:
+            for contributions, _ in results:
+                for contribution in contributions:
+                    yield contribution.to_json()
+
+
+def measure(docs: JSONs, translate: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            translate(doc)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    configure_script_logging(log)
+    main(sys.argv[1:])
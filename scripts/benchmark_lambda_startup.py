@@ -0,0 +1,98 @@
+"""
+Measure the cost of a cold start of the service and indexer Lambda functions,
+i.e., the time it takes to import the application module and the peak resident
+set size (RSS) of the process afterwards. Each measurement is taken in a fresh
+Python interpreter. The time it takes to build the OpenAPI spec of the
+application is measured separately, since it is only incurred on the first
+request for the spec and not during a cold start.
+"""
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import sys
+import time
+
+from azul.logging import (
+    configure_script_logging,
+)
+from azul.modules import (
+    load_app_module,
+)
+from azul.types import (
+    JSON,
+)
+
+log = logging.getLogger(__name__)
+
+lambda_names = ['service', 'indexer']
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lambdas',
+                        metavar='NAME',
+                        nargs='+',
+                        default=lambda_names,
+                        choices=lambda_names,
+                        help='The names of the Lambda functions to measure.')
+    parser.add_argument('--repeat',
+                        metavar='N',
+                        type=int,
+                        default=5,
+                        help='The number of times to repeat each measurement. '
+                             'The fastest repetition is reported.')
+    parser.add_argument('--measure',
+                        metavar='NAME',
+                        choices=lambda_names,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure is None:
+        for lambda_name in args.lambdas:
+            results = [measure_in_subprocess(lambda_name) for _ in range(args.repeat)]
+            result = min(results, key=lambda result: result['import_time'])
+            log.info('%s: import %.0fms, peak RSS %.1f MiB; '
+                     'spec %.0fms, peak RSS %.1f MiB',
+                     lambda_name,
+                     result['import_time'] * 1000,
+                     result['import_rss'] / 1024,
+                     result['spec_time'] * 1000,
+                     result['spec_rss'] / 1024)
+    else:
+        json.dump(measure(args.measure), sys.stdout)
+
+
+def measure_in_subprocess(lambda_name: str) -> JSON:
+    process = subprocess.run([sys.executable, __file__, '--measure', lambda_name],
+                             check=True,
+                             stdout=subprocess.PIPE)
+    return json.loads(process.stdout)
+
+
+def measure(lambda_name: str) -> JSON:
+    start = time.perf_counter()
+    app_module = load_app_module(lambda_name)
+    import_time = time.perf_counter() - start
+    import_rss = peak_rss()
+    start = time.perf_counter()
+    app_module.app.spec()
+    spec_time = time.perf_counter() - start
+    return dict(import_time=import_time,
+                import_rss=import_rss,
+                spec_time=spec_time,
+                spec_rss=peak_rss())
+
+
+def peak_rss() -> int:
+    """
+    The peak RSS of the current process in KiB
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    configure_script_logging(log)
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+"""
+Measure the rate at which the compact and curl manifest generators turn a page
+of hits into manifest rows. A page of file documents is read from the index of
+the selected catalog in the current deployment and repeated until it is large
+enough, so that the measurement excludes the time spent in Elasticsearch.
+"""
+import argparse
+from io import (
+    StringIO,
+)
+import logging
+import sys
+import time
+
+from elasticsearch_dsl.response import (
+    Response,
+)
+from furl import (
+    furl,
+)
+
+from azul import (
+    config,
+    mutable_furl,
+)
+from azul.logging import (
+    configure_script_logging,
+)
+from azul.plugins import (
+    ManifestFormat,
+    RepositoryPlugin,
+)
+from azul.service import (
+    Filters,
+)
+from azul.service.manifest_service import (
+    ManifestGenerator,
+    ManifestPartition,
+    ManifestService,
+    PagedManifestGenerator,
+)
+from azul.service.storage_service import (
+    StorageService,
+)
+
+log = logging.getLogger(__name__)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog',
+                        metavar='NAME',
+                        default=config.default_catalog,
+                        choices=config.catalogs,
+                        help='The name of the catalog to read the documents from.')
+    parser.add_argument('--hits',
+                        metavar='N',
+                        type=int,
+                        default=10_000,
+                        help='The number of hits in the synthetic page.')
+    parser.add_argument('--repeat',
+                        metavar='N',
+                        type=int,
+                        default=5,
+                        help='The number of times to repeat each measurement. '
+                             'The fastest repetition is reported.')
+    args = parser.parse_args(argv)
+    catalog = args.catalog
+
+    service = ManifestService(StorageService(), file_url)
+    plugin = RepositoryPlugin.load(catalog).create(catalog)
+    filters = Filters(explicit={}, source_ids=plugin.list_source_ids(None))
+    for format in [ManifestFormat.compact, ManifestFormat.curl]:
+        generator_cls = ManifestGenerator.cls_for_format(format)
+        assert issubclass(generator_cls, PagedManifestGenerator), generator_cls
+        generator = generator_cls(service, catalog, filters)
+        page = generator._fetch_page(None)
+        response = synthetic_page(page, args.hits)
+        partition = ManifestPartition.first().first_page()
+        times = []
+        size = 0
+        for _ in range(args.repeat):
+            output = StringIO()
+            start = time.perf_counter()
+            generator.write_page_to(partition, response, output)
+            times.append(time.perf_counter() - start)
+            size = output.tell()
+        seconds = min(times)
+        log.info('%s: %i hits in %.3fs, %.0f hits/s, %.1f MiB/s',
+                 format.value, args.hits, seconds, args.hits / seconds,
+                 size / seconds / 1024 / 1024)
+
+
+def synthetic_page(page: Response, num_hits: int) -> Response:
+    response = page.to_dict()
+    hits = response['hits']['hits']
+    if not hits:
+        raise RuntimeError('The index contains no file documents')
+    hits = (hits * -(-num_hits // len(hits)))[:num_hits]
+    response = {**response, 'hits': {**response['hits'], 'hits': hits}}
+    # noinspection PyProtectedMember
+    return Response(page._search, response)
+
+
+def file_url(*, catalog: str, file_uuid: str, fetch: bool = True, **params) -> mutable_furl:
+    path = ['repository', 'files', file_uuid]
+    if fetch:
+        path.insert(0, 'fetch')
+    return furl(config.service_endpoint, path=path, args=dict(catalog=catalog, **params))
+
+
+if __name__ == '__main__':
+    configure_script_logging(log)
+    main(sys.argv[1:])
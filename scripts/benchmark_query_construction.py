@@ -0,0 +1,165 @@
+"""
+Measure the time it takes to prepare and serialize the Elasticsearch request
+for a page of search results, including the facets, with a filter on every
+facet that supports one. The measurement is repeated with the query clauses
+rebuilt for every facet, as they were before `FilterStage` memoized them. No
+requests are sent to Elasticsearch.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import (
+    Callable,
+)
+from unittest.mock import (
+    patch,
+)
+
+from azul import (
+    config,
+)
+from azul.indexer.document import (
+    Nested,
+)
+from azul.logging import (
+    configure_script_logging,
+)
+from azul.service import (
+    Filters,
+)
+from azul.service.elasticsearch_service import (
+    FilterStage,
+    ToDictStage,
+)
+from azul.service.repository_service import (
+    RepositoryService,
+)
+from azul.types import (
+    reify,
+)
+
+log = logging.getLogger(__name__)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog',
+                        metavar='NAME',
+                        default=config.default_catalog,
+                        choices=config.catalogs,
+                        help='The name of the catalog whose plugin to use.')
+    parser.add_argument('--entity-type',
+                        metavar='NAME',
+                        default='files',
+                        help='The entity type to search for.')
+    parser.add_argument('--values',
+                        metavar='N',
+                        type=int,
+                        default=100,
+                        help='The number of values in each filter.')
+    parser.add_argument('--iterations',
+                        metavar='N',
+                        type=int,
+                        default=100,
+                        help='The number of requests to prepare per measurement.')
+    parser.add_argument('--repeat',
+                        metavar='N',
+                        type=int,
+                        default=5,
+                        help='The number of times to repeat each measurement. '
+                             'The fastest repetition is reported.')
+    args = parser.parse_args(argv)
+    catalog, entity_type = args.catalog, args.entity_type
+
+    service = RepositoryService()
+    plugin = service.metadata_plugin(catalog)
+    filters = Filters(explicit=explicit_filters(service, catalog, args.values),
+                      source_ids={f'source-{i}' for i in range(args.values)})
+    log.info('Filtering by %i of %i facets, with %i values each',
+             len(filters.explicit), len(plugin.facets), args.values)
+
+    def prepare() -> int:
+        chain = service.create_chain(catalog=catalog,
+                                     entity_type=entity_type,
+                                     filters=filters,
+                                     post_filter=True,
+                                     document_slice=None)
+        chain = ToDictStage(service=service,
+                            catalog=catalog,
+                            entity_type=entity_type).wrap(chain)
+        chain = plugin.aggregation_stage.create_and_wrap(chain)
+        request = chain.prepare_request(service.create_request(catalog, entity_type))
+        return len(json.dumps(request.to_dict()))
+
+    size = prepare()
+    memoized = measure(prepare, args.iterations, args.repeat)
+    with patch.object(FilterStage, 'prepare_query', rebuilding_prepare_query()):
+        assert prepare() == size
+        rebuilt = measure(prepare, args.iterations, args.repeat)
+    log.info('%.1f KiB per request: rebuilt %.2fms, memoized %.2fms, speedup %.2fx',
+             size / 1024,
+             rebuilt / args.iterations * 1000,
+             memoized / args.iterations * 1000,
+             rebuilt / memoized)
+
+
+def explicit_filters(service: RepositoryService, catalog: str, num_values: int):
+    plugin = service.metadata_plugin(catalog)
+    special_fields = plugin.special_fields
+    filters = {}
+    for facet in plugin.facets:
+        if facet in (special_fields.source_id, special_fields.accessible):
+            continue
+        field_type = service.field_type(catalog, plugin.field_mapping[facet])
+        if isinstance(field_type, Nested):
+            continue
+        native_types = reify(field_type.native_type)
+        if not isinstance(native_types, tuple):
+            native_types = (native_types,)
+        if bool in native_types:
+            values = [False, True]
+        elif str in native_types:
+            values = [f'value-{i}' for i in range(num_values)]
+        elif int in native_types:
+            values = list(range(num_values))
+        else:
+            continue
+        values = [None, *values]
+        try:
+            field_type.filter('is', values)
+        except Exception:
+            # For example, a string field that only accepts timestamps
+            continue
+        filters[facet] = {'is': values}
+    return filters
+
+
+def rebuilding_prepare_query() -> Callable:
+    prepare_query = FilterStage.prepare_query
+
+    def wrapper(self, *args, **kwargs):
+        # noinspection PyUnresolvedReferences
+        type(self)._clauses.fdel(self)
+        # noinspection PyUnresolvedReferences
+        type(self)._queries.fdel(self)
+        return prepare_query(self, *args, **kwargs)
+
+    return wrapper
+
+
+def measure(f: Callable[[], int], iterations: int, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    configure_script_logging(log)
+    main(sys.argv[1:])
@@ -59,6 +59,16 @@ parser.add_argument('--local',
                          'query partition is processed independently and remotely by the indexer lambda. The index '
                          'Lambda function queries the repository for each partition and queues a notification for each '
                          'matching subgraph in the partition.')
+parser.add_argument('--in-process',
+                    default=False,
+                    action='store_true',
+                    help='Implies --local. Instead of invoking the indexer notification endpoint, fetch and '
+                         'transform the subgraphs in a pool of worker processes, write the resulting documents '
+                         'directly to Elasticsearch and aggregate every affected entity once at the end. Neither '
+                         'the indexer Lambda functions nor any of the queues are involved. The --workers option '
+                         'limits the number of concurrent writes. This is intended for bulk-loading a fresh '
+                         'catalog and for benchmarking the indexer against a local Elasticsearch instance. The '
+                         'throughput is logged at the end.')
 parser.add_argument('--catalogs',
                     nargs='+',
                     metavar='NAME',
@@ -131,6 +141,9 @@ def main(argv: list[str]):
 
     azul = AzulClient(num_workers=args.num_workers)
 
+    if args.in_process:
+        args.local = True
+
     source_globs = set(args.sources)
     if not args.local or args.deindex:
         sources_by_catalog = defaultdict(set)
@@ -187,14 +200,16 @@ def main(argv: list[str]):
                 ):
                     reservation = BigQueryReservation()
                     reservation.activate()
-                if args.local:
+                if args.in_process:
+                    azul.in_process_reindex(catalog, args.prefix)
+                elif args.local:
                     num_notifications += azul.local_reindex(catalog, args.prefix)
                 else:
                     azul.remote_reindex(catalog, sources)
                     num_notifications = None
             else:
                 log.info('Skipping catalog %r (no matching sources)', catalog)
-        if args.wait:
+        if args.wait and not args.in_process:
             if num_notifications == 0:
                 log.warning('No notifications for prefix %r and catalogs %r were sent',
                             args.prefix, args.catalogs)
@@ -403,6 +403,23 @@ class Config:
     def num_tdr_workers(self) -> int:
         return int(self.environ['AZUL_TDR_WORKERS'])
 
+    @property
+    def tdr_row_cache_size(self) -> int:
+        """
+        The maximum combined size of cached TDR rows, in bytes
+        """
+        size = int(self.environ['AZUL_TDR_ROW_CACHE_SIZE'])
+        require(size >= 0, 'AZUL_TDR_ROW_CACHE_SIZE must not be negative', size)
+        return size * 1024 * 1024
+
+    @property
+    def tdr_prefetch(self) -> bool:
+        return self._boolean(self.environ['AZUL_TDR_PREFETCH'])
+
+    @property
+    def tdr_anvil_link_graph(self) -> bool:
+        return self._boolean(self.environ['AZUL_TDR_ANVIL_LINK_GRAPH'])
+
     @property
     def external_lambda_role_assumptors(self) -> dict[str, list[str]]:
         try:
@@ -1356,6 +1373,89 @@ class Config:
     def aggregation_concurrency(self, *, retry: bool) -> int:
         return self._concurrency(self.environ['AZUL_AGGREGATION_CONCURRENCY'], retry)
 
+    @property
+    def contribution_batch_size(self) -> int:
+        """
+        The maximum number of notifications handled by a single invocation of
+        the non-retry contribution Lambda function.
+        """
+        batch_size = int(self.environ['AZUL_CONTRIBUTION_BATCH_SIZE'])
+        # SQS limits the batch size to 10 unless a batching window is used
+        require(1 <= batch_size <= 10,
+                'AZUL_CONTRIBUTION_BATCH_SIZE must be between 1 and 10', batch_size)
+        return batch_size
+
+    @property
+    def incremental_aggregation(self) -> bool:
+        return self._boolean(self.environ['AZUL_INCREMENTAL_AGGREGATION'])
+
+    @property
+    def tally_buffer(self) -> bool:
+        return self._boolean(self.environ['AZUL_TALLY_BUFFER'])
+
+    @property
+    def deferred_aggregation_threshold(self) -> int:
+        """
+        The estimated number of contributions above which the aggregation of an
+        entity is deferred, or 0 if aggregation is never deferred.
+        """
+        threshold = int(self.environ['AZUL_DEFERRED_AGGREGATION_THRESHOLD'])
+        require(threshold >= 0,
+                'AZUL_DEFERRED_AGGREGATION_THRESHOLD must not be negative', threshold)
+        return threshold
+
+    @property
+    def deferred_aggregation_delay(self) -> int:
+        """
+        The number of seconds by which the aggregation of an entity is deferred
+        """
+        delay = int(self.environ['AZUL_DEFERRED_AGGREGATION_DELAY'])
+        # SQS limits the delay of a queue to 15 minutes
+        require(0 <= delay <= 15 * 60,
+                'AZUL_DEFERRED_AGGREGATION_DELAY must be between 0 and 900', delay)
+        return delay
+
+    @property
+    def contribution_read_concurrency(self) -> int:
+        """
+        The maximum number of concurrent requests with which a single
+        invocation of the aggregation Lambda function reads contributions.
+        """
+        concurrency = int(self.environ['AZUL_CONTRIBUTION_READ_CONCURRENCY'])
+        # The default connection pool of the ES client holds 10 connections
+        require(1 <= concurrency <= 10,
+                'AZUL_CONTRIBUTION_READ_CONCURRENCY must be between 1 and 10', concurrency)
+        return concurrency
+
+    @property
+    def facet_cache_size(self) -> int:
+        """
+        The maximum number of cached responses to search and summary requests
+        """
+        size = int(self.environ['AZUL_FACET_CACHE_SIZE'])
+        require(size >= 0, 'AZUL_FACET_CACHE_SIZE must not be negative', size)
+        return size
+
+    @property
+    def shared_facet_cache(self) -> bool:
+        return self._boolean(self.environ['AZUL_SHARED_FACET_CACHE'])
+
+    @property
+    def exact_total_hits(self) -> bool:
+        return self._boolean(self.environ['AZUL_EXACT_TOTAL_HITS'])
+
+    @property
+    def es_bulk_concurrency(self) -> int:
+        """
+        The maximum number of concurrent bulk requests with which the indexer
+        writes documents.
+        """
+        concurrency = int(self.environ['AZUL_ES_BULK_CONCURRENCY'])
+        # The default connection pool of the ES client holds 10 connections
+        require(1 <= concurrency <= 10,
+                'AZUL_ES_BULK_CONCURRENCY must be between 1 and 10', concurrency)
+        return concurrency
+
     @property
     def bigquery_reserved_slots(self) -> int:
         """
@@ -1385,6 +1485,12 @@ class Config:
     def unqual_tallies_queue_name(self, *, retry=False, fail=False):
         return self._unqual_queue_name('tallies', retry, fail)
 
+    def deferred_tallies_queue_name(self) -> str:
+        return self.qualified_resource_name(self.unqual_deferred_tallies_queue_name())
+
+    def unqual_deferred_tallies_queue_name(self) -> str:
+        return 'tallies_deferred'
+
     def _unqual_queue_name(self, basename: str, retry: bool, fail: bool) -> str:
         parts = [basename]
         if fail:
@@ -1408,9 +1514,12 @@ class Config:
     @property
     def work_queue_names(self) -> list[str]:
         return [
-            queue_name(retry=retry)
-            for queue_name in (self.notifications_queue_name, self.tallies_queue_name)
-            for retry in (False, True)
+            *(
+                queue_name(retry=retry)
+                for queue_name in (self.notifications_queue_name, self.tallies_queue_name)
+                for retry in (False, True)
+            ),
+            self.deferred_tallies_queue_name()
         ]
 
     url_shortener_whitelist = [
@@ -1475,6 +1584,10 @@ class Config:
     def dynamo_sources_cache_table_name(self) -> str:
         return self.qualified_resource_name('sources_cache_by_auth')
 
+    @property
+    def dynamo_tally_buffer_table_name(self) -> str:
+        return self.qualified_resource_name('tally_buffer')
+
     @property
     def current_sources(self) -> list[str]:
         sources = self.environ.get('azul_current_sources', '*')
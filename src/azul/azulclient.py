@@ -67,6 +67,10 @@ from azul.plugins import (
 from azul.queues import (
     Queues,
 )
+from azul.time import (
+    RemainingTime,
+    SpecificRemainingTime,
+)
 from azul.types import (
     JSON,
 )
@@ -128,6 +132,26 @@ class AzulClient(SignatureHelper, HasCachedHttpClient):
         self.index(catalog, notifications)
         return len(notifications)
 
+    def in_process_reindex(self, catalog: CatalogName, prefix: str) -> int:
+        """
+        Index all bundles matching the given prefix in every source of the
+        given catalog, in this process, and return the number of bundles
+        indexed. Unlike :meth:`local_reindex`, this doesn't involve the indexer
+        endpoint or any of the queues.
+        """
+        bundle_fqids = [
+            bundle_fqid
+            for source in self.catalog_sources(catalog)
+            for bundle_fqid in self.list_bundles(catalog, source, prefix)
+        ]
+        # All AnVIL bundles and entities use the same version
+        if not config.is_anvil_enabled(catalog):
+            bundle_fqids = self.filter_obsolete_bundle_versions(bundle_fqids)
+        self.index_service.bulk_index(catalog,
+                                      (bundle_fqid.to_json() for bundle_fqid in bundle_fqids),
+                                      num_writers=self.num_workers)
+        return len(bundle_fqids)
+
     def index(self,
               catalog: CatalogName,
               notifications: Iterable[JSON],
@@ -246,6 +270,7 @@ class AzulClient(SignatureHelper, HasCachedHttpClient):
         for source in sources:
             source = plugin.resolve_source(source)
             source = plugin.partition_source(catalog, source)
+            plugin.prefetch_source(source)
 
             def message(partition_prefix: str) -> JSON:
                 log.info('Remotely reindexing prefix %r of source %r into catalog %r',
@@ -260,14 +285,18 @@ class AzulClient(SignatureHelper, HasCachedHttpClient):
                 ]
                 self.notifications_queue.send_messages(Entries=entries)
 
-    def remote_reindex_partition(self, message: JSON) -> None:
+    def remote_reindex_partition(self,
+                                 message: JSON,
+                                 remaining_time: RemainingTime
+                                 ) -> None:
         catalog = message['catalog']
         prefix = message['prefix']
         # FIXME: Adopt `trycast` for casting JSON to TypeDict
         #        https://github.com/DataBiosphere/azul/issues/5171
         source = cast(SourceJSON, message['source'])
         validate_uuid_prefix(prefix)
-        source = self.repository_plugin(catalog).source_from_json(source)
+        plugin = self.repository_plugin(catalog)
+        source = plugin.source_from_json(source)
         bundle_fqids = self.list_bundles(catalog, source, prefix)
         # All AnVIL bundles and entities use the same version
         if not config.is_anvil_enabled(catalog):
@@ -275,6 +304,12 @@ class AzulClient(SignatureHelper, HasCachedHttpClient):
             log.info('After filtering obsolete versions, '
                      '%i bundles remain in prefix %r of source %r in catalog %r',
                      len(bundle_fqids), prefix, str(source.spec), catalog)
+        # The prefetch must complete before the notifications are queued, so
+        # that the bundles are fetched with the prefetched rows. Half of the
+        # remaining time is reserved for queueing the notifications.
+        plugin.prefetch_partition(source,
+                                  prefix,
+                                  SpecificRemainingTime(remaining_time.get() / 2))
         messages = (
             self.bundle_message(catalog, bundle_fqid)
             for bundle_fqid in bundle_fqids
@@ -473,8 +508,8 @@ class AzulClient(SignatureHelper, HasCachedHttpClient):
 
         :param create_indices: whether to create the indexes at the end.
         """
-        work_queues = self.queues.get_queues(config.work_queue_names)
         if purge_queues:
+            work_queues = self.queues.get_queues(config.work_queue_names)
             log.info('Disabling lambdas ...')
             self.queues.manage_lambdas(work_queues, enable=False)
             log.info('Purging queues: %s', ', '.join(work_queues.keys()))
@@ -1,3 +1,9 @@
+from collections import (
+    OrderedDict,
+)
+from concurrent.futures import (
+    Future,
+)
 from contextlib import (
     contextmanager,
 )
@@ -6,8 +12,16 @@ from functools import (
     wraps,
 )
 from threading import (
+    Lock,
     get_ident,
 )
+import time
+from typing import (
+    Callable,
+    Generic,
+    Optional,
+    TypeVar,
+)
 
 
 def lru_cache_per_thread(maxsize=128, typed=False):
@@ -211,3 +225,178 @@ class CachedProperty(object):
                 self.fdel(obj)
             else:
                 self.fset(obj, val)
+
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A thread-safe cache of at most the given number of entries. When the cache
+    is full, adding an entry evicts the least recently used one. If a time to
+    live is given, entries expire that many seconds after they were added.
+
+    >>> c = LRUCache(maxsize=2)
+    >>> c.put('a', 1)
+    >>> c.put('b', 2)
+    >>> c.get('a')
+    1
+
+    Because 'a' was used more recently than 'b', adding a third entry evicts
+    'b':
+
+    >>> c.put('c', 3)
+    >>> c.get('b') is None
+    True
+    >>> c.get('a'), c.get('c'), len(c)
+    (1, 3, 2)
+
+    An entry can be removed explicitly …
+
+    >>> c.pop('a')
+    1
+    >>> c.get('a') is None
+    True
+
+    … or by expiring:
+
+    >>> now = 0.0
+    >>> c = LRUCache(maxsize=2, ttl=10, clock=lambda: now)
+    >>> c.put('a', 1)
+    >>> now = 9.0
+    >>> c.get('a')
+    1
+    >>> now = 10.0
+    >>> c.get('a', 'expired')
+    'expired'
+    >>> len(c)
+    0
+    """
+
+    def __init__(self,
+                 maxsize: int,
+                 ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        assert maxsize > 0, maxsize
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[K, tuple[V, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            try:
+                value, expiration = self._entries[key]
+            except KeyError:
+                return default
+            if expiration <= self.clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        expiration = float('inf') if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = value, expiration
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            try:
+                value, _ = self._entries.pop(key)
+            except KeyError:
+                return default
+            else:
+                return value
+
+    def __len__(self) -> int:
+        with self._lock:
+            now = self.clock()
+            expired = [k for k, (_, expiration) in self._entries.items() if expiration <= now]
+            for key in expired:
+                del self._entries[key]
+            return len(self._entries)
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Coalesces concurrent invocations of a function for the same key. The first
+    thread to request a key invokes the function, any other thread requesting
+    the same key while that invocation is in progress waits for and shares its
+    outcome, be it a return value or an exception. Nothing is cached beyond
+    the duration of the invocation.
+
+    >>> f = SingleFlight()
+    >>> f.do('a', lambda: 42)
+    42
+
+    >>> f.do('a', lambda: 1 / 0)
+    Traceback (most recent call last):
+    ...
+    ZeroDivisionError: division by zero
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> from threading import Event
+    >>> from itertools import count
+    >>> i, started, release = count(), Event(), Event()
+    >>> def slow():
+    ...     started.set()
+    ...     release.wait()
+    ...     return next(i)
+    >>> with ThreadPoolExecutor(max_workers=2) as tpe:
+    ...     leader = tpe.submit(f.do, 'a', slow)
+    ...     _ = started.wait()
+    ...     follower = tpe.submit(f.do, 'a', slow)
+    ...     while f.waiting('a') == 0: pass
+    ...     release.set()
+    ...     leader.result(), follower.result()
+    (0, 0)
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: dict[K, tuple[Future, list[int]]] = {}
+
+    def do(self, key: K, f: Callable[[], V]) -> V:
+        with self._lock:
+            try:
+                future, waiting = self._calls[key]
+            except KeyError:
+                future, waiting = Future(), [0]
+                self._calls[key] = future, waiting
+                leader = True
+            else:
+                waiting[0] += 1
+                leader = False
+        if leader:
+            try:
+                result = f()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    del self._calls[key]
+        else:
+            return future.result()
+
+    def waiting(self, key: K) -> int:
+        """
+        The number of threads waiting for the invocation in progress for the
+        given key.
+        """
+        with self._lock:
+            try:
+                _, waiting = self._calls[key]
+            except KeyError:
+                return 0
+            else:
+                return waiting[0]
@@ -17,11 +17,13 @@ import os
 import pathlib
 from typing import (
     Any,
+    Callable,
     Iterator,
     Optional,
     Self,
     Type,
     TypeVar,
+    Union,
 )
 from urllib.parse import (
     unquote,
@@ -47,6 +49,7 @@ from furl import (
 )
 
 from azul import (
+    cached_property,
     config,
     mutable_furl,
     open_resource,
@@ -73,6 +76,12 @@ from azul.types import (
 
 log = logging.getLogger(__name__)
 
+#: An OpenAPI spec fragment or a callable returning one. Building the spec
+#: fragments for every route can be expensive and is only needed when the
+#: OpenAPI document is requested, which is rare compared to how often Lambda
+#: functions start cold, so a callable is only invoked on first use of the spec.
+LazyJSON = Union[JSON, Callable[[], JSON]]
+
 
 class AzulRequest(Request):
     """
@@ -122,18 +131,21 @@ class AzulChaliceApp(Chalice):
                  app_name: str,
                  app_module_path: str,
                  unit_test: bool = False,
-                 spec: Optional[JSON] = None):
+                 spec: Optional[LazyJSON] = None):
         self._patch_event_source_handler()
         assert app_module_path.endswith('/app.py'), app_module_path
         self.app_module_path = app_module_path
         self.unit_test = unit_test
         self.non_interactive_routes: set[tuple[str, str]] = set()
-        if spec is not None:
+        if spec is not None and not callable(spec):
             assert 'paths' not in spec, 'The top-level spec must not define paths'
-            self._specs: Optional[MutableJSON] = copy_json(spec)
-            self._specs['paths'] = {}
-        else:
-            self._specs: Optional[MutableJSON] = None
+            spec = copy_json(spec)
+        self._spec = spec
+        self._route_specs: list[tuple[str, Optional[LazyJSON], Optional[LazyJSON], Iterable[str]]] = []
+        #: The paths for which a path spec was registered
+        self._spec_paths: set[str] = set()
+        #: The paths and lower-case methods for which a method spec was registered
+        self._spec_methods: set[tuple[str, str]] = set()
         super().__init__(app_name, debug=config.debug > 0, configure_logs=False)
         # Middleware is invoked in order of registration
         self.register_middleware(self._logging_middleware, 'http')
@@ -230,8 +242,8 @@ class AzulChaliceApp(Chalice):
               enabled: bool = True,
               interactive: bool = True,
               cache_control: str = 'no-store',
-              path_spec: Optional[JSON] = None,
-              method_spec: Optional[JSON] = None,
+              path_spec: Optional[LazyJSON] = None,
+              method_spec: Optional[LazyJSON] = None,
               **kwargs):
         """
         Decorates a view handler function in a Chalice application.
@@ -261,6 +273,10 @@ class AzulChaliceApp(Chalice):
                             https://github.com/OAI/OpenAPI-Specification/blob/master/versions/3.0.3.md#operationObject
                             This should be specified for every `@app.route`
                             invocation.
+
+        Either spec argument may also be a callable without parameters that
+        returns the spec. The callable will be invoked when the OpenAPI spec of
+        the application is first used, not when the route is registered.
         """
         if enabled:
             if not interactive:
@@ -271,19 +287,67 @@ class AzulChaliceApp(Chalice):
 
             def decorator(view_func):
                 view_func.cache_control = cache_control
-                self._register_spec(path, path_spec, method_spec, methods)
+                self._check_route_spec(path, path_spec, method_spec, methods)
+                self._route_specs.append((path, path_spec, method_spec, methods))
                 return chalice_decorator(view_func)
 
             return decorator
         else:
             return lambda view_func: view_func
 
+    def _check_route_spec(self,
+                          path: str,
+                          path_spec: Optional[LazyJSON],
+                          method_spec: Optional[LazyJSON],
+                          methods: Iterable[str]):
+        """
+        Reject duplicate specs for a route when it is registered, before
+        Chalice gets to see the route and without invoking any callables.
+        Conflicts between a method spec and the methods defined by a path spec
+        can only be detected when the spec is built.
+        """
+        if path_spec is not None:
+            assert path not in self._spec_paths, 'Only specify path_spec once per route path'
+            self._spec_paths.add(path)
+        if method_spec is not None:
+            keys = {(path, method.lower()) for method in methods}
+            assert self._spec_methods.isdisjoint(keys), \
+                'Only specify method_spec once per route path and method'
+            self._spec_methods.update(keys)
+
     def test_route(self, *args, **kwargs):
         """
         A route that's only enabled during unit tests.
         """
         return self.route(*args, enabled=self.unit_test, **kwargs)
 
+    @cached_property
+    def _specs(self) -> Optional[MutableJSON]:
+        """
+        The OpenAPI spec of the application, with the specs of all routes
+        registered so far. Accessing this property invokes any callables
+        passed for the top-level spec or the spec of a route.
+        """
+        spec = self._spec
+        if spec is None:
+            return None
+        # The callables may depend on properties like `catalog` that are
+        # derived from the current request. The spec must not depend on the
+        # request it is first used by, so the callables are invoked as if there
+        # was no request, just like they would be at import time.
+        request, self.current_request = self.current_request, None
+        try:
+            if callable(spec):
+                spec = spec()
+                assert 'paths' not in spec, 'The top-level spec must not define paths'
+                spec = copy_json(spec)
+            spec['paths'] = {}
+            for path, path_spec, method_spec, methods in self._route_specs:
+                self._register_spec(spec, path, path_spec, method_spec, methods)
+        finally:
+            self.current_request = request
+        return spec
+
     def spec(self) -> JSON:
         """
         Return the final OpenAPI spec, stripping out unused tags.
@@ -344,27 +408,33 @@ class AzulChaliceApp(Chalice):
         return self_url
 
     def _register_spec(self,
+                       spec: MutableJSON,
                        path: str,
-                       path_spec: Optional[JSON],
-                       method_spec: Optional[JSON],
+                       path_spec: Optional[LazyJSON],
+                       method_spec: Optional[LazyJSON],
                        methods: Iterable[str]):
         """
-        Add a route's specifications to the specification object.
+        Add a route's specifications to the given specification object.
         """
+        paths = spec['paths']
         if path_spec is not None:
-            assert path not in self._specs['paths'], 'Only specify path_spec once per route path'
-            self._specs['paths'][path] = copy_json(path_spec)
+            assert path not in paths, 'Only specify path_spec once per route path'
+            if callable(path_spec):
+                path_spec = path_spec()
+            paths[path] = copy_json(path_spec)
 
         if method_spec is not None:
+            if callable(method_spec):
+                method_spec = method_spec()
             for method in methods:
                 # OpenAPI requires HTTP method names be lower case
                 method = method.lower()
                 # This may override duplicate specs from path_specs
-                if path not in self._specs['paths']:
-                    self._specs['paths'][path] = {}
-                assert method not in self._specs['paths'][path], \
+                if path not in paths:
+                    paths[path] = {}
+                assert method not in paths[path], \
                     'Only specify method_spec once per route path and method'
-                self._specs['paths'][path][method] = copy_json(method_spec)
+                paths[path][method] = copy_json(method_spec)
 
     class _LogJSONEncoder(JSONEncoder):
 
@@ -234,8 +234,12 @@ class Health:
             'up': True,
             'unindexed_bundles': sum(self.queues[config.notifications_queue_name()].get('messages', {}).values()),
             'unindexed_documents': sum(chain.from_iterable(
-                self.queues[config.tallies_queue_name(retry=retry)].get('messages', {}).values()
-                for retry in (False, True)
+                self.queues[queue_name].get('messages', {}).values()
+                for queue_name in [
+                    config.tallies_queue_name(),
+                    config.tallies_queue_name(retry=True),
+                    config.deferred_tallies_queue_name()
+                ]
             ))
         }
 
@@ -6,6 +6,7 @@ from collections import (
     Counter,
     defaultdict,
 )
+import json
 import logging
 from typing import (
     Any,
@@ -24,6 +25,7 @@ from azul.json_freeze import (
     thaw,
 )
 from azul.types import (
+    AnyJSON,
     JSON,
     JSONs,
 )
@@ -33,12 +35,58 @@ log = logging.getLogger(__name__)
 Entities = JSONs
 
 
+class NotMergeable(Exception):
+    """
+    Raised when the state of an accumulator or aggregator cannot be saved, and
+    therefore cannot be merged with additional values at a later time.
+    """
+
+
 class Accumulator(metaclass=ABCMeta):
     """
     Accumulates multiple values into a single value, not necessarily of the same
     type.
+
+    Accumulators whose value does not depend on the order in which values are
+    accumulated may support saving their state as JSON and restoring it in a
+    fresh instance, allowing more values to be accumulated incrementally. An
+    accumulator that discards values once it reaches its maximum size retains
+    the first values it was given, so its value does depend on that order once
+    the maximum is reached, and its state can't be saved from then on. The
+    same goes for an accumulator whose state has grown too large to be worth
+    saving.
+
+    >>> a = SetAccumulator()
+    >>> a.accumulate(['x', 'y'])
+    True
+    >>> state = a.get_state()
+    >>> state
+    ['x', 'y']
+    >>> b = SetAccumulator()
+    >>> b.set_state(state)
+    >>> b.accumulate('z')
+    True
+    >>> b.get()
+    ['x', 'y', 'z']
+
+    >>> LastValueAccumulator().get_state()
+    Traceback (most recent call last):
+    ...
+    azul.indexer.aggregate.NotMergeable: LastValueAccumulator
+
+    >>> a = SetAccumulator(max_size=2)
+    >>> a.accumulate(['x', 'y'])
+    True
+    >>> a.get_state()
+    Traceback (most recent call last):
+    ...
+    azul.indexer.aggregate.NotMergeable: ('SetAccumulator', 'full')
     """
 
+    #: The maximum number of elements in the state of an accumulator without a
+    #: maximum size. Larger states are not saved.
+    max_state_size = 1000
+
     @abstractmethod
     def accumulate(self, value):
         """
@@ -53,6 +101,36 @@ class Accumulator(metaclass=ABCMeta):
         """
         raise NotImplementedError
 
+    def get_state(self) -> AnyJSON:
+        """
+        Return the state of this accumulator as JSON. Passing the return value
+        to :meth:`set_state` of a new, identically configured accumulator makes
+        that accumulator equivalent to this one.
+
+        :raise NotMergeable: if this accumulator does not support saving its
+                             state
+        """
+        raise NotMergeable(type(self).__name__)
+
+    def set_state(self, state: AnyJSON) -> None:
+        """
+        Restore the state of this accumulator from the return value of a prior
+        invocation of :meth:`get_state` on an identically configured instance.
+        """
+        raise NotMergeable(type(self).__name__)
+
+    def _check_state_size(self, size: int, max_size: Optional[int]) -> None:
+        """
+        Raise NotMergeable if a collection of the given size is too large to be
+        saved as the state of this accumulator. A collection that reached the
+        given maximum size may have discarded values, and is therefore too
+        large, too.
+        """
+        if max_size is not None and size >= max_size:
+            raise NotMergeable(type(self).__name__, 'full')
+        elif size > self.max_state_size:
+            raise NotMergeable(type(self).__name__, 'too large')
+
 
 class SumAccumulator(Accumulator):
     """
@@ -82,6 +160,12 @@ class SumAccumulator(Accumulator):
     def get(self):
         return self.value
 
+    def get_state(self) -> AnyJSON:
+        return self.value
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = state
+
 
 class SetAccumulator(Accumulator):
     """
@@ -132,6 +216,15 @@ class SetAccumulator(Accumulator):
     def get(self) -> list[Any]:
         return sorted(self.value, key=self.key)
 
+    def get_state(self) -> AnyJSON:
+        self._check_state_size(len(self.value), self.max_size)
+        # Tuples, which are treated as scalars, are stored as lists and are
+        # converted back to tuples when the state is restored.
+        return thaw(self.get())
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = set(map(freeze, state))
+
 
 class ListAccumulator(Accumulator):
     """
@@ -154,6 +247,13 @@ class ListAccumulator(Accumulator):
     def get(self) -> list[Any]:
         return sorted(self.value)
 
+    def get_state(self) -> AnyJSON:
+        self._check_state_size(len(self.value), self.max_size)
+        return list(self.value)
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = list(state)
+
 
 class SetOfDictAccumulator(SetAccumulator):
     """
@@ -227,6 +327,13 @@ class DictAccumulator(Accumulator):
     def get(self):
         return sorted(self.value.values(), key=self.key)
 
+    def get_state(self) -> AnyJSON:
+        self._check_state_size(len(self.value), self.max_size)
+        return self.get()
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = {self.key(value): value for value in state}
+
 
 class FrequencySetAccumulator(Accumulator):
     """
@@ -259,6 +366,18 @@ class FrequencySetAccumulator(Accumulator):
     def get(self) -> list[Any]:
         return [item for item, count in self.value.most_common(self.max_size)]
 
+    def get_state(self) -> AnyJSON:
+        # The value retains all items, but orders items with the same count by
+        # when they were first accumulated.
+        counts = self.value.values()
+        if len(set(counts)) < len(counts):
+            raise NotMergeable(type(self).__name__, 'ambiguous')
+        self._check_state_size(len(self.value), None)
+        return [[thaw(item), count] for item, count in self.value.most_common()]
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = Counter({freeze(item): count for item, count in state})
+
 
 class LastValueAccumulator(Accumulator):
     """
@@ -290,6 +409,12 @@ class SingleValueAccumulator(LastValueAccumulator):
         elif self.value != value:
             raise ValueError('Conflicting values:', self.value, value)
 
+    def get_state(self) -> AnyJSON:
+        return self.value
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = state
+
 
 class OptionalValueAccumulator(LastValueAccumulator):
     """
@@ -303,6 +428,12 @@ class OptionalValueAccumulator(LastValueAccumulator):
         else:
             raise ValueError('Conflicting values:', self.value, value)
 
+    def get_state(self) -> AnyJSON:
+        return self.value
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = state
+
 
 class MandatoryValueAccumulator(OptionalValueAccumulator):
     """
@@ -336,6 +467,13 @@ class PriorityOptionalValueAccumulator(OptionalValueAccumulator):
         if self.priority == priority:
             super().accumulate(value)
 
+    def get_state(self) -> AnyJSON:
+        # The priorities aren't necessarily JSON
+        raise NotMergeable(type(self).__name__)
+
+    def set_state(self, state: AnyJSON) -> None:
+        raise NotMergeable(type(self).__name__)
+
 
 class MinAccumulator(LastValueAccumulator):
     """
@@ -346,6 +484,12 @@ class MinAccumulator(LastValueAccumulator):
         if value is not None and (self.value is None or value < self.value):
             super().accumulate(value)
 
+    def get_state(self) -> AnyJSON:
+        return self.value
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = state
+
 
 class MaxAccumulator(LastValueAccumulator):
     """
@@ -356,6 +500,12 @@ class MaxAccumulator(LastValueAccumulator):
         if value is not None and (self.value is None or value > self.value):
             super().accumulate(value)
 
+    def get_state(self) -> AnyJSON:
+        return self.value
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value = state
+
 
 class DistinctAccumulator(Accumulator):
     """
@@ -394,6 +544,16 @@ class DistinctAccumulator(Accumulator):
     def get(self):
         return self.value.get()
 
+    def get_state(self) -> AnyJSON:
+        return {
+            'keys': self.keys.get_state(),
+            'value': self.value.get_state()
+        }
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.keys.set_state(state['keys'])
+        self.value.set_state(state['value'])
+
 
 class UniqueValueCountAccumulator(Accumulator):
     """
@@ -414,6 +574,12 @@ class UniqueValueCountAccumulator(Accumulator):
         unique_items = self.value.get()
         return len(unique_items)
 
+    def get_state(self) -> AnyJSON:
+        return self.value.get_state()
+
+    def set_state(self, state: AnyJSON) -> None:
+        self.value.set_state(state)
+
 
 class EntityAggregator(metaclass=ABCMeta):
 
@@ -434,6 +600,24 @@ class EntityAggregator(metaclass=ABCMeta):
     def aggregate(self, entities: Entities) -> Entities:
         raise NotImplementedError
 
+    def merge(self,
+              state: Optional[AnyJSON],
+              entities: Entities
+              ) -> tuple[Entities, AnyJSON]:
+        """
+        Aggregate the given entities on top of the given state and return the
+        aggregated entities along with the new state. The state is the one
+        returned by a prior invocation of this method, or None for the first
+        invocation. Aggregating entities in several such invocations produces
+        the same entities as aggregating all of them at once using
+        :meth:`aggregate`, except, possibly, for the order of groups in a
+        grouping aggregator.
+
+        :raise NotMergeable: if this aggregator, or any of the accumulators it
+                             uses, does not support saving its state
+        """
+        raise NotMergeable(type(self).__name__)
+
 
 class SimpleAggregator(EntityAggregator):
 
@@ -441,13 +625,16 @@ class SimpleAggregator(EntityAggregator):
         aggregate = {}
         for entity in entities:
             self._accumulate(aggregate, entity)
-        return [
-            {
-                k: accumulator.get()
-                for k, accumulator in aggregate.items()
-                if accumulator is not None
-            }
-        ] if aggregate else []
+        return [self._get(aggregate)] if aggregate else []
+
+    def merge(self,
+              state: Optional[AnyJSON],
+              entities: Entities
+              ) -> tuple[Entities, AnyJSON]:
+        aggregate = {} if state is None else self._restore(state)
+        for entity in entities:
+            self._accumulate(aggregate, entity)
+        return [self._get(aggregate)] if aggregate else [], self._save(aggregate)
 
     def _accumulate(self,
                     aggregate: dict[str, Optional[Accumulator]],
@@ -463,6 +650,30 @@ class SimpleAggregator(EntityAggregator):
             if accumulator is not None:
                 accumulator.accumulate(value)
 
+    def _get(self, aggregate: dict[str, Optional[Accumulator]]) -> JSON:
+        return {
+            field: accumulator.get()
+            for field, accumulator in aggregate.items()
+            if accumulator is not None
+        }
+
+    def _save(self, aggregate: dict[str, Optional[Accumulator]]) -> JSON:
+        # Fields that aren't accumulated are retained so that the restored
+        # aggregate is indistinguishable from the saved one
+        return {
+            field: None if accumulator is None else accumulator.get_state()
+            for field, accumulator in aggregate.items()
+        }
+
+    def _restore(self, state: JSON) -> dict[str, Optional[Accumulator]]:
+        aggregate = {}
+        for field, field_state in state.items():
+            accumulator = self._accumulator(field)
+            if accumulator is not None:
+                accumulator.set_state(field_state)
+            aggregate[field] = accumulator
+        return aggregate
+
 
 class GroupingAggregator(SimpleAggregator):
 
@@ -472,14 +683,38 @@ class GroupingAggregator(SimpleAggregator):
             group_keys = self._group_keys(entity)
             aggregate = aggregates[group_keys]
             self._accumulate(aggregate, entity)
-        return [
-            {
-                field: accumulator.get()
-                for field, accumulator in aggregate.items()
-                if accumulator is not None
-            }
-            for aggregate in aggregates.values()
-        ]
+        return list(map(self._get, aggregates.values()))
+
+    def merge(self,
+              state: Optional[AnyJSON],
+              entities: Entities
+              ) -> tuple[Entities, AnyJSON]:
+        # The group keys aren't necessarily JSON so the state associates each
+        # group with a canonical string representation of its keys instead
+        aggregates: dict[str, dict[str, Optional[Accumulator]]] = defaultdict(dict)
+        if state is not None:
+            for group_keys, group_state in state:
+                aggregates[group_keys] = self._restore(group_state)
+        for entity in entities:
+            group_keys = self._encode_group_keys(self._group_keys(entity))
+            self._accumulate(aggregates[group_keys], entity)
+        return (
+            list(map(self._get, aggregates.values())),
+            [
+                [group_keys, self._save(aggregate)]
+                for group_keys, aggregate in aggregates.items()
+            ]
+        )
+
+    def _encode_group_keys(self, group_keys: tuple[Any, ...]) -> str:
+
+        def default(o):
+            if isinstance(o, (set, frozenset)):
+                return sorted(o, key=repr)
+            else:
+                raise TypeError(o)
+
+        return json.dumps(group_keys, default=default)
 
     @abstractmethod
     def _group_keys(self, entity) -> tuple[Any, ...]:
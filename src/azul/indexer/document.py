@@ -15,6 +15,7 @@ from enum import (
 import re
 import sys
 from typing import (
+    Callable,
     ClassVar,
     Generic,
     Optional,
@@ -1076,6 +1077,232 @@ FieldTypes1 = Union[Mapping[str, FieldTypes2], Sequence[FieldType], FieldType]
 FieldTypes = Mapping[str, FieldTypes1]
 CataloguedFieldTypes = Mapping[CatalogName, FieldTypes]
 
+Translator = Callable[[AnyJSON], AnyMutableJSON]
+
+
+class FieldTranslator:
+    """
+    Translates the field values in documents according to a given set of field
+    types, producing the same result as :meth:`Document.translate_fields`.
+    Instead of interpreting the field types while walking each document, the
+    field types are compiled, once per direction, into a tree of closures that
+    mirrors the shape of the field types. Translating a document then only
+    involves a single dictionary lookup per property.
+
+    >>> t = FieldTranslator({'a': null_str, 'b': null_int, 'c': {'d': null_bool}})
+    >>> doc = {'a': None, 'b': [], 'c': [{'d': True}, {'d': None}]}
+    >>> t.to_index(doc) == Document.translate_fields(doc, t.field_types, forward=True)
+    True
+
+    >>> t.to_index(doc) # doctest: +NORMALIZE_WHITESPACE
+    {'a': '~null',
+     'b': [9223372036854774784],
+     'b_': [],
+     'c': [{'d': 1}, {'d': 9223372036854774784}]}
+
+    >>> t.from_index(t.to_index(doc))
+    {'a': None, 'b': [None], 'c': [{'d': True}, {'d': None}]}
+
+    >>> t.to_index({'x': 1})
+    Traceback (most recent call last):
+    ...
+    KeyError: "Key 'x' not defined in field_types"
+
+    >>> t.from_index({'a': 'foo'}, allowed_paths=[('b',)])
+    Traceback (most recent call last):
+    ...
+    AssertionError: (('a',), [('b',)])
+    """
+
+    def __init__(self, field_types: FieldTypes):
+        self.field_types = field_types
+        self._translators: dict[tuple[bool, Optional[tuple[FieldPath, ...]]], Translator] = {
+            (forward, None): self._compile(field_types, forward=forward)
+            for forward in (True, False)
+        }
+
+    def to_index(self,
+                 doc: AnyJSON,
+                 allowed_paths: list[FieldPath] | None = None
+                 ) -> AnyMutableJSON:
+        """
+        Translate the given document for insert into Elasticsearch.
+
+        :param allowed_paths: See :meth:`Document.translate_fields`
+        """
+        return self._translator(True, allowed_paths)(doc)
+
+    def from_index(self,
+                   doc: AnyJSON,
+                   allowed_paths: list[FieldPath] | None = None
+                   ) -> AnyMutableJSON:
+        """
+        Translate the given document as retrieved from Elasticsearch.
+
+        :param allowed_paths: See :meth:`Document.translate_fields`
+        """
+        return self._translator(False, allowed_paths)(doc)
+
+    def _translator(self,
+                    forward: bool,
+                    allowed_paths: list[FieldPath] | None
+                    ) -> Translator:
+        # The translator for each distinct list of allowed paths is compiled on
+        # first use and reused thereafter.
+        key = forward, None if allowed_paths is None else tuple(allowed_paths)
+        try:
+            return self._translators[key]
+        except KeyError:
+            translator = self._compile(self.field_types,
+                                       forward=forward,
+                                       allowed_paths=allowed_paths)
+            self._translators[key] = translator
+            return translator
+
+    def _compile(self,
+                 field_types: Union[FieldType, FieldTypes],
+                 *,
+                 forward: bool,
+                 allowed_paths: list[FieldPath] | None = None,
+                 path: FieldPath = ()
+                 ) -> Translator:
+        if isinstance(field_types, dict):
+            return self._compile_object(field_types,
+                                        forward=forward,
+                                        allowed_paths=allowed_paths,
+                                        path=path)
+        else:
+            if isinstance(field_types, list):
+                # FIXME: Assert that a non-list field_type implies a non-list
+                #        doc (only possible for contributions).
+                #        https://github.com/DataBiosphere/azul/issues/2689
+                translate = self._compile_value(one(field_types),
+                                                forward=forward,
+                                                allowed_paths=allowed_paths,
+                                                path=path)
+
+                def translate_list(doc: AnyJSON) -> AnyMutableJSON:
+                    assert isinstance(doc, list), (doc, path)
+                    return translate(doc)
+
+                return translate_list
+            else:
+                return self._compile_value(field_types,
+                                           forward=forward,
+                                           allowed_paths=allowed_paths,
+                                           path=path)
+
+    def _compile_object(self,
+                        field_types: FieldTypes,
+                        *,
+                        forward: bool,
+                        allowed_paths: list[FieldPath] | None,
+                        path: FieldPath
+                        ) -> Translator:
+        # Properties whose name ends in an underscore are shadow copies. Such
+        # properties are skipped during translation, so there is no need to
+        # compile a translator for them.
+        translators = {
+            key: self._compile(field_type,
+                               forward=forward,
+                               allowed_paths=allowed_paths,
+                               path=(*path, key))
+            for key, field_type in field_types.items()
+            if not key.endswith('_')
+        }
+        shadowed = frozenset(
+            key
+            for key, field_type in field_types.items()
+            if forward and isinstance(field_type, FieldType) and field_type.shadowed
+        )
+
+        def translate(doc: AnyJSON) -> AnyMutableJSON:
+            if isinstance(doc, dict):
+                new_doc = {}
+                for key, val in doc.items():
+                    try:
+                        translator = translators[key]
+                    except KeyError:
+                        if key.endswith('_'):
+                            # Shadow copy fields should only be present during a
+                            # reverse translation and we skip over to remove them.
+                            assert not forward, path
+                            continue
+                        else:
+                            raise KeyError(f'Key {key!r} not defined in field_types')
+                    new_doc[key] = translator(val)
+                    if key in shadowed:
+                        # Add a non-translated shadow copy of this field's
+                        # numeric value for sum aggregations
+                        new_doc[key + '_'] = val
+                return new_doc
+            elif isinstance(doc, list):
+                return list(map(translate, doc))
+            else:
+                assert False, (path, type(doc))
+
+        return translate
+
+    def _compile_value(self,
+                       field_type: FieldType,
+                       *,
+                       forward: bool,
+                       allowed_paths: list[FieldPath] | None,
+                       path: FieldPath
+                       ) -> Translator:
+        assert isinstance(field_type, FieldType), (path, type(field_type))
+        if allowed_paths is not None:
+            # An allowed path may be a prefix instead of a complete path, as is
+            # the case for `contents.files.related_files`. Since the path of a
+            # value is known at compile time, so is the outcome of this check,
+            # but the check must only fail if the document actually contains a
+            # value at that path.
+            if path not in allowed_paths and path[:-1] not in allowed_paths:
+                def translate(_: AnyJSON) -> AnyMutableJSON:
+                    assert False, (path, allowed_paths)
+
+                return translate
+        if forward:
+            to_index = field_type.to_index
+            if type(field_type).to_index is PassThrough.to_index:
+                def translate(doc: AnyJSON) -> AnyMutableJSON:
+                    return list(doc) if isinstance(doc, list) else doc
+            elif field_type.allow_sorting_by_empty_lists:
+                def translate(doc: AnyJSON) -> AnyMutableJSON:
+                    if isinstance(doc, list):
+                        # See Document.translate_fields for why an empty list
+                        # is translated to a list containing a null substitute
+                        return list(map(to_index, doc)) if doc else [to_index(None)]
+                    else:
+                        return to_index(doc)
+            else:
+                def translate(doc: AnyJSON) -> AnyMutableJSON:
+                    if isinstance(doc, list):
+                        return list(map(to_index, doc))
+                    else:
+                        return to_index(doc)
+        else:
+            from_index = field_type.from_index
+            allow_empty = not field_type.allow_sorting_by_empty_lists
+            if type(field_type).from_index is PassThrough.from_index:
+                def translate(doc: AnyJSON) -> AnyMutableJSON:
+                    if isinstance(doc, list):
+                        assert doc or allow_empty
+                        return list(doc)
+                    else:
+                        return doc
+            else:
+                def translate(doc: AnyJSON) -> AnyMutableJSON:
+                    if isinstance(doc, list):
+                        assert doc or allow_empty
+                        return list(map(from_index, doc))
+                    else:
+                        return from_index(doc)
+        return translate
+
+
+CataloguedFieldTranslators = Mapping[CatalogName, FieldTranslator]
+
 
 class VersionType(Enum):
     # No versioning; document is created or overwritten as needed
@@ -1176,6 +1403,10 @@ class Document(Generic[C]):
 
         :return: A copy of the original document with values translated
                  according to their type.
+
+        This method interprets the given field types while traversing the
+        document. When translating many documents using the same field types,
+        a :class:`FieldTranslator` is considerably faster.
         """
         if isinstance(field_types, dict):
             if isinstance(doc, dict):
@@ -1283,7 +1514,7 @@ class Document(Generic[C]):
 
     @classmethod
     def from_index(cls,
-                   field_types: CataloguedFieldTypes,
+                   translators: CataloguedFieldTranslators,
                    hit: JSON,
                    *,
                    coordinates: Optional[DocumentCoordinates[CataloguedEntityReference]] = None
@@ -1292,9 +1523,8 @@ class Document(Generic[C]):
             coordinates = DocumentCoordinates.from_hit(hit)
         document = hit['_source']
         if cls.needs_translation:
-            document = cls.translate_fields(document,
-                                            field_types[coordinates.entity.catalog],
-                                            forward=False)
+            translator = translators[coordinates.entity.catalog]
+            document = translator.from_index(document)
         if cls.needs_seq_no_primary_term:
             try:
                 version = (hit['_seq_no'], hit['_primary_term'])
@@ -1311,7 +1541,7 @@ class Document(Generic[C]):
 
     def to_index(self,
                  catalog: Optional[CatalogName],
-                 field_types: CataloguedFieldTypes,
+                 translators: CataloguedFieldTranslators,
                  bulk: bool = False
                  ) -> JSON:
         """
@@ -1320,7 +1550,7 @@ class Document(Generic[C]):
         :param catalog: An optional catalog name. If None, this document's
                         coordinates must supply it. Otherwise this document's
                         coordinates must supply the same catalog or none at all.
-        :param field_types: A mapping of field paths to field type
+        :param translators: A mapping of catalog names to field translators
         :param bulk: If bulk indexing
         :return: Request parameters for indexing
         """
@@ -1333,7 +1563,7 @@ class Document(Generic[C]):
                 if op_type is OpType.delete else
                 {
                     '_source' if bulk else 'body':
-                        self._body(field_types[coordinates.entity.catalog])
+                        self._body(translators[coordinates.entity.catalog])
                 }
             ),
             '_id' if bulk else 'id': self.coordinates.document_id
@@ -1364,12 +1594,10 @@ class Document(Generic[C]):
     def op_type(self) -> OpType:
         raise NotImplementedError
 
-    def _body(self, field_types: FieldTypes) -> JSON:
+    def _body(self, translator: FieldTranslator) -> JSON:
         body = self.to_json()
         if self.needs_translation:
-            body = self.translate_fields(doc=body,
-                                         field_types=field_types,
-                                         forward=True)
+            body = translator.to_index(body)
         return body
 
 
@@ -1459,6 +1687,12 @@ class Aggregate(Document[AggregateCoordinates]):
     sources: set[DocumentSource]
     bundles: Optional[list[BundleFQIDJSON]]
     num_contributions: int
+
+    #: The state from which the contents of this aggregate can be updated
+    #: incrementally, or None if the aggregate doesn't support incremental
+    #: updates. See :meth:`IndexService.aggregate` for details.
+    state: Optional[JSON] = None
+
     needs_seq_no_primary_term: ClassVar[bool] = True
 
     def __attrs_post_init__(self):
@@ -1477,7 +1711,8 @@ class Aggregate(Document[AggregateCoordinates]):
             'bundles': {
                 'uuid': pass_thru_str,
                 'version': pass_thru_str,
-            }
+            },
+            'aggregate_state': pass_thru_json
         }
 
     @classmethod
@@ -1494,7 +1729,8 @@ class Aggregate(Document[AggregateCoordinates]):
                                  num_contributions=document['num_contributions'],
                                  sources=set(map(DocumentSource.from_json,
                                                  cast(list[SourceJSON], document['sources']))),
-                                 bundles=document.get('bundles'))
+                                 bundles=document.get('bundles'),
+                                 state=document.get('aggregate_state'))
         assert isinstance(self, Aggregate)
         return self
 
@@ -1510,7 +1746,12 @@ class Aggregate(Document[AggregateCoordinates]):
         return dict(super().to_json(),
                     num_contributions=self.num_contributions,
                     sources=[source.to_json() for source in self.sources],
-                    bundles=self.bundles)
+                    bundles=self.bundles,
+                    **(
+                        {}
+                        if self.state is None else
+                        {'aggregate_state': self.state}
+                    ))
 
     @property
     def op_type(self) -> OpType:
@@ -1567,19 +1808,24 @@ class Replica(Document[ReplicaCoordinates[E]]):
         assert self.version_type is VersionType.none, self.version_type
         return OpType.update
 
-    def _body(self, field_types: FieldTypes) -> JSON:
+    def _body(self, translator: FieldTranslator) -> JSON:
         return {
             'script': {
                 'source': '''
                         Stream stream = Stream.concat(ctx._source.hub_ids.stream(),
                                                       params.hub_ids.stream());
-                        ctx._source.hub_ids = stream.sorted().distinct().collect(Collectors.toList());
+                        List hub_ids = stream.sorted().distinct().collect(Collectors.toList());
+                        if (hub_ids.equals(ctx._source.hub_ids)) {
+                            ctx.op = 'noop';
+                        } else {
+                            ctx._source.hub_ids = hub_ids;
+                        }
                     ''',
                 'params': {
                     'hub_ids': self.hub_ids
                 }
             },
-            'upsert': super()._body(field_types)
+            'upsert': super()._body(translator)
         }
 
 
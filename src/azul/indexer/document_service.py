@@ -19,9 +19,10 @@ from azul.collections import (
 )
 from azul.indexer.document import (
     Aggregate,
+    CataloguedFieldTranslators,
     CataloguedFieldTypes,
     Contribution,
-    Document,
+    FieldTranslator,
     FieldType,
     FieldTypes,
     Nested,
@@ -111,6 +112,28 @@ class DocumentService:
             for catalog in config.catalogs
         }
 
+    def field_translator(self, catalog: CatalogName) -> FieldTranslator:
+        """
+        Returns a translator for documents in the given catalog. Compiling the
+        translator is expensive, so it is done once per catalog and metadata
+        plugin instance. Reloading the plugin invalidates the translator.
+        """
+        return self._field_translator(catalog, self.metadata_plugin(catalog))
+
+    @cache
+    def _field_translator(self,
+                          catalog: CatalogName,
+                          _plugin: MetadataPlugin
+                          ) -> FieldTranslator:
+        # The plugin argument is only used as part of the cache key
+        return FieldTranslator(self.field_types(catalog))
+
+    def catalogued_field_translators(self) -> CataloguedFieldTranslators:
+        return {
+            catalog: self.field_translator(catalog)
+            for catalog in config.catalogs
+        }
+
     def translate_fields(self,
                          catalog: CatalogName,
                          doc: AnyJSON,
@@ -118,7 +141,6 @@ class DocumentService:
                          forward: bool,
                          allowed_paths: list[FieldPath] | None = None
                          ) -> AnyMutableJSON:
-        return Document.translate_fields(doc,
-                                         self.field_types(catalog),
-                                         forward=forward,
-                                         allowed_paths=allowed_paths)
+        translator = self.field_translator(catalog)
+        translate = translator.to_index if forward else translator.from_index
+        return translate(doc, allowed_paths=allowed_paths)
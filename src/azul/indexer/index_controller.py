@@ -1,9 +1,14 @@
 from collections import (
+    Counter,
     defaultdict,
 )
 from collections.abc import (
     Iterable,
 )
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    as_completed,
+)
 from dataclasses import (
     dataclass,
     replace,
@@ -16,6 +21,7 @@ import json
 import logging
 import time
 from typing import (
+    Optional,
     cast,
 )
 import uuid
@@ -61,8 +67,15 @@ from azul.indexer.document import (
 )
 from azul.indexer.index_service import (
     CataloguedEntityReference,
+    CataloguedTallies,
     IndexService,
 )
+from azul.indexer.tally_buffer import (
+    TallyBuffer,
+)
+from azul.time import (
+    RemainingLambdaContextTime,
+)
 from azul.types import (
     JSON,
 )
@@ -161,7 +174,13 @@ class IndexController(AppController):
         if not bundle_version:
             raise chalice.BadRequestError('Invalid syntax: bundle_version can not be empty')
 
-    def contribute(self, event: Iterable[SQSRecord], *, retry=False):
+    def contribute(self,
+                   event: Iterable[SQSRecord],
+                   *,
+                   retry=False
+                   ) -> Optional[JSON]:
+        if not retry and config.contribution_batch_size > 1:
+            return self._contribute_batch(list(event))
         for record in event:
             message = json.loads(record.body)
             attempts = record.to_dict()['attributes']['ApproximateReceiveCount']
@@ -171,7 +190,8 @@ class IndexController(AppController):
             try:
                 action = Action[message['action']]
                 if action is Action.reindex:
-                    AzulClient().remote_reindex_partition(message)
+                    remaining_time = RemainingLambdaContextTime(self.lambda_context)
+                    AzulClient().remote_reindex_partition(message, remaining_time)
                 else:
                     notification = message['notification']
                     catalog = message['catalog']
@@ -196,11 +216,7 @@ class IndexController(AppController):
                     else:
                         log.info('No replicas to write.')
 
-                    log.info('Queueing %i entities for aggregating a total of %i contributions.',
-                             len(tallies), sum(tally.num_contributions for tally in tallies))
-                    for batch in chunked(tallies, self.document_batch_size):
-                        entries = [dict(tally.to_message(), Id=str(i)) for i, tally in enumerate(batch)]
-                        self._tallies_queue().send_messages(Entries=entries)
+                    self._queue_tallies(tallies)
             except BaseException:
                 log.warning(f'Worker failed to handle message {message}.', exc_info=True)
                 raise
@@ -208,6 +224,168 @@ class IndexController(AppController):
                 duration = time.time() - start
                 log.info(f'Worker successfully handled message {message} in {duration:.3f}s.')
 
+    def _contribute_batch(self, records: list[SQSRecord]) -> JSON:
+        """
+        Handle a batch of notification messages. The bundles referenced by the
+        notifications are fetched and transformed concurrently, and the
+        resulting contributions and replicas are written using as few bulk
+        requests as possible. One tally is queued for each entity affected by
+        any of the bundles. A failure to handle a message does not affect the
+        other messages in the batch. The failed messages are reported as such to
+        SQS, which will only redeliver those.
+
+        https://docs.aws.amazon.com/lambda/latest/dg/services-sqs-errorhandling.html#services-sqs-batchfailurereporting
+        """
+        start = time.time()
+        messages: dict[str, JSON] = {}
+        failures: set[str] = set()
+        notifications: dict[str, tuple[CatalogName, JSON, bool]] = {}
+        for record in records:
+            record = record.to_dict()
+            message_id = record['messageId']
+            message = json.loads(record['body'])
+            messages[message_id] = message
+            attempts = record['attributes']['ApproximateReceiveCount']
+            log.info('Worker handling message %r, attempt #%r (approx).',
+                     message, attempts)
+            try:
+                action = Action[message['action']]
+                if action is Action.reindex:
+                    remaining_time = RemainingLambdaContextTime(self.lambda_context)
+                    AzulClient().remote_reindex_partition(message, remaining_time)
+                else:
+                    catalog = message['catalog']
+                    assert catalog is not None
+                    notification = message['notification']
+                    notifications[message_id] = catalog, notification, action.is_delete()
+            except Exception:
+                log.warning('Worker failed to handle message %r.', message, exc_info=True)
+                failures.add(message_id)
+
+        # Results by catalog and message ID
+        results: dict[CatalogName, dict[str, tuple[list[Contribution], list[Replica]]]]
+        results = defaultdict(dict)
+        if notifications:
+            service = self.index_service
+            with ThreadPoolExecutor(max_workers=len(notifications),
+                                    thread_name_prefix='transform') as tpe:
+                futures = {
+                    tpe.submit(self.transform, *notification): message_id
+                    for message_id, notification in notifications.items()
+                }
+                for future in as_completed(futures):
+                    message_id = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception:
+                        log.warning('Worker failed to handle message %r.',
+                                    messages[message_id], exc_info=True)
+                        failures.add(message_id)
+                    else:
+                        catalog, _, _ = notifications[message_id]
+                        results[catalog][message_id] = result
+
+            tallies_by_message: dict[str, CataloguedTallies] = {}
+            for catalog, catalog_results in results.items():
+                contributions = {
+                    message_id: contributions
+                    for message_id, (contributions, _) in catalog_results.items()
+                }
+                replicas = {}
+                for message_id, (_, message_replicas) in catalog_results.items():
+                    if message_replicas:
+                        _, _, delete = notifications[message_id]
+                        if delete:
+                            # FIXME: Replica index does not support deletions
+                            #        https://github.com/DataBiosphere/azul/issues/5846
+                            log.warning('Deletion of replicas is not supported')
+                        else:
+                            replicas[message_id] = message_replicas
+                try:
+                    log.info('Writing %i contributions from %i message(s) to index.',
+                             sum(map(len, contributions.values())), len(contributions))
+                    catalog_tallies, failed = service.contribute_batch(catalog, contributions)
+                    if replicas:
+                        log.info('Writing %i replicas from %i message(s) to index.',
+                                 sum(map(len, replicas.values())), len(replicas))
+                        failed |= service.replicate_batch(catalog, replicas)
+                    else:
+                        log.info('No replicas to write.')
+                except Exception:
+                    log.warning('Worker failed to write documents to catalog %r.',
+                                catalog, exc_info=True)
+                    failed = catalog_results.keys()
+                    catalog_tallies = {}
+                for message_id in failed:
+                    log.warning('Worker failed to write documents for message %r.',
+                                messages[message_id])
+                    failures.add(message_id)
+                tallies_by_message.update({
+                    message_id: message_tallies
+                    for message_id, message_tallies in catalog_tallies.items()
+                    if message_id not in failed
+                })
+
+            # Consolidate the tallies from all successfully handled messages so
+            # that only one tally is queued per entity
+            consolidated_tallies = Counter()
+            for message_tallies in tallies_by_message.values():
+                consolidated_tallies.update(message_tallies)
+            tallies = [
+                DocumentTally.for_entity(entity.catalog, entity, num_contributions)
+                for entity, num_contributions in consolidated_tallies.items()
+            ]
+            self._queue_tallies(tallies)
+
+        duration = time.time() - start
+        log.info('Worker handled %i message(s) in %.3fs, %i of which failed.',
+                 len(records), duration, len(failures))
+        return {
+            'batchItemFailures': [
+                {'itemIdentifier': message_id}
+                for message_id in failures
+            ]
+        }
+
+    def _queue_tallies(self, tallies: list['DocumentTally']) -> None:
+        """
+        Queue the given tallies for aggregation or, if the tally buffer is
+        enabled, merge them into the buffer for the next flush to queue.
+        """
+        if config.tally_buffer:
+            self._tally_buffer.add({
+                tally.entity: tally.num_contributions
+                for tally in tallies
+            })
+        else:
+            self._send_tallies(tallies)
+
+    def _send_tallies(self, tallies: list['DocumentTally']) -> None:
+        log.info('Queueing %i entities for aggregating a total of %i contributions.',
+                 len(tallies), sum(tally.num_contributions for tally in tallies))
+        for batch in chunked(tallies, self.document_batch_size):
+            entries = [dict(tally.to_message(), Id=str(i)) for i, tally in enumerate(batch)]
+            self._tallies_queue().send_messages(Entries=entries)
+
+    def flush_tallies(self) -> None:
+        """
+        Queue one consolidated tally for every entity in the tally buffer.
+        """
+        if config.tally_buffer:
+            def send(tallies: CataloguedTallies):
+                self._send_tallies([
+                    DocumentTally.for_entity(entity.catalog, entity, num_contributions)
+                    for entity, num_contributions in tallies.items()
+                ])
+
+            self._tally_buffer.flush(send, RemainingLambdaContextTime(self.lambda_context))
+        else:
+            log.info('The tally buffer is disabled.')
+
+    @cached_property
+    def _tally_buffer(self) -> TallyBuffer:
+        return TallyBuffer()
+
     def transform(self,
                   catalog: CatalogName,
                   notification: JSON,
@@ -249,6 +427,23 @@ class IndexController(AppController):
     #
     num_batched_aggregation_attempts = 3
 
+    #: The maximum number of times the aggregation of an entity is deferred
+    #: because it is expensive to aggregate, see
+    #: AZUL_DEFERRED_AGGREGATION_THRESHOLD. The first deferral is based on the
+    #: estimated cost, each subsequent one on the entity's tallies still
+    #: growing while they were deferred.
+    #
+    max_tally_deferrals = 3
+
+    #: The maximum number of deferred tallies returned to the tallies queue by
+    #: a single invocation of the Lambda function consuming the deferred tallies
+    #: queue, and the maximum number of seconds that function waits for a batch
+    #: to fill up. The larger a batch, the more deferred tallies for the same
+    #: entity can be consolidated.
+    #
+    deferred_tally_batch_size = 100
+    deferred_tally_batching_window = 60
+
     def aggregate(self, event: Iterable[SQSRecord], *, retry=False):
         # Consolidate multiple tallies for the same entity and process entities
         # with only one message. Because SQS FIFO queues try to put as many
@@ -259,14 +454,19 @@ class IndexController(AppController):
         # that group. The more bundle contributions we defer, the higher the
         # amortized savings on aggregation become. Aggregating bundle
         # contributions is a costly operation for any entity with many
-        # contributions e.g., a large project.
+        # contributions e.g., a large project. For the same reason, the single
+        # tally for an entity with many contributions is moved to a separate
+        # queue that delays it, so that more tallies for the entity can
+        # accumulate in the meantime.
         #
         tallies_by_entity: dict[CataloguedEntityReference, list[DocumentTally]] = defaultdict(list)
+        num_tallies = 0
         for record in event:
             tally = DocumentTally.from_sqs_record(record)
             log.info('Attempt %i of handling %i contribution(s) for entity %s',
                      tally.attempts, tally.num_contributions, tally.entity)
             tallies_by_entity[tally.entity].append(tally)
+            num_tallies += 1
         deferrals, referrals = [], []
         try:
             for tallies in tallies_by_entity.values():
@@ -287,6 +487,17 @@ class IndexController(AppController):
                         referrals = [tally]
                         break
 
+            if referrals and not retry:
+                referrals, expensive = self._defer_expensive(referrals)
+            else:
+                expensive = []
+
+            log.info('Scheduled %i tallies for %i entities: '
+                     '%i referred, %i deferred, %i of which for cost',
+                     num_tallies, len(tallies_by_entity),
+                     len(referrals), len(deferrals) + len(expensive), len(expensive))
+
+            if referrals:
                 log.info('Referring %i tallies', len(referrals))
                 tallies = {}
                 for tally in referrals:
@@ -312,12 +523,84 @@ class IndexController(AppController):
                 # been sent and the original tallies will be returned.
                 self._tallies_queue(retry=retry).send_messages(Entries=entries)
 
+            if expensive:
+                self._send_deferred_tallies(expensive)
+
         except BaseException:
             # Note that another problematic outcome is for the Lambda invocation
             # to time out, in which case this log message will not be written.
             log.warning('Failed to aggregate tallies: %r', tallies_by_entity.values(), exc_info=True)
             raise
 
+    def _defer_expensive(self,
+                         tallies: list['DocumentTally']
+                         ) -> tuple[list['DocumentTally'], list['DocumentTally']]:
+        """
+        Partition the given tallies into those for entities that should be
+        aggregated now and those for entities that are too expensive to be
+        aggregated before more tallies for them had a chance to arrive. Only
+        first attempts at tallies that weren't deferred before are considered.
+        """
+        threshold = config.deferred_aggregation_threshold
+        if threshold == 0:
+            return tallies, []
+        candidates = {
+            tally.entity: tally.num_contributions
+            for tally in tallies
+            if tally.attempts == 1 and tally.deferrals == 0
+        }
+        if candidates:
+            costs = self.index_service.estimate_aggregation_costs(candidates)
+        else:
+            costs = {}
+        referrals, deferrals = [], []
+        for tally in tallies:
+            cost = costs.get(tally.entity, 0)
+            if cost > threshold:
+                log.info('Deferring expensive aggregation of entity %s, estimated at %i contribution(s)',
+                         tally.entity, cost)
+                deferrals.append(tally)
+            else:
+                referrals.append(tally)
+        return referrals, deferrals
+
+    def _send_deferred_tallies(self, tallies: list['DocumentTally']) -> None:
+        log.info('Deferring aggregation of %i entities for %is',
+                 len(tallies), config.deferred_aggregation_delay)
+        for batch in chunked(tallies, self.document_batch_size):
+            entries = [
+                dict(replace(tally, deferrals=tally.deferrals + 1).to_message(fifo=False), Id=str(i))
+                for i, tally in enumerate(batch)
+            ]
+            self._deferred_tallies_queue().send_messages(Entries=entries)
+
+    def requeue_deferred_tallies(self, event: Iterable[SQSRecord]) -> None:
+        """
+        Consolidate the deferred tallies for the same entity and return them to
+        the tallies queue for aggregation. If more than one tally was deferred
+        for an entity, its tallies are still growing and its aggregation is
+        deferred again, unless it was already deferred too often.
+        """
+        tallies_by_entity: dict[CataloguedEntityReference, list[DocumentTally]] = defaultdict(list)
+        num_tallies = 0
+        for record in event:
+            tally = DocumentTally.from_sqs_record(record)
+            tallies_by_entity[tally.entity].append(tally)
+            num_tallies += 1
+        referrals, deferrals = [], []
+        for tallies in tallies_by_entity.values():
+            tally = tallies[0].consolidate(tallies[1:])
+            if len(tallies) > 1 and tally.deferrals < self.max_tally_deferrals:
+                deferrals.append(tally)
+            else:
+                referrals.append(tally)
+        log.info('Requeued %i deferred tallies for %i entities: %i referred, %i deferred again',
+                 num_tallies, len(tallies_by_entity), len(referrals), len(deferrals))
+        if referrals:
+            self._send_tallies(referrals)
+        if deferrals:
+            self._send_deferred_tallies(deferrals)
+
     @property
     def _sqs(self):
         return aws.resource('sqs')
@@ -331,6 +614,9 @@ class IndexController(AppController):
     def _tallies_queue(self, retry=False):
         return self._queue(config.tallies_queue_name(retry=retry))
 
+    def _deferred_tallies_queue(self):
+        return self._queue(config.deferred_tallies_queue_name())
+
 
 @dataclass(frozen=True)
 class DocumentTally:
@@ -342,6 +628,9 @@ class DocumentTally:
     entity: CataloguedEntityReference
     num_contributions: int
     attempts: int
+    #: The number of times the aggregation of the entity was deferred because
+    #: it was deemed too expensive
+    deferrals: int = 0
 
     @classmethod
     def from_sqs_record(cls, record: SQSRecord) -> 'DocumentTally':
@@ -351,7 +640,8 @@ class DocumentTally:
                                                     entity_type=body['entity_type'],
                                                     entity_id=body['entity_id']),
                    num_contributions=body['num_contributions'],
-                   attempts=int(attributes['ApproximateReceiveCount']))
+                   attempts=int(attributes['ApproximateReceiveCount']),
+                   deferrals=body.get('deferrals', 0))
 
     @classmethod
     def for_entity(cls,
@@ -369,18 +659,23 @@ class DocumentTally:
             'catalog': self.entity.catalog,
             'entity_type': self.entity.entity_type,
             'entity_id': self.entity.entity_id,
-            'num_contributions': self.num_contributions
+            'num_contributions': self.num_contributions,
+            'deferrals': self.deferrals
         }
 
-    def to_message(self) -> JSON:
-        return dict(MessageBody=json.dumps(self.to_json()),
-                    MessageGroupId=str(self.entity),
-                    MessageDeduplicationId=str(uuid.uuid4()))
+    def to_message(self, *, fifo: bool = True) -> JSON:
+        message = dict(MessageBody=json.dumps(self.to_json()))
+        if fifo:
+            message.update(MessageGroupId=str(self.entity),
+                           MessageDeduplicationId=str(uuid.uuid4()))
+        return message
 
     def consolidate(self, others: list['DocumentTally']) -> 'DocumentTally':
         assert all(
             self.entity == other.entity
             for other in others
         )
-        return replace(self, num_contributions=sum((other.num_contributions for other in others),
-                                                   self.num_contributions))
+        return replace(self,
+                       num_contributions=sum((other.num_contributions for other in others),
+                                             self.num_contributions),
+                       deferrals=max([self.deferrals, *(other.deferrals for other in others)]))
@@ -1,6 +1,7 @@
 from collections import (
     Counter,
     defaultdict,
+    deque,
 )
 from collections.abc import (
     Iterable,
@@ -8,22 +9,44 @@ from collections.abc import (
     Mapping,
     Sequence,
 )
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import (
+    partial,
+)
+import heapq
 from itertools import (
     groupby,
 )
+import json
 import logging
+import multiprocessing
 from operator import (
     attrgetter,
+    itemgetter,
+)
+from queue import (
+    Full,
+    Queue,
+)
+from threading import (
+    Event,
 )
+import time
 from typing import (
     MutableSet,
     Optional,
     TYPE_CHECKING,
     Type,
+    TypeVar,
     Union,
-    cast,
 )
 
+import attr
 from elasticsearch import (
     ConflictError,
     ElasticsearchException,
@@ -31,11 +54,13 @@ from elasticsearch import (
 from elasticsearch.exceptions import (
     NotFoundError,
     RequestError,
+    TransportError,
 )
 from elasticsearch.helpers import (
-    streaming_bulk,
+    expand_action,
 )
 from more_itertools import (
+    chunked,
     first,
     one,
 )
@@ -56,19 +81,20 @@ from azul.indexer import (
     BundleFQID,
     BundleFQIDJSON,
     BundlePartition,
-    BundleUUID,
     SourcedBundleFQIDJSON,
 )
 from azul.indexer.aggregate import (
     Entities,
+    NotMergeable,
 )
 from azul.indexer.document import (
     Aggregate,
     AggregateCoordinates,
     CataloguedContribution,
     CataloguedEntityReference,
-    CataloguedFieldTypes,
+    CataloguedFieldTranslators,
     Contribution,
+    ContributionCoordinates,
     Document,
     DocumentCoordinates,
     DocumentType,
@@ -76,7 +102,6 @@ from azul.indexer.document import (
     EntityReference,
     EntityType,
     IndexName,
-    OpType,
     Replica,
     ReplicaCoordinates,
     VersionType,
@@ -87,6 +112,9 @@ from azul.indexer.document_service import (
 from azul.indexer.transform import (
     Transformer,
 )
+from azul.json import (
+    json_hash,
+)
 from azul.json_freeze import (
     freeze,
 )
@@ -101,6 +129,7 @@ from azul.types import (
     CompositeJSON,
     JSON,
     JSONs,
+    MutableJSON,
 )
 
 log = logging.getLogger(__name__)
@@ -111,6 +140,9 @@ CataloguedTallies = Mapping[CataloguedEntityReference, int]
 
 MutableCataloguedTallies = dict[CataloguedEntityReference, int]
 
+# The type of the keys identifying the sources of documents in batched writes
+K = TypeVar('K')
+
 
 class IndexExistsAndDiffersException(Exception):
     pass
@@ -238,6 +270,124 @@ class IndexService(DocumentService):
         #        https://github.com/DataBiosphere/azul/issues/5846
         self.aggregate(tallies)
 
+    def bulk_index(self,
+                   catalog: CatalogName,
+                   bundle_fqids: Iterable[SourcedBundleFQIDJSON],
+                   *,
+                   executor: Optional[Executor] = None,
+                   num_writers: int = 4,
+                   batch_size: int = 64,
+                   aggregation_batch_size: int = 256
+                   ) -> int:
+        """
+        Index the given bundles into the specified catalog without involving
+        the indexer Lambda functions or any of the SQS queues, and return the
+        number of documents written. Intended for bulk-loading a fresh catalog
+        and for benchmarking the indexer against a local Elasticsearch
+        instance.
+
+        The bundles are fetched and transformed concurrently, by default in a
+        pool of worker processes. The resulting contributions and replicas are
+        written in batches, using the same methods as the contribution Lambda
+        function, while the next batch of bundles is being transformed. Once
+        all contributions were written, every entity they refer to is
+        aggregated exactly once, again in batches and concurrently. The
+        resulting indices are identical to those produced by queueing a
+        notification for each bundle.
+
+        :param catalog: the name of the catalog to index the bundles into
+
+        :param bundle_fqids: the bundles to index
+
+        :param executor: the executor to fetch and transform the bundles with.
+                         If absent, a pool of as many worker processes as
+                         there are CPUs will be used. The executor is shut
+                         down before this method returns.
+
+        :param num_writers: the maximum number of batches of documents that are
+                            written concurrently
+
+        :param batch_size: the number of bundles whose contributions and
+                           replicas are written together, using as few bulk
+                           requests as possible
+
+        :param aggregation_batch_size: the number of entities to aggregate
+                                       together
+        """
+        start = time.perf_counter()
+        num_bundles, num_documents = 0, 0
+        tallies: MutableCataloguedTallies = Counter()
+        if executor is None:
+            # Forking a process that has already started threads, like those of
+            # the HTTP connection pools, is unsafe.
+            context = multiprocessing.get_context('spawn')
+            executor = ProcessPoolExecutor(mp_context=context)
+        transform = partial(_fetch_and_transform, catalog)
+        with executor, ThreadPoolExecutor(max_workers=num_writers,
+                                          thread_name_prefix='contribute') as tpe:
+            futures = deque()
+            for batch in chunked(bundle_fqids, batch_size):
+                results = dict(zip(map(json.dumps, batch), executor.map(transform, batch)))
+                while len(futures) >= num_writers:
+                    num_documents += self._tally_contributions(tallies, futures.popleft())
+                futures.append(tpe.submit(self._contribute_bundles, catalog, results))
+                num_bundles += len(results)
+            while futures:
+                num_documents += self._tally_contributions(tallies, futures.popleft())
+            log.info('Wrote documents for %i bundle(s), aggregating %i entities',
+                     num_bundles, len(tallies))
+            es_client = ESClientFactory.get()
+            es_client.indices.refresh(index=','.join(
+                str(index_name)
+                for index_name in self.index_names(catalog)
+                if index_name.doc_type is DocumentType.contribution
+            ))
+            aggregations = [
+                tpe.submit(self.aggregate, dict(batch))
+                for batch in chunked(tallies.items(), aggregation_batch_size)
+            ]
+            for future in aggregations:
+                future.result()
+            num_documents += len(tallies)
+        duration = time.perf_counter() - start
+        log.info('Indexed %i bundle(s) into catalog %r, writing %i documents, '
+                 'in %.3fs: %.1f bundles/s, %.1f documents/s',
+                 num_bundles, catalog, num_documents, duration,
+                 num_bundles / duration, num_documents / duration)
+        return num_documents
+
+    def _contribute_bundles(self,
+                            catalog: CatalogName,
+                            results: Mapping[str, tuple[list[Contribution], list[Replica]]]
+                            ) -> tuple[CataloguedTallies, int]:
+        """
+        Write the contributions and replicas resulting from the transformation
+        of a batch of bundles and return the consolidated tallies for the batch
+        along with the number of documents written.
+        """
+        contributions = {k: c for k, (c, _) in results.items()}
+        replicas = {k: r for k, (_, r) in results.items() if r}
+        tallies, failed = self.contribute_batch(catalog, contributions)
+        if replicas:
+            failed |= self.replicate_batch(catalog, replicas)
+        if failed:
+            raise RuntimeError('Failed to write documents for bundles', failed)
+        consolidated_tallies = Counter()
+        for bundle_tallies in tallies.values():
+            consolidated_tallies.update(bundle_tallies)
+        num_documents = sum(map(len, contributions.values()))
+        num_documents += sum(map(len, replicas.values()))
+        return consolidated_tallies, num_documents
+
+    def _tally_contributions(self,
+                             tallies: MutableCataloguedTallies,
+                             future: Future[tuple[CataloguedTallies, int]]
+                             ) -> int:
+        batch_tallies, num_documents = future.result()
+        for entity, num_contributions in batch_tallies.items():
+            tallies[entity] += num_contributions
+        return num_documents
+
     def deep_transform(self,
                        catalog: CatalogName,
                        bundle: Bundle,
@@ -426,23 +576,74 @@ class IndexService(DocumentService):
         Tallies for overwritten documents are not counted. This means a tally
         with a count of 0 may exist. This is ok. See description of aggregate().
         """
-        tallies = Counter()
         writer = self._create_writer(DocumentType.contribution, catalog)
-        while contributions:
-            writer.write(contributions)
-            retry_contributions = []
-            for c in contributions:
-                if c.coordinates in writer.retries:
-                    retry_contributions.append(c)
-                else:
-                    entity = CataloguedEntityReference.for_entity(catalog, c.coordinates.entity)
-                    # Don't count overwrites, but ensure entry exists
-                    was_overwrite = c.version_type is VersionType.none
-                    tallies[entity] += 0 if was_overwrite else 1
-            contributions = retry_contributions
+        self._write_with_retries(writer, contributions)
         writer.raise_on_errors()
+        tallies = Counter()
+        for c in contributions:
+            self._tally(tallies, catalog, c)
         return tallies
 
+    def contribute_batch(self,
+                         catalog: CatalogName,
+                         contributions: Mapping[K, list[Contribution]]
+                         ) -> tuple[dict[K, CataloguedTallies], set[K]]:
+        """
+        Write the entity contributions from several independent sources, the
+        bundles referenced by a batch of notifications, for example, using as
+        few bulk requests as possible.
+
+        Unlike :meth:`contribute`, this method does not raise an exception if
+        some contributions can't be written. Instead, it returns the tallies for
+        each source whose contributions were all written successfully, and the
+        set of sources with at least one contribution that couldn't be written.
+
+        A contribution that occurs in more than one source is written once, and
+        counted once, in the tallies of the first such source. The tallies of
+        the other sources will still contain an entry for the contribution's
+        entity, albeit one with a count of 0.
+
+        :param catalog: the name of the catalog to contribute to
+
+        :param contributions: the contributions to write, by source
+        """
+        documents: dict[DocumentCoordinates, Contribution] = {}
+        sources: dict[DocumentCoordinates, dict[K, None]] = defaultdict(dict)
+        for source, source_contributions in contributions.items():
+            for c in source_contributions:
+                documents.setdefault(c.coordinates, c)
+                sources[c.coordinates][source] = None
+        writer = self._create_writer(DocumentType.contribution, catalog)
+        failures = self._write_with_retries(writer, list(documents.values()))
+        failed_sources = {
+            source
+            for coordinates in failures
+            for source in sources[coordinates]
+        }
+        tallies = {
+            source: Counter()
+            for source in contributions.keys()
+            if source not in failed_sources
+        }
+        for coordinates, c in documents.items():
+            first_source, *other_sources = sources[coordinates]
+            if first_source in tallies:
+                self._tally(tallies[first_source], catalog, c)
+            for source in other_sources:
+                if source in tallies:
+                    entity = CataloguedEntityReference.for_entity(catalog, c.coordinates.entity)
+                    tallies[source][entity] += 0
+        return tallies, failed_sources
+
+    def _tally(self,
+               tallies: MutableCataloguedTallies,
+               catalog: CatalogName,
+               contribution: Contribution):
+        entity = CataloguedEntityReference.for_entity(catalog, contribution.coordinates.entity)
+        # Don't count overwrites, but ensure entry exists
+        was_overwrite = contribution.version_type is VersionType.none
+        tallies[entity] += 0 if was_overwrite else 1
+
     def aggregate(self, tallies: CataloguedTallies):
         """
         Read all contributions to the entities listed in the given tallies from
@@ -459,42 +660,72 @@ class IndexService(DocumentService):
 
         Also note that the input tallies can refer to entities from different
         catalogs.
+
+        If incremental aggregation is enabled, every aggregate additionally
+        records the state of its aggregators and the IDs of the contributions
+        reflected in it. Instead of reading and combining all contributions to
+        an entity, only the contributions made since the aggregate was last
+        written are read and folded into the recorded state. An aggregate is
+        rebuilt from all of its contributions if it lacks that state, if any of
+        the new contributions is a deletion or supersedes a bundle already
+        reflected in the aggregate, if a contribution reflected in the
+        aggregate is no longer present, or if the new contributions carry a
+        different copy of an inner entity already reflected in the aggregate.
+        Rebuilding takes care of reconciling such copies. Aggregates whose state
+        would be too large, or depend on the order of the contributions, are
+        stored without state and are therefore always rebuilt.
         """
         # Use catalog specified in each tally
         writer = self._create_writer(DocumentType.aggregate, catalog=None)
         while True:
-            # Read the aggregates
-            old_aggregates = self._read_aggregates(tallies)
-            total_tallies: MutableCataloguedTallies = Counter(tallies)
-            total_tallies.update({
-                old_aggregate.coordinates.entity: old_aggregate.num_contributions
-                for old_aggregate in old_aggregates.values()
-            })
-
-            # Read all contributions
-            contributions = self._read_contributions(total_tallies)
-            actual_tallies = Counter(contribution.coordinates.entity
-                                     for contribution in contributions)
-            if tallies.keys() != actual_tallies.keys():
-                message = 'Could not find all expected contributions.'
-                args = (tallies, actual_tallies) if config.debug else ()
-                raise EventualConsistencyException(message, *args)
-            assert all(tallies[entity] <= actual_tally
-                       for entity, actual_tally in actual_tallies.items())
-
-            # Combine the contributions into new aggregates, one per entity
-            new_aggregates = self._aggregate(contributions)
-
-            # Remove old aggregates (leaving over only deletions) while
-            # propagating the expected document version to the corresponding new
-            # aggregate
-            for new_aggregate in new_aggregates:
-                old_aggregate = old_aggregates.pop(new_aggregate.coordinates.entity, None)
-                new_aggregate.version = None if old_aggregate is None else old_aggregate.version
+            # Read the aggregates, including the state needed to decide if
+            # they can be updated incrementally, but not their contents
+            source_fields = ['aggregate_state'] if config.incremental_aggregation else []
+            old_aggregates = self._read_aggregates(tallies, source_fields=source_fields)
+
+            # Fold the new contributions into the old aggregates, where
+            # possible, leaving over the aggregates that need to be rebuilt
+            if config.incremental_aggregation:
+                new_aggregates = self._update_aggregates(tallies, old_aggregates)
+            else:
+                new_aggregates = []
+            updated_entities = {a.coordinates.entity for a in new_aggregates}
+            rebuilt_tallies: CataloguedTallies = {
+                entity: tally
+                for entity, tally in tallies.items()
+                if entity not in updated_entities
+            }
+
+            if rebuilt_tallies:
+                total_tallies: MutableCataloguedTallies = Counter(rebuilt_tallies)
+                total_tallies.update({
+                    old_aggregate.coordinates.entity: old_aggregate.num_contributions
+                    for old_aggregate in old_aggregates.values()
+                })
+
+                # Read all contributions and combine them into new aggregates,
+                # one per entity, as they are being read
+                contributions = self._read_contributions(total_tallies)
+                rebuilt_aggregates, actual_tallies = self._aggregate(contributions)
+                if rebuilt_tallies.keys() != actual_tallies.keys():
+                    message = 'Could not find all expected contributions.'
+                    args = (rebuilt_tallies, actual_tallies) if config.debug else ()
+                    raise EventualConsistencyException(message, *args)
+                assert all(rebuilt_tallies[entity] <= actual_tally
+                           for entity, actual_tally in actual_tallies.items())
+
+                # Remove old aggregates (leaving over only deletions) while
+                # propagating the expected document version to the
+                # corresponding new aggregate
+                for new_aggregate in rebuilt_aggregates:
+                    old_aggregate = old_aggregates.pop(new_aggregate.coordinates.entity, None)
+                    new_aggregate.version = None if old_aggregate is None else old_aggregate.version
+                new_aggregates.extend(rebuilt_aggregates)
 
             # Empty out the left-over, deleted aggregates
             for old_aggregate in old_aggregates.values():
                 old_aggregate.contents = {}
+                old_aggregate.state = None
                 new_aggregates.append(old_aggregate)
 
             # Write new aggregates
@@ -511,27 +742,131 @@ class IndexService(DocumentService):
                 break
         writer.raise_on_errors()
 
+    def estimate_aggregation_costs(self,
+                                   tallies: CataloguedTallies
+                                   ) -> CataloguedTallies:
+        """
+        Estimate the cost of aggregating each entity in the given tallies as
+        the number of contributions that would be read when rebuilding its
+        aggregate: the number of contributions reflected in the existing
+        aggregate, if any, plus the tally. Only the mandatory fields of the
+        existing aggregates are read.
+        """
+        aggregates = self._read_aggregates(tallies)
+        return {
+            entity: tally + (aggregates[entity].num_contributions if entity in aggregates else 0)
+            for entity, tally in tallies.items()
+        }
+
     def replicate(self, catalog: CatalogName, replicas: list[Replica]) -> int:
+        """
+        Write the given replicas and return the number of replicas that were
+        written, excluding those that were already up-to-date in the index.
+        """
+        replicas = self._changed_replicas(catalog, replicas)
         writer = self._create_writer(DocumentType.replica, catalog)
-        num_replicas = len(replicas)
-        num_written = 0
-        while replicas:
-            writer.write(replicas)
-            retry_replicas = []
-            for r in replicas:
-                if r.coordinates in writer.retries:
-                    retry_replicas.append(r)
+        self._write_with_retries(writer, replicas)
+        writer.raise_on_errors()
+        return len(replicas)
+
+    def replicate_batch(self,
+                        catalog: CatalogName,
+                        replicas: Mapping[K, list[Replica]]
+                        ) -> set[K]:
+        """
+        Write the replicas from several independent sources using as few bulk
+        requests as possible and return the set of sources with at least one
+        replica that couldn't be written. Replicas are content-addressed, so
+        different sources may yield the same replica. Such replicas are merged
+        and written once.
+
+        :param catalog: the name of the catalog to write the replicas to
+
+        :param replicas: the replicas to write, by source
+        """
+        documents: dict[DocumentCoordinates, Replica] = {}
+        sources: dict[DocumentCoordinates, set[K]] = defaultdict(set)
+        for source, source_replicas in replicas.items():
+            for r in source_replicas:
+                try:
+                    dup = documents[r.coordinates]
+                except KeyError:
+                    documents[r.coordinates] = attr.evolve(r, hub_ids=list(r.hub_ids))
                 else:
-                    num_written += 1
-            replicas = retry_replicas
+                    dup.hub_ids.extend(r.hub_ids)
+                sources[r.coordinates].add(source)
+        writer = self._create_writer(DocumentType.replica, catalog)
+        documents = self._changed_replicas(catalog, list(documents.values()))
+        failures = self._write_with_retries(writer, documents)
+        return {
+            source
+            for coordinates in failures
+            for source in sources[coordinates]
+        }
 
-        writer.raise_on_errors()
-        assert num_written == num_replicas, (num_written, num_replicas)
-        return num_written
+    def _changed_replicas(self,
+                          catalog: CatalogName,
+                          replicas: list[Replica]
+                          ) -> list[Replica]:
+        """
+        Return the given replicas, except those that already exist in the index
+        along with all of their hub IDs. Since replicas are content-addressed,
+        writing the latter would not change the index. Checking for them with
+        one read is cheaper than writing them and avoids the conflicts that
+        occur when concurrent writers update the same replica.
+        """
+        if not replicas:
+            return replicas
+        request = {
+            'docs': [
+                {
+                    '_index': replica.coordinates.with_catalog(catalog).index_name,
+                    '_id': replica.coordinates.document_id,
+                    '_source': ['hub_ids']
+                }
+                for replica in replicas
+            ]
+        }
+        response = ESClientFactory.get().mget(body=request)
+        changed_replicas = [
+            replica
+            for replica, doc in zip(replicas, response['docs'])
+            if not (
+                doc.get('found', False)
+                and set(replica.hub_ids) <= set(doc['_source']['hub_ids'])
+            )
+        ]
+        log.info('Skipping %i of %i replica(s) that are already up-to-date',
+                 len(replicas) - len(changed_replicas), len(replicas))
+        return changed_replicas
+
+    def _write_with_retries(self,
+                            writer: 'IndexWriter',
+                            documents: list[Document]
+                            ) -> set[DocumentCoordinates]:
+        """
+        Write the given documents, retrying the ones that fail within the limits
+        configured on the given writer, and return the coordinates of the
+        documents that could not be written.
+        """
+        while documents:
+            writer.write(documents)
+            documents = [
+                doc
+                for doc in documents
+                if doc.coordinates in writer.retries
+            ]
+        return set(writer.errors.keys()) | set(writer.conflicts.keys())
 
     def _read_aggregates(self,
-                         entities: CataloguedTallies
+                         entities: Iterable[CataloguedEntityReference],
+                         *,
+                         source_fields: Iterable[str] = ()
                          ) -> dict[CataloguedEntityReference, Aggregate]:
+        """
+        Read the aggregates for the given entities, omitting any fields from
+        their source that aren't mandatory or explicitly requested.
+        """
         coordinates = [
             AggregateCoordinates(entity=entity)
             for entity in entities
@@ -546,12 +881,13 @@ class IndexService(DocumentService):
             ]
         }
         catalogs = {coordinate.entity.catalog for coordinate in coordinates}
-        mandatory_source_fields = set()
+        mandatory_source_fields = set(source_fields)
         for catalog in catalogs:
             aggregate_cls = self.aggregate_class(catalog)
             mandatory_source_fields.update(aggregate_cls.mandatory_source_fields())
         response = ESClientFactory.get().mget(body=request,
-                                              _source_includes=list(mandatory_source_fields))
+                                              _source_includes=sorted(mandatory_source_fields))
+        translators = self.catalogued_field_translators()
 
         def aggregates():
             for doc in response['docs']:
@@ -563,20 +899,229 @@ class IndexService(DocumentService):
                     if found:
                         coordinate = DocumentCoordinates.from_hit(doc)
                         aggregate_cls = self.aggregate_class(coordinate.entity.catalog)
-                        aggregate = aggregate_cls.from_index(self.catalogued_field_types(),
+                        aggregate = aggregate_cls.from_index(translators,
                                                              doc,
                                                              coordinates=coordinate)
                         yield aggregate
 
         return {a.coordinates.entity: a for a in aggregates()}
 
-    def _read_contributions(self,
-                            tallies: CataloguedTallies
-                            ) -> list[CataloguedContribution]:
-        es_client = ESClientFactory.get()
+    def _update_aggregates(self,
+                           tallies: CataloguedTallies,
+                           old_aggregates: dict[CataloguedEntityReference, Aggregate]
+                           ) -> list[Aggregate]:
+        """
+        Fold the contributions made to the given entities since their
+        aggregates were last written into those aggregates. Return the updated
+        aggregates and remove the corresponding old aggregates from the given
+        dictionary. Entities whose aggregate can't be updated incrementally are
+        left for the caller to rebuild.
+        """
+        candidates = {
+            entity: aggregate
+            for entity, aggregate in old_aggregates.items()
+            if aggregate.state is not None
+        }
+        if not candidates:
+            return []
+        listed_contributions = self._list_contributions(candidates.keys())
+        if not listed_contributions:
+            return []
+        new_contributions: dict[CataloguedEntityReference, list[ContributionCoordinates]] = {}
+        for entity, aggregate in candidates.items():
+            listed = listed_contributions.get(entity, {})
+            if tallies[entity] > len(listed):
+                # Let the full aggregation deal with eventual consistency
+                continue
+            folded = set(aggregate.state['contributions'])
+            if not folded <= listed.keys():
+                log.info('Rebuilding aggregate for %r since some of its '
+                         'contributions were removed', entity)
+                continue
+            folded_bundles = {listed[document_id].bundle.uuid for document_id in folded}
+            new = [c for document_id, c in listed.items() if document_id not in folded]
+            new_bundles = [c.bundle.uuid for c in new]
+            if any(c.deleted for c in new):
+                log.info('Rebuilding aggregate for %r since some of the new '
+                         'contributions are deletions', entity)
+            elif len(set(new_bundles)) < len(new_bundles) or not folded_bundles.isdisjoint(new_bundles):
+                log.info('Rebuilding aggregate for %r since some of the new '
+                         'contributions supersede other contributions', entity)
+            else:
+                new_contributions[entity] = new
+
+        # Only read the contents of the aggregates that will be updated. An
+        # aggregate that changed since it was first read is rebuilt.
+        if new_contributions:
+            aggregates = self._read_aggregates(new_contributions.keys(),
+                                               source_fields=['contents', 'bundles', 'aggregate_state'])
+            for entity in list(new_contributions.keys()):
+                aggregate = aggregates.get(entity)
+                if aggregate is None or aggregate.version != candidates[entity].version:
+                    log.info('Rebuilding aggregate for %r since it changed while '
+                             'being updated', entity)
+                    del new_contributions[entity]
+                else:
+                    candidates[entity] = aggregate
+
+        contributions = self._read_contributions_by_coordinates(
+            c for new in new_contributions.values() for c in new
+        )
+        contributions_by_entity: dict[
+            CataloguedEntityReference, list[CataloguedContribution]] = defaultdict(list)
+        for contribution in contributions:
+            contributions_by_entity[contribution.coordinates.entity].append(contribution)
+
+        transformers = self._transformers_by_entity_type()
+        aggregates = []
+        for entity in new_contributions.keys():
+            transformer = transformers[entity.catalog, entity.entity_type]
+            aggregate = self._update_aggregate(transformer,
+                                               candidates[entity],
+                                               contributions_by_entity[entity],
+                                               listed_contributions[entity].keys())
+            if aggregate is not None:
+                del old_aggregates[entity]
+                aggregates.append(aggregate)
+        log.info('Updated %i out of %i aggregate(s) incrementally',
+                 len(aggregates), len(old_aggregates) + len(aggregates))
+        return aggregates
+
+    def _update_aggregate(self,
+                          transformer: Type[Transformer],
+                          aggregate: Aggregate,
+                          contributions: list[CataloguedContribution],
+                          document_ids: Iterable[str]
+                          ) -> Optional[Aggregate]:
+        """
+        Return a copy of the given aggregate with the given contributions
+        folded into it, or None if the aggregate needs to be rebuilt.
+
+        :param document_ids: the IDs of all contributions to the entity,
+                             including the given ones
+        """
+        state = aggregate.state
+        contents = dict(aggregate.contents)
+        entity_hashes = {
+            entity_type: dict(hashes)
+            for entity_type, hashes in state['entities'].items()
+        }
+        aggregator_states = dict(state['aggregators'])
+
+        # Collect the inner entities not already reflected in the aggregate
+        new_entities: dict[EntityType, list[JSON]] = defaultdict(list)
+        for contribution in contributions:
+            for entity_type, entities in contribution.contents.items():
+                hashes = entity_hashes.setdefault(entity_type, {})
+                these_entities = new_entities[entity_type]
+                for entity in entities:
+                    entity_id = transformer.inner_entity_id(entity_type, entity)
+                    entity_hash = json_hash(entity).hexdigest()
+                    try:
+                        old_hash = hashes[entity_id]
+                    except KeyError:
+                        hashes[entity_id] = entity_hash
+                        these_entities.append(entity)
+                    else:
+                        if old_hash == entity_hash:
+                            continue
+                        log.info('Rebuilding aggregate for %r since inner entity '
+                                 '%r/%r needs to be reconciled',
+                                 aggregate.coordinates.entity, entity_type, entity_id)
+                        return None
 
+        inner_entity_types = transformer.inner_entity_types()
+        for entity_type, entities in new_entities.items():
+            if entity_type in inner_entity_types:
+                entities = contents.get(entity_type, []) + entities
+                if len(entities) > 1:
+                    log.warning('Rebuilding aggregate for %r since it would have '
+                                '%i inner entities of type %r',
+                                aggregate.coordinates.entity, len(entities), entity_type)
+                    return None
+            else:
+                aggregator = transformer.aggregator(entity_type)
+                if aggregator is None:
+                    entities = contents.get(entity_type, []) + entities
+                else:
+                    try:
+                        entities, aggregator_states[entity_type] = aggregator.merge(
+                            aggregator_states.get(entity_type),
+                            entities
+                        )
+                    except NotMergeable:
+                        log.info('Rebuilding aggregate for %r since aggregator for '
+                                 'entity type %r is not mergeable',
+                                 aggregate.coordinates.entity, entity_type)
+                        return None
+            contents[entity_type] = entities
+
+        # Like a full aggregation, which reads contributions in the order of
+        # their bundle UUID, retain the bundles with the lowest UUIDs. The
+        # aggregate being updated retains the lowest among the bundles already
+        # reflected in it, so the result is the lowest among all of them.
+        bundles = (aggregate.bundles or []) + [
+            BundleFQIDJSON(uuid=c.coordinates.bundle.uuid,
+                           version=c.coordinates.bundle.version)
+            for c in contributions
+        ]
+        bundles.sort(key=itemgetter('uuid'))
+        document_ids = sorted(document_ids)
+        state = dict(contributions=document_ids,
+                     entities=entity_hashes,
+                     aggregators=aggregator_states)
+        return attr.evolve(aggregate,
+                           contents=contents,
+                           sources=aggregate.sources | {c.source for c in contributions},
+                           bundles=bundles[:self._max_bundles],
+                           num_contributions=len(document_ids),
+                           state=self._bounded_state(aggregate.coordinates.entity, state))
+
+    def _list_contributions(self,
+                            entities: Iterable[CataloguedEntityReference]
+                            ) -> dict[CataloguedEntityReference, dict[str, ContributionCoordinates]]:
+        """
+        Return the coordinates of all contributions to the given entities,
+        without reading the contributions themselves.
+        """
+        index, query = self._contribution_query(entities)
+        result = defaultdict(dict)
+        for hits in self._contribution_pages(index, query, _source=False):
+            for hit in hits:
+                coordinates = DocumentCoordinates.from_hit(hit)
+                assert isinstance(coordinates, ContributionCoordinates), coordinates
+                result[coordinates.entity][hit['_id']] = coordinates
+        return result
+
+    def _read_contributions_by_coordinates(self,
+                                           coordinates: Iterable[ContributionCoordinates]
+                                           ) -> list[CataloguedContribution]:
+        request = {
+            'docs': [
+                {
+                    '_index': coordinate.index_name,
+                    '_id': coordinate.document_id
+                }
+                for coordinate in coordinates
+            ]
+        }
+        if not request['docs']:
+            return []
+        response = ESClientFactory.get().mget(body=request)
+        translators = self.catalogued_field_translators()
+        contributions = []
+        for doc in response['docs']:
+            if not doc.get('found', False):
+                raise EventualConsistencyException('Could not find contribution', doc['_id'])
+            contributions.append(Contribution.from_index(translators, doc))
+        log.info('Read %i new contribution(s)', len(contributions))
+        return contributions
+
+    def _contribution_query(self,
+                            entities: Iterable[CataloguedEntityReference]
+                            ) -> tuple[list[str], JSON]:
         entity_ids_by_index: dict[str, MutableSet[str]] = defaultdict(set)
-        for entity in tallies.keys():
+        for entity in entities:
             index = str(IndexName.create(catalog=entity.catalog,
                                          qualifier=entity.entity_type,
                                          doc_type=DocumentType.contribution))
@@ -604,153 +1149,344 @@ class IndexService(DocumentService):
                 ]
             }
         }
-
         index = sorted(list(entity_ids_by_index.keys()))
-        num_contributions = sum(tallies.values())
-        log.info('Reading %i expected contribution(s)', num_contributions)
+        return index, query
 
-        def pages() -> Iterable[JSONs]:
-            body = dict(query=query)
-            while True:
+    def _contribution_pages(self,
+                            index: list[str],
+                            query: JSON,
+                            **kwargs
+                            ) -> Iterable[JSONs]:
+        es_client = ESClientFactory.get()
+        body = dict(query=query)
+        while True:
+            response = es_client.search(index=index,
+                                        sort=['_index', 'document_id.keyword'],
+                                        body=body,
+                                        size=config.contribution_page_size,
+                                        track_total_hits=False,
+                                        seq_no_primary_term=Contribution.needs_seq_no_primary_term,
+                                        **kwargs)
+            hits = response['hits']['hits']
+            log.debug('Read a page with %i contribution(s)', len(hits))
+            if hits:
+                yield hits
+                body['search_after'] = hits[-1]['sort']
+            else:
+                break
+
+    #: The maximum number of pages of hits buffered for each slice while the
+    #: slices are merged
+    _slice_queue_size = 2
+
+    def _sliced_contribution_hits(self,
+                                  index: list[str],
+                                  query: JSON,
+                                  num_slices: int
+                                  ) -> Iterator[JSON]:
+        """
+        Read the hits matching the given query using a sliced scroll, reading
+        the slices concurrently. The hits are yielded in the same order as the
+        one in which :meth:`_contribution_pages` yields them. Each slice is
+        read by a separate thread that passes the pages it reads through a
+        bounded queue, so only a few pages per slice are held in memory at any
+        given time.
+        """
+        es_client = ESClientFactory.get()
+        sort = ['_index', 'document_id.keyword']
+        # Set when the merged hits are no longer consumed, to prevent the
+        # threads from blocking on a full queue forever
+        stopped = Event()
+
+        def put(queue: Queue, item: JSONs | BaseException | None) -> bool:
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=1)
+                except Full:
+                    pass
+                else:
+                    return True
+            return False
+
+        def read_slice(slice_id: int, queue: Queue) -> None:
+            try:
+                body = dict(query=query, slice=dict(id=slice_id, max=num_slices))
                 response = es_client.search(index=index,
-                                            sort=['_index', 'document_id.keyword'],
+                                            sort=sort,
                                             body=body,
                                             size=config.contribution_page_size,
+                                            scroll='1m',
                                             track_total_hits=False,
                                             seq_no_primary_term=Contribution.needs_seq_no_primary_term)
-                hits = response['hits']['hits']
-                log.debug('Read a page with %i contribution(s)', len(hits))
-                if hits:
-                    yield hits
-                    body['search_after'] = hits[-1]['sort']
-                else:
+                scroll_id = response['_scroll_id']
+                try:
+                    while True:
+                        hits = response['hits']['hits']
+                        log.debug('Read a page with %i contribution(s) from slice %i',
+                                  len(hits), slice_id)
+                        if hits and put(queue, hits):
+                            response = es_client.scroll(scroll_id=scroll_id, scroll='1m')
+                            scroll_id = response['_scroll_id']
+                        else:
+                            break
+                finally:
+                    es_client.clear_scroll(scroll_id=scroll_id)
+            except BaseException as e:
+                put(queue, e)
+            else:
+                put(queue, None)
+
+        def slice_hits(queue: Queue) -> Iterator[JSON]:
+            while True:
+                item = queue.get()
+                if item is None:
                     break
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield from item
 
-        contributions = [
-            Contribution.from_index(self.catalogued_field_types(), hit)
-            for hits in pages()
-            for hit in hits
-        ]
+        queues = [Queue(maxsize=self._slice_queue_size) for _ in range(num_slices)]
+        with ThreadPoolExecutor(max_workers=num_slices,
+                                thread_name_prefix='slice') as tpe:
+            try:
+                for slice_id, queue in enumerate(queues):
+                    tpe.submit(read_slice, slice_id, queue)
+                yield from heapq.merge(*map(slice_hits, queues), key=itemgetter('sort'))
+            finally:
+                stopped.set()
 
-        log.info('Read %i contribution(s)', len(contributions))
-        if log.isEnabledFor(logging.DEBUG):
-            entity_ref = attrgetter('entity')
-            contributions_by_entity = cast(
-                Iterator[tuple[EntityReference, Iterator[Contribution]]],
-                groupby(sorted(contributions, key=entity_ref), key=entity_ref)
-            )
-            log.debug(
-                'Number of contributions read, by entity: %r',
-                {
-                    f'{entity.entity_type}/{entity.entity_id}': sum(1 for _ in contribution_group)
-                    for entity, contribution_group in contributions_by_entity
-                }
-            )
-        return contributions
+    def _read_contributions(self,
+                            tallies: CataloguedTallies
+                            ) -> Iterator[CataloguedContribution]:
+        """
+        Lazily read the contributions to the entities in the given tallies.
+        The contributions are yielded in the order of their index name and
+        document ID. Since the document ID of a contribution starts with the
+        ID of the entity and the UUID of the bundle, contributions to the same
+        entity and from the same bundle are adjacent.
+        """
+        index, query = self._contribution_query(tallies.keys())
+        num_contributions = sum(tallies.values())
+        log.info('Reading %i expected contribution(s)', num_contributions)
+
+        # Only read concurrently if there is more than one page to be read
+        num_slices = min(config.contribution_read_concurrency,
+                         -(-num_contributions // config.contribution_page_size))
+        if num_slices > 1:
+            log.info('Reading contributions in %i concurrent slices', num_slices)
+            hits = self._sliced_contribution_hits(index, query, num_slices)
+        else:
+            hits = (hit for hits in self._contribution_pages(index, query) for hit in hits)
+
+        translators = self.catalogued_field_translators()
+        num_contributions = 0
+        for hit in hits:
+            yield Contribution.from_index(translators, hit)
+            num_contributions += 1
+        log.info('Read %i contribution(s)', num_contributions)
 
     def _aggregate(self,
-                   contributions: list[CataloguedContribution]
-                   ) -> list[Aggregate]:
-        # Group contributions by entity and bundle UUID
-        contributions_by_bundle: Mapping[
-            tuple[CataloguedEntityReference, BundleUUID],
-            list[CataloguedContribution]
-        ] = defaultdict(list)
+                   contributions: Iterable[CataloguedContribution]
+                   ) -> tuple[list[Aggregate], CataloguedTallies]:
+        """
+        Combine the given contributions into one aggregate per entity.
+
+        The contributions must be grouped by entity and, within each entity,
+        by bundle UUID, as they are when yielded by
+        :meth:`_read_contributions`. Only the contributions selected for one
+        entity are held in memory at any given time.
+
+        Returns the aggregates and the raw, unfiltered number of contributions
+        to each entity, including entities that ended up without aggregate
+        because all contributions to them are deletions.
+        """
+        transformers = self._transformers_by_entity_type()
+        aggregates = []
         tallies: MutableCataloguedTallies = Counter()
-        for contribution in contributions:
-            entity = contribution.coordinates.entity
-            bundle_uuid = contribution.coordinates.bundle.uuid
-            contributions_by_bundle[entity, bundle_uuid].append(contribution)
-            # Track the raw, unfiltered number of contributions per entity.
-            assert isinstance(contribution.coordinates.entity, CataloguedEntityReference)
-            tallies[contribution.coordinates.entity] += 1
-
-        # For each entity and bundle, find the most recent contribution that is
-        # not a deletion
-        contributions_by_entity: dict[
-            CataloguedEntityReference, list[CataloguedContribution]] = defaultdict(list)
-        for (entity, bundle_uuid), contributions in contributions_by_bundle.items():
-            contributions = sorted(contributions,
-                                   key=attrgetter('coordinates.bundle.version', 'coordinates.deleted'),
-                                   reverse=True)
-            for bundle_version, group in groupby(contributions, key=attrgetter('coordinates.bundle.version')):
-                contribution: Contribution = next(group)
-                if not contribution.coordinates.deleted:
+        num_selected: dict[CataloguedEntityReference, int] = {}
+        entity_of = attrgetter('coordinates.entity')
+        bundle_uuid_of = attrgetter('coordinates.bundle.uuid')
+        for entity, entity_contributions in groupby(contributions, key=entity_of):
+            assert isinstance(entity, CataloguedEntityReference)
+            assert entity not in tallies, ('Contributions not grouped by entity', entity)
+            document_ids = []
+            selected_contributions = []
+            seen_bundle_uuids = set()
+            for bundle_uuid, bundle_contributions in groupby(entity_contributions, key=bundle_uuid_of):
+                assert bundle_uuid not in seen_bundle_uuids, (
+                    'Contributions not grouped by bundle', entity, bundle_uuid
+                )
+                seen_bundle_uuids.add(bundle_uuid)
+                bundle_contributions = list(bundle_contributions)
+                document_ids.extend(c.coordinates.document_id for c in bundle_contributions)
+                # Track the raw, unfiltered number of contributions per entity.
+                tallies[entity] += len(bundle_contributions)
+                contribution = self._select_contribution(bundle_contributions)
+                if contribution is not None:
                     assert bundle_uuid == contribution.coordinates.bundle.uuid
-                    assert bundle_version == contribution.coordinates.bundle.version
                     assert entity == contribution.coordinates.entity
-                    contributions_by_entity[entity].append(contribution)
-                    break
+                    selected_contributions.append(contribution)
+            if selected_contributions:
+                num_selected[entity] = len(selected_contributions)
+                transformer = transformers[entity.catalog, entity.entity_type]
+                aggregate = self._aggregate_contributions(transformer,
+                                                          entity,
+                                                          selected_contributions,
+                                                          document_ids,
+                                                          num_contributions=tallies[entity])
+                aggregates.append(aggregate)
+
         log.info('Selected %i contribution(s) to be aggregated.',
-                 sum(len(contributions) for contributions in contributions_by_entity.values()))
+                 sum(num_selected.values()))
         if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                'Number of contributions read, by entity: %r',
+                {
+                    f'{entity.entity_type}/{entity.entity_id}': tally
+                    for entity, tally in sorted(tallies.items())
+                }
+            )
             log.debug(
                 'Number of contributions selected for aggregation, by entity: %r',
                 {
-                    f'{entity.entity_type}/{entity.entity_id}': len(contributions)
-                    for entity, contributions in sorted(contributions_by_entity.items())
+                    f'{entity.entity_type}/{entity.entity_id}': count
+                    for entity, count in sorted(num_selected.items())
                 }
             )
+        return aggregates, tallies
 
-        # Create lookup for transformer by entity type
-        transformers: dict[tuple[CatalogName, str], Type[Transformer]] = {
+    def _select_contribution(self,
+                             contributions: list[CataloguedContribution]
+                             ) -> Optional[CataloguedContribution]:
+        """
+        Given all contributions from the same bundle to the same entity, return
+        the most recent one that is not a deletion, or None if there is no
+        such contribution.
+        """
+        contributions = sorted(contributions,
+                               key=attrgetter('coordinates.bundle.version', 'coordinates.deleted'),
+                               reverse=True)
+        for bundle_version, group in groupby(contributions, key=attrgetter('coordinates.bundle.version')):
+            contribution = next(group)
+            if not contribution.coordinates.deleted:
+                assert bundle_version == contribution.coordinates.bundle.version
+                return contribution
+        return None
+
+    def _aggregate_contributions(self,
+                                 transformer: Type[Transformer],
+                                 entity: CataloguedEntityReference,
+                                 contributions: list[CataloguedContribution],
+                                 document_ids: list[str],
+                                 *,
+                                 num_contributions: int
+                                 ) -> Aggregate:
+        contents, state = self._aggregate_entity(transformer, contributions)
+        if state is not None:
+            state['contributions'] = sorted(document_ids)
+            state = self._bounded_state(entity, state)
+        bundles = [
+            BundleFQIDJSON(uuid=c.coordinates.bundle.uuid,
+                           version=c.coordinates.bundle.version)
+            for c in contributions
+        ]
+        max_bundles = self._max_bundles
+        if len(bundles) > max_bundles:
+            log.warning('Only aggregating %i out of %i bundles for outer entity %r',
+                        max_bundles, len(bundles), entity)
+        bundles = bundles[:max_bundles]
+        sources = set(c.source for c in contributions)
+        aggregate_cls = self.aggregate_class(entity.catalog)
+        if TYPE_CHECKING:  # work around https://youtrack.jetbrains.com/issue/PY-44728
+            aggregate_cls = Aggregate
+        return aggregate_cls(coordinates=AggregateCoordinates(entity=entity),
+                             version=None,
+                             sources=sources,
+                             contents=contents,
+                             bundles=bundles,
+                             num_contributions=num_contributions,
+                             state=state)
+
+    # FIXME: Replace hard coded limit with a config property
+    #       https://github.com/DataBiosphere/azul/issues/3725
+    _max_bundles = 100
+
+    #: The maximum size of the state stored in an aggregate, in bytes of JSON
+    _max_state_size = 256 * 1024
+
+    def _bounded_state(self,
+                       entity: CataloguedEntityReference,
+                       state: MutableJSON
+                       ) -> Optional[MutableJSON]:
+        """
+        Return the given aggregate state, or None if it is too large to be
+        stored in the aggregate, in which case the aggregate will be rebuilt
+        the next time it needs to be updated.
+        """
+        size = len(json.dumps(state))
+        if size > self._max_state_size:
+            log.info('Not storing aggregate state for %r since its size of %i '
+                     'bytes exceeds the limit', entity, size)
+            return None
+        else:
+            return state
+
+    def _transformers_by_entity_type(self
+                                     ) -> dict[tuple[CatalogName, str], Type[Transformer]]:
+        """
+        Create lookup for transformer by entity type
+        """
+        return {
             (catalog, transformer_cls.entity_type()): transformer_cls
             for catalog in config.catalogs
             for transformer_cls in self.transformer_types(catalog)
         }
 
-        # Aggregate contributions for the same entity
-        aggregates = []
-        for entity, contributions in contributions_by_entity.items():
-            transformer = transformers[entity.catalog, entity.entity_type]
-            contents = self._aggregate_entity(transformer, contributions)
-            bundles = [
-                BundleFQIDJSON(uuid=c.coordinates.bundle.uuid,
-                               version=c.coordinates.bundle.version)
-                for c in contributions
-            ]
-            # FIXME: Replace hard coded limit with a config property
-            #       https://github.com/DataBiosphere/azul/issues/3725
-            max_bundles = 100
-            if len(bundles) > max_bundles:
-                log.warning('Only aggregating %i out of %i bundles for outer entity %r',
-                            max_bundles, len(bundles), entity)
-            bundles = bundles[:max_bundles]
-            sources = set(c.source for c in contributions)
-            aggregate_cls = self.aggregate_class(entity.catalog)
-            if TYPE_CHECKING:  # work around https://youtrack.jetbrains.com/issue/PY-44728
-                aggregate_cls = Aggregate
-            aggregate = aggregate_cls(coordinates=AggregateCoordinates(entity=entity),
-                                      version=None,
-                                      sources=sources,
-                                      contents=contents,
-                                      bundles=bundles,
-                                      num_contributions=tallies[entity])
-            aggregates.append(aggregate)
-
-        return aggregates
-
     def _aggregate_entity(self,
                           transformer: Type[Transformer],
                           contributions: list[Contribution]
-                          ) -> JSON:
+                          ) -> tuple[JSON, Optional[MutableJSON]]:
+        """
+        Aggregate the given contributions to an entity and return the contents
+        of the aggregate along with the state for updating it incrementally,
+        or None for the latter if incremental aggregation is disabled or not
+        supported by any of the aggregators involved.
+        """
         contents = self._reconcile(transformer, contributions)
         aggregate_contents = {}
         inner_entity_types = transformer.inner_entity_types()
         inner_entity_counts = []
+        if config.incremental_aggregation:
+            entity_hashes, aggregator_states = {}, {}
+            state = dict(entities=entity_hashes, aggregators=aggregator_states)
+        else:
+            state = None
         for entity_type, entities in contents.items():
             num_entities = len(entities)
+            if state is not None:
+                entity_hashes[entity_type] = {
+                    transformer.inner_entity_id(entity_type, entity): json_hash(entity).hexdigest()
+                    for entity in entities
+                }
             if entity_type in inner_entity_types:
                 assert num_entities <= 1
                 inner_entity_counts.append(num_entities)
             else:
                 aggregator = transformer.aggregator(entity_type)
                 if aggregator is not None:
-                    entities = aggregator.aggregate(entities)
+                    if state is None:
+                        entities = aggregator.aggregate(entities)
+                    else:
+                        try:
+                            entities, aggregator_states[entity_type] = aggregator.merge(None, entities)
+                        except NotMergeable:
+                            state = None
+                            entities = aggregator.aggregate(entities)
             aggregate_contents[entity_type] = entities
         if inner_entity_counts:
             assert sum(inner_entity_counts) > 0
-        return aggregate_contents
+        return aggregate_contents, state
 
     def _reconcile(self,
                    transformer: Type[Transformer],
@@ -802,22 +1538,45 @@ class IndexService(DocumentService):
             DocumentType.replica: config.replica_conflict_limit
         }
         return IndexWriter(catalog,
-                           self.catalogued_field_types(),
+                           self.catalogued_field_translators(),
                            refresh=False,
                            conflict_retry_limit=limits[doc_type],
                            error_retry_limit=0)
 
 
+def _fetch_and_transform(catalog: CatalogName,
+                         bundle_fqid: SourcedBundleFQIDJSON
+                         ) -> tuple[list[Contribution], list[Replica]]:
+    """
+    Fetch and deeply transform the given bundle. Used by the workers of
+    :meth:`IndexService.bulk_index`.
+    """
+    service = _worker_index_service()
+    bundle = service.fetch_bundle(catalog, bundle_fqid)
+    contributions, replicas = [], []
+    for partition_contributions, partition_replicas in service.deep_transform(catalog,
+                                                                              bundle,
+                                                                              delete=False):
+        contributions.extend(partition_contributions)
+        replicas.extend(partition_replicas)
+    return contributions, replicas
+
+
+@cache
+def _worker_index_service() -> IndexService:
+    return IndexService()
+
+
 class IndexWriter:
 
     def __init__(self,
                  catalog: Optional[CatalogName],
-                 field_types: CataloguedFieldTypes,
+                 translators: CataloguedFieldTranslators,
                  refresh: Union[bool, str],
                  conflict_retry_limit: int,
                  error_retry_limit: int) -> None:
         """
-        :param field_types: A mapping of field paths to field type
+        :param translators: A mapping of catalog names to field translators
 
         :param refresh: https://www.elastic.co/guide/en/elasticsearch/reference/5.5/docs-refresh.html
 
@@ -833,7 +1592,7 @@ class IndexWriter:
         """
         super().__init__()
         self.catalog = catalog
-        self.field_types = field_types
+        self.translators = translators
         self.refresh = refresh
         self.conflict_retry_limit = conflict_retry_limit
         self.error_retry_limit = error_retry_limit
@@ -862,7 +1621,7 @@ class IndexWriter:
         for doc in documents:
             try:
                 method = getattr(self.es_client, doc.op_type.name)
-                method(refresh=self.refresh, **doc.to_index(self.catalog, self.field_types))
+                method(refresh=self.refresh, **doc.to_index(self.catalog, self.translators))
             except ConflictError as e:
                 self._on_conflict(doc, e)
             except ElasticsearchException as e:
@@ -879,38 +1638,99 @@ class IndexWriter:
             doc.coordinates: doc
             for doc in documents
         }
-        actions = [
-            doc.to_index(self.catalog, self.field_types, bulk=True)
-            for doc in documents.values()
-        ]
-        log.info('Writing documents using streaming_bulk().')
-        # We cannot use parallel_bulk() for 1024+ actions because Lambda doesn't
-        # support shared memory. See the issue below for details.
+        log.info('Writing documents using parallel bulk requests.')
+        # We cannot use parallel_bulk() because it relies on a multiprocessing
+        # thread pool and Lambda doesn't support shared memory. See the issue
+        # below for details. Instead, we serialize the actions up front, pack
+        # them into chunks and send the chunks from a pool of threads.
         #
         # https://github.com/DataBiosphere/azul/issues/3200
         #
-        # Another caveat to keep in mind is that streaming_bulk() may still
-        # exceed the maximum request size if one or more actions exceed it.
-        # There is no way to split a single action and hence a single document
-        # into multiple requests.
+        # Note that a chunk may still exceed the maximum request size if the
+        # action in it does. There is no way to split a single action and hence
+        # a single document into multiple requests.
         #
-        response = streaming_bulk(client=self.es_client,
-                                  actions=actions,
-                                  refresh=self.refresh,
-                                  raise_on_error=False,
-                                  max_chunk_bytes=config.max_chunk_size)
-        for success, info in response:
-            op_type, info = one(info.items())
-            assert op_type in OpType.__members__, op_type
-            coordinates = DocumentCoordinates.from_hit(info)
-            doc = documents[coordinates]
-            if success:
-                self._on_success(doc)
-            else:
-                if info['status'] == 409:
-                    self._on_conflict(doc, info)
+        serializer = self.es_client.transport.serializer
+        actions: list[tuple[Document, bytes]] = []
+        for doc in documents.values():
+            action, source = expand_action(doc.to_index(self.catalog, self.translators, bulk=True))
+            lines = [action] if source is None else [action, source]
+            actions.append((doc, b''.join(serializer.dumps(line).encode() + b'\n' for line in lines)))
+
+        delays = iter(self.bulk_rejection_delays)
+        while actions:
+            chunks = list(self._chunk_actions(actions))
+            log.info('Writing %i document(s) in %i bulk request(s)', len(actions), len(chunks))
+            actions = []
+            with ThreadPoolExecutor(max_workers=config.es_bulk_concurrency,
+                                    thread_name_prefix='bulk') as tpe:
+                futures = [tpe.submit(self._send_chunk, chunk) for chunk in chunks]
+                for chunk, future in zip(chunks, futures):
+                    for (doc, action), item in zip(chunk, future.result()):
+                        status = item.get('status')
+                        if status is not None and 200 <= status < 300:
+                            self._on_success(doc)
+                        elif status == 409:
+                            self._on_conflict(doc, item)
+                        elif self._is_rejection(item):
+                            actions.append((doc, action))
+                        else:
+                            self._on_error(doc, item)
+            if actions:
+                delay = next(delays, None)
+                if delay is None:
+                    for doc, _ in actions:
+                        self._on_error(doc, 'Rejected by Elasticsearch')
+                    actions = []
                 else:
-                    self._on_error(doc, info)
+                    log.warning('Elasticsearch rejected %i document(s), retrying in %.1fs',
+                                len(actions), delay)
+                    time.sleep(delay)
+
+    #: The number of seconds to wait before retrying the documents that
+    #: Elasticsearch rejected because it was overloaded. The documents are
+    #: retried once per delay, within the same call to :meth:`write`. After
+    #: that, rejections count as errors.
+    #:
+    bulk_rejection_delays = (1, 2, 4)
+
+    def _chunk_actions(self,
+                       actions: list[tuple[Document, bytes]]
+                       ) -> Iterable[list[tuple[Document, bytes]]]:
+        chunk, chunk_size = [], 0
+        for doc, action in actions:
+            if chunk and chunk_size + len(action) > config.max_chunk_size:
+                yield chunk
+                chunk, chunk_size = [], 0
+            chunk.append((doc, action))
+            chunk_size += len(action)
+        if chunk:
+            yield chunk
+
+    def _send_chunk(self, chunk: list[tuple[Document, bytes]]) -> JSONs:
+        """
+        Send the given chunk of serialized actions in a single bulk request and
+        return one item per action, describing the outcome of that action. If
+        the request fails as a whole, all items describe that failure.
+        """
+        body = b''.join(action for _, action in chunk)
+        try:
+            response = self.es_client.bulk(body=body, refresh=self.refresh)
+        except TransportError as e:
+            status = e.status_code if isinstance(e.status_code, int) else None
+            item = {'status': status, 'error': e.error}
+            return [item] * len(chunk)
+        else:
+            items = [one(item.values()) for item in response['items']]
+            assert len(items) == len(chunk), (len(items), len(chunk))
+            return items
+
+    def _is_rejection(self, item: JSON) -> bool:
+        if item.get('status') == 429:
+            return True
+        else:
+            error = item.get('error')
+            return isinstance(error, dict) and error.get('type') == 'es_rejected_execution_exception'
 
     def _on_success(self, doc: Document):
         coordinates = doc.coordinates
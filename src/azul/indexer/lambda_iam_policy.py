@@ -120,7 +120,19 @@ policy = {
                 "s3:PutObject"
             ],
             "Resource": [
-                "${aws_s3_bucket.%s.arn}/health/*" % config.storage_term,
+                "${aws_s3_bucket.%s.arn}/%s/*" % (config.storage_term, prefix)
+                for prefix in ('health', 'tdr')
+            ]
+        },
+        {
+            "Effect": "Allow",
+            "Action": [
+                "dynamodb:Scan",
+                "dynamodb:UpdateItem",
+                "dynamodb:DeleteItem"
+            ],
+            "Resource": [
+                f"arn:aws:dynamodb:{aws.region_name}:{aws.account}:table/{config.dynamo_tally_buffer_table_name}"
             ]
         },
         {
@@ -0,0 +1,174 @@
+from collections.abc import (
+    Iterator,
+    Mapping,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+import logging
+from typing import (
+    Callable,
+    Optional,
+)
+
+from more_itertools import (
+    chunked,
+)
+
+from azul import (
+    config,
+)
+from azul.deployment import (
+    aws,
+)
+from azul.indexer.document import (
+    CataloguedEntityReference,
+)
+from azul.time import (
+    RemainingTime,
+)
+
+log = logging.getLogger(__name__)
+
+Tallies = Mapping[CataloguedEntityReference, int]
+
+
+class TallyBuffer:
+    """
+    A DynamoDB table in which the tallies for the same entity are merged before
+    they are queued for aggregation. Each item in the table represents one
+    entity. Adding a tally to the buffer atomically increments the item's
+    number of contributions, creating the item if necessary. Flushing the
+    buffer atomically removes each item before queueing a tally with the
+    accumulated number of contributions. A tally added concurrently with a
+    flush either lands in an item that is removed by that flush or in a new
+    item that is removed by the next one.
+    """
+    table_name = config.dynamo_tally_buffer_table_name
+
+    key_attribute = 'entity'
+    count_attribute = 'num_contributions'
+
+    #: The maximum number of concurrent requests to DynamoDB
+    concurrency = 10
+
+    #: The number of items removed from the buffer at a time. Each batch is
+    #: queued before the next one is removed, which limits the number of
+    #: tallies that are lost if the process is terminated in between.
+    flush_batch_size = 10
+
+    #: The minimum remaining time, in seconds, for removing another batch of
+    #: items from the buffer and queueing it
+    flush_time_margin = 10
+
+    @property
+    def _dynamodb(self):
+        return aws.dynamodb
+
+    def add(self, tallies: Tallies) -> None:
+        """
+        Merge the given tallies into the buffer. A tally of 0 still creates an
+        item so that the entity is aggregated when the buffer is flushed.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='tally-buffer') as tpe:
+            futures = [
+                tpe.submit(self._add, entity, num_contributions)
+                for entity, num_contributions in tallies.items()
+            ]
+            for future in futures:
+                future.result()
+        log.info('Buffered %i tallies for a total of %i contributions',
+                 len(tallies), sum(tallies.values()))
+
+    def _add(self, entity: CataloguedEntityReference, num_contributions: int):
+        self._dynamodb.update_item(TableName=self.table_name,
+                                   Key={self.key_attribute: {'S': str(entity)}},
+                                   UpdateExpression='ADD #c :c',
+                                   ExpressionAttributeNames={'#c': self.count_attribute},
+                                   ExpressionAttributeValues={':c': {'N': str(num_contributions)}})
+
+    def flush(self,
+              queue: Callable[[Tallies], None],
+              remaining_time: RemainingTime
+              ) -> int:
+        """
+        Remove every item from the buffer and pass the resulting tallies to the
+        given callable, in batches of at most :attr:`flush_batch_size` items.
+        Return the number of tallies flushed. If an exception occurs, the
+        tallies already removed in the current batch are added back to the
+        buffer before the exception is propagated. Once the remaining time gets
+        too short to flush another batch, the remaining items are left for the
+        next flush.
+        """
+        num_tallies = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='tally-buffer') as tpe:
+            for keys in self._scan():
+                for batch in chunked(keys, self.flush_batch_size):
+                    if remaining_time.get() < self.flush_time_margin:
+                        log.info('Running out of time, leaving the remaining tallies '
+                                 'in the buffer after flushing %i', num_tallies)
+                        return num_tallies
+                    futures = {key: tpe.submit(self._remove, key) for key in batch}
+                    tallies = {}
+                    error = None
+                    for key, future in futures.items():
+                        try:
+                            num_contributions = future.result()
+                        except BaseException as e:
+                            error = e
+                        else:
+                            if num_contributions is not None:
+                                tallies[self._parse_entity(key)] = num_contributions
+                    try:
+                        if error is not None:
+                            raise error
+                        if tallies:
+                            queue(tallies)
+                    except BaseException:
+                        if tallies:
+                            log.warning('Failed to flush %i tallies, returning them to the buffer',
+                                        len(tallies))
+                            self.add(tallies)
+                        raise
+                    num_tallies += len(tallies)
+        log.info('Flushed %i tallies from the buffer', num_tallies)
+        return num_tallies
+
+    def _remove(self, key: str) -> Optional[int]:
+        """
+        Remove the item with the given key and return its number of
+        contributions, or None if the item was already removed by a concurrent
+        flush.
+        """
+        response = self._dynamodb.delete_item(TableName=self.table_name,
+                                              Key={self.key_attribute: {'S': key}},
+                                              ReturnValues='ALL_OLD')
+        try:
+            item = response['Attributes']
+        except KeyError:
+            return None
+        else:
+            return int(item[self.count_attribute]['N'])
+
+    def count(self) -> int:
+        """
+        The number of entities with tallies in the buffer
+        """
+        return sum(map(len, self._scan()))
+
+    def _scan(self) -> Iterator[list[str]]:
+        paginator = self._dynamodb.get_paginator('scan')
+        pages = paginator.paginate(TableName=self.table_name,
+                                   ProjectionExpression='#k',
+                                   ExpressionAttributeNames={'#k': self.key_attribute},
+                                   ConsistentRead=True)
+        for page in pages:
+            yield [item[self.key_attribute]['S'] for item in page['Items']]
+
+    def _parse_entity(self, key: str) -> CataloguedEntityReference:
+        catalog, entity_type, entity_id = key.split('/')
+        return CataloguedEntityReference(catalog=catalog,
+                                         entity_type=entity_type,
+                                         entity_id=entity_id)
@@ -3,6 +3,9 @@ import attr
 from azul import (
     JSON,
 )
+from azul.chalice import (
+    LazyJSON,
+)
 from azul.health import (
     Health,
 )
@@ -79,9 +82,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def full_health(self) -> JSON:
+    def full_health(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Complete health check',
                 'description': format_description(f'''
                     Health check of the {self.app_name} REST API and all
@@ -98,9 +101,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def basic_health(self) -> JSON:
+    def basic_health(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Basic health check',
                 'description': format_description(f'''
                     Health check of only the REST API itself, excluding other
@@ -113,9 +116,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def cached_health(self) -> JSON:
+    def cached_health(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Cached health check for continuous monitoring',
                 'description': format_description(f'''
                     Return a cached copy of the
@@ -131,9 +134,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def fast_health(self) -> JSON:
+    def fast_health(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Fast health check',
                 'description': format_description('''
                     Performance-optimized health check of the REST API and other
@@ -148,9 +151,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def custom_health(self) -> JSON:
+    def custom_health(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Selective health check',
                 'description': format_description('''
                     This endpoint allows clients to request a health check on a
@@ -160,7 +163,7 @@ class CommonEndpointSpecs:
                 '''),
                 **self._health_spec(self._all_keys)
             },
-            'path_spec': {
+            'path_spec': lambda: {
                 'parameters': [
                     params.path(
                         'keys',
@@ -175,9 +178,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def openapi(self) -> JSON:
+    def openapi(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Return OpenAPI specifications for this REST API',
                 'description': format_description('''
                     This endpoint returns the [OpenAPI specifications]'
@@ -204,9 +207,9 @@ class CommonEndpointSpecs:
         }
 
     @property
-    def version(self) -> JSON:
+    def version(self) -> dict[str, LazyJSON]:
         return {
-            'method_spec': {
+            'method_spec': lambda: {
                 'summary': 'Describe current version of this REST API',
                 'tags': ['Auxiliary'],
                 'responses': {
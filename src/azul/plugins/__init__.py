@@ -58,6 +58,9 @@ from azul.indexer.document import (
 from azul.indexer.transform import (
     Transformer,
 )
+from azul.time import (
+    RemainingTime,
+)
 from azul.types import (
     JSON,
     JSONs,
@@ -318,6 +321,19 @@ class MetadataPlugin(Plugin[BUNDLE]):
                     }
                     if index_name.doc_type is DocumentType.replica else
                     {}
+                ),
+                **(
+                    {
+                        # The state for incremental aggregation is only ever
+                        # retrieved verbatim, so there is no point in indexing it
+                        'aggregate_state': {
+                            'type': 'object',
+                            'enabled': False
+                        }
+                    }
+                    if index_name.doc_type is DocumentType.aggregate
+                    and config.incremental_aggregation else
+                    {}
                 )
             },
             'dynamic_templates': [
@@ -437,8 +453,9 @@ class MetadataPlugin(Plugin[BUNDLE]):
                             ) -> tuple[Iterable[JSON], Sequence[str], JSON]:
         """
         Generate a PFB schema for the verbatim manifest. The default,
-        metadata-agnostic implementation loads all replica documents into memory
-        and dynamically generates a schema based on their observed shapes. This
+        metadata-agnostic implementation makes a pass over all replica documents
+        and dynamically generates a schema based on their observed shapes,
+        spooling the replicas to a temporary file for a second pass. This
         results in inconsistencies in the schema depending on the manifest
         contents, so subclasses should override this method if their metadata
         adheres to an authoritative schema that can be known in advance.
@@ -453,9 +470,7 @@ class MetadataPlugin(Plugin[BUNDLE]):
         from azul.service import (
             avro_pfb,
         )
-        replicas = list(replicas)
-        replica_types, pfb_schema = avro_pfb.pfb_schema_from_replicas(replicas)
-        return replicas, replica_types, pfb_schema
+        return avro_pfb.spooled_pfb_schema_from_replicas(replicas)
 
     @abstractmethod
     def document_slice(self, entity_type: str) -> DocumentSlice | None:
@@ -657,6 +672,26 @@ class RepositoryPlugin(Plugin[BUNDLE],
 
         raise NotImplementedError
 
+    def prefetch_source(self, source: SOURCE_REF) -> None:
+        """
+        Prepare for the fetching of the bundles in the given source. This is
+        done once per source and reindex, before any partition of the source is
+        reindexed. Plugins that don't benefit from doing so ignore this.
+        """
+        pass
+
+    def prefetch_partition(self,
+                           source: SOURCE_REF,
+                           prefix: str,
+                           remaining_time: RemainingTime
+                           ) -> None:
+        """
+        Prepare for the fetching of the bundles in the given source whose UUID
+        starts with the given prefix, within the given time. Plugins that don't
+        benefit from doing so ignore this.
+        """
+        pass
+
     @abstractmethod
     def fetch_bundle(self, bundle_fqid: BUNDLE_FQID) -> BUNDLE:
         """
@@ -2,12 +2,26 @@ from abc import (
     ABC,
     abstractmethod,
 )
+from collections import (
+    OrderedDict,
+)
+from collections.abc import (
+    Hashable,
+    Iterable,
+)
 import datetime
+import gzip
+import json
 import logging
+from threading import (
+    Event,
+    Lock,
+)
 import time
 from typing import (
     AbstractSet,
     Callable,
+    ClassVar,
     Sequence,
     TypeVar,
 )
@@ -22,6 +36,7 @@ from furl import (
 
 from azul import (
     CatalogName,
+    cache,
     cache_per_thread,
     config,
     require,
@@ -30,6 +45,9 @@ from azul.auth import (
     Authentication,
     OAuth2,
 )
+from azul.bigquery import (
+    BigQueryRow,
+)
 from azul.drs import (
     AccessMethod,
     DRSClient,
@@ -45,6 +63,10 @@ from azul.plugins import (
     RepositoryFileDownload,
     RepositoryPlugin,
 )
+from azul.service.storage_service import (
+    StorageObjectNotFound,
+    StorageService,
+)
 from azul.strings import (
     longest_common_prefix,
 )
@@ -54,10 +76,12 @@ from azul.terra import (
     TDRSourceSpec,
 )
 from azul.time import (
+    RemainingTime,
     format_dcp2_datetime,
     parse_dcp2_version,
 )
 from azul.types import (
+    AnyJSON,
     JSON,
 )
 
@@ -78,6 +102,183 @@ class TDRBundle(Bundle[TDRBundleFQID], ABC):
         return manifest_entry.get('drs_uri')
 
 
+class TDRRowCache:
+    """
+    A thread-safe cache of rows retrieved from the tables in TDR snapshots,
+    keyed by the fully qualified name of the table and the primary key of the
+    row. Since snapshots are immutable, cached rows never need to be
+    invalidated. When the estimated combined size of the cached rows exceeds
+    the given maximum, the least recently used rows are evicted.
+
+    >>> cache = TDRRowCache(max_size=15)
+    >>> cache.put('t', [('a', {'id': 'a', 'c': 'foo'}), ('b', {'id': 'b', 'c': 'bar'})])
+    >>> cache.get('t', {'a', 'c'})
+    ([{'id': 'a', 'c': 'foo'}], {'c'})
+
+    Adding a row that does not fit evicts the least recently used one …
+
+    >>> cache.put('t', [('c', {'id': 'c', 'c': 'baz'})])
+    >>> sorted(key for _, key in cache._rows)
+    ['a', 'c']
+    >>> cache.evictions
+    1
+
+    … and a cache with a maximum size of zero doesn't cache anything.
+
+    >>> cache = TDRRowCache(max_size=0)
+    >>> cache.put('t', [('a', {'id': 'a'})])
+    >>> cache.get('t', {'a'})
+    ([], {'a'})
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        #: The number of rows evicted from this cache so far
+        self.evictions = 0
+        self._size = 0
+        self._rows: OrderedDict[tuple[str, Hashable], tuple[BigQueryRow, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self,
+            table_name: str,
+            keys: Iterable[Hashable]
+            ) -> tuple[list[BigQueryRow], set[Hashable]]:
+        """
+        Return the cached rows with the given primary keys and the set of keys
+        for which no row is cached.
+        """
+        rows, missing = [], set()
+        with self._lock:
+            for key in keys:
+                try:
+                    row, _ = self._rows[table_name, key]
+                except KeyError:
+                    missing.add(key)
+                else:
+                    self._rows.move_to_end((table_name, key))
+                    rows.append(row)
+        return rows, missing
+
+    def put(self,
+            table_name: str,
+            rows: Iterable[tuple[Hashable, BigQueryRow]]
+            ) -> None:
+        """
+        Cache the given rows, each paired with its primary key. The rows must
+        not be modified after they were passed to this method.
+        """
+        if self.max_size == 0:
+            return
+        with self._lock:
+            for key, row in rows:
+                size = self._row_size(row)
+                if size <= self.max_size:
+                    old = self._rows.pop((table_name, key), None)
+                    if old is not None:
+                        self._size -= old[1]
+                    self._rows[table_name, key] = row, size
+                    self._size += size
+            while self._size > self.max_size:
+                _, (_, size) = self._rows.popitem(last=False)
+                self._size -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows.clear()
+            self._size = 0
+
+    @classmethod
+    def _row_size(cls, row: BigQueryRow) -> int:
+        """
+        A cheap estimate of the memory footprint of the given row
+
+        >>> TDRRowCache._row_size({'id': 'a', 'n': 42})
+        12
+        """
+        return sum(
+            len(k) + (len(v) if isinstance(v, (str, bytes)) else 8)
+            for k, v in row.items()
+        )
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class TDRRowCacheStats:
+    """
+    The number of rows that were found in, or missing from, a
+    :class:`TDRRowCache` while retrieving a bundle. The counters may be updated
+    concurrently.
+    """
+    hits: int = 0
+    misses: int = 0
+    _lock: Lock = attr.ib(factory=Lock, init=False, repr=False)
+
+    def update(self, *, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class TDRPartitionRows:
+    """
+    The rows prefetched from a partition of a TDR snapshot, by entity type,
+    each paired with the JSON representation of its primary key. Rows are only
+    added while their combined size, estimated like :class:`TDRRowCache` does,
+    doesn't exceed the given maximum, and while there is time remaining. Once
+    either limit is reached, the rows are incomplete, which is harmless since
+    the missing ones can still be retrieved per bundle.
+
+    >>> from azul.time import SpecificRemainingTime
+    >>> rows = TDRPartitionRows(max_size=10, remaining_time=SpecificRemainingTime(60))
+    >>> rows.add('t', [('a', {'id': 'a', 'c': 'foo'}), ('b', {'id': 'b', 'c': 'bar'})])
+    False
+    >>> rows.rows, len(rows), rows.complete
+    ({'t': [('a', {'id': 'a', 'c': 'foo'})]}, 1, False)
+
+    Once incomplete, no more rows are added.
+
+    >>> rows.add('u', [('c', {})])
+    False
+    >>> len(rows)
+    1
+    """
+    max_size: int
+    remaining_time: RemainingTime
+    rows: dict[str, list[tuple[AnyJSON, BigQueryRow]]] = attr.Factory(dict)
+    #: The estimated combined size of the rows
+    size: int = 0
+    #: False if a limit was reached before all rows could be added
+    complete: bool = True
+
+    def add(self,
+            entity_type: str,
+            rows: Iterable[tuple[AnyJSON, BigQueryRow]]
+            ) -> bool:
+        """
+        Add the given rows of the given entity type and return True, unless a
+        limit is reached, in which case return False. The caller should then
+        stop retrieving rows. Time is only checked once per call, so the
+        caller should call this method between queries.
+        """
+        if self.complete and self.remaining_time.get() == 0:
+            self.complete = False
+        if self.complete:
+            added = self.rows.setdefault(entity_type, [])
+            for key, row in rows:
+                size = TDRRowCache._row_size(row)
+                if self.size + size > self.max_size:
+                    self.complete = False
+                    break
+                else:
+                    added.append((key, row))
+                    self.size += size
+        return self.complete
+
+    def __len__(self) -> int:
+        return sum(map(len, self.rows.values()))
+
+
 T = TypeVar('T')
 
 TDR_BUNDLE = TypeVar('TDR_BUNDLE', bound=TDRBundle)
@@ -188,6 +389,15 @@ class TDRPlugin(RepositoryPlugin[TDR_BUNDLE, SOURCE_SPEC, SOURCE_REF, BUNDLE_FQI
                     ) -> DRSClient:
         return cls._user_authenticated_tdr(authentication).drs_client()
 
+    # Rows retrieved from TDR snapshots are cached per plugin class and shared
+    # by all threads so that they survive the plugin instance and can be
+    # reused by subsequent invocations of a warm Lambda function container.
+
+    @classmethod
+    @cache
+    def _row_cache(cls) -> TDRRowCache:
+        return TDRRowCache(max_size=config.tdr_row_cache_size)
+
     def _lookup_source_id(self, spec: TDRSourceSpec) -> str:
         return self.tdr.lookup_source(spec)
 
@@ -205,11 +415,143 @@ class TDRPlugin(RepositoryPlugin[TDR_BUNDLE, SOURCE_SPEC, SOURCE_REF, BUNDLE_FQI
     def fetch_bundle(self, bundle_fqid: TDRBundleFQID) -> TDR_BUNDLE:
         self._assert_source(bundle_fqid.source)
         now = time.time()
+        if config.tdr_prefetch and self._can_prefetch:
+            self._load_prefetched_partition(bundle_fqid)
         bundle = self._emulate_bundle(bundle_fqid)
         log.info('It took %.003fs to download bundle %s.%s',
                  time.time() - now, bundle.uuid, bundle.version)
         return bundle
 
+    #: Whether this plugin implements :meth:`_prefetch`
+    _can_prefetch: ClassVar[bool] = False
+
+    def prefetch_partition(self,
+                           source: TDRSourceRef,
+                           prefix: str,
+                           remaining_time: RemainingTime
+                           ) -> None:
+        """
+        Retrieve the rows needed for emulating the bundles in the given
+        partition and save them to the storage bucket, from where every Lambda
+        function container that fetches a bundle from the partition loads them
+        into its row cache, once. The prefetch stops early, leaving the saved
+        rows incomplete, when their estimated size reaches the size of the row
+        cache or when the given time runs out. A failed prefetch is logged and
+        not retried. The missing rows are then retrieved per bundle.
+        """
+        if not config.tdr_prefetch:
+            pass
+        elif not self._can_prefetch:
+            log.debug('Prefetching rows is not supported by %r', type(self))
+        elif source.spec.prefix is None:
+            log.debug('Not prefetching rows in unpartitioned source %r', source)
+        elif config.tdr_row_cache_size == 0:
+            log.debug('Not prefetching rows since the row cache is disabled')
+        else:
+            log.info('Prefetching rows in partition %r of source %r', prefix, source)
+            now = time.time()
+            rows = TDRPartitionRows(max_size=config.tdr_row_cache_size,
+                                    remaining_time=remaining_time)
+            try:
+                self._prefetch(source, prefix, rows)
+                if len(rows) > 0:
+                    data = gzip.compress(json.dumps(rows.rows).encode())
+                    object_key = self._prefetch_object_key(source, prefix)
+                    StorageService().put(object_key, data, content_type='application/gzip')
+            except Exception:
+                log.warning('Failed to prefetch rows in partition %r of source %r',
+                            prefix, source, exc_info=True)
+            else:
+                log.info('Prefetched %i row(s) in partition %r of source %r in %.003fs',
+                         len(rows), prefix, source, time.time() - now)
+                if not rows.complete:
+                    log.warning('Prefetching rows in partition %r of source %r ran out of '
+                                'time or exceeded the row cache size of %i bytes. The '
+                                'remaining rows will be retrieved per bundle.',
+                                prefix, source, rows.max_size)
+
+    def _prefetch_object_key(self, source: TDRSourceRef, name: str) -> str:
+        """
+        The key of the object in the storage bucket that holds the prefetched
+        data of the given name, e.g., a partition prefix, for the given source
+        """
+        return f'tdr/{source.id}/{name}.json.gz'
+
+    # Guards the registry of loaded partitions. It is only held while the
+    # registry is accessed, never while rows are being loaded.
+    _prefetch_lock = Lock()
+
+    @classmethod
+    @cache
+    def _prefetched_partitions(cls) -> dict[tuple[TDRSourceRef, str], Event]:
+        """
+        The partitions whose prefetched rows were or are being loaded, each with
+        an event that is set once loading completes
+        """
+        return {}
+
+    def _load_prefetched_partition(self, bundle_fqid: TDRBundleFQID) -> None:
+        """
+        Populate the row cache with the rows prefetched for the partition
+        containing the given bundle, unless that partition was already loaded by
+        the current Lambda function container. If another thread is loading the
+        partition, wait for it to finish.
+        """
+        source = bundle_fqid.source
+        prefix = source.spec.prefix
+        row_cache = self._row_cache()
+        if prefix is None:
+            log.debug('Not loading prefetched rows for bundle %r from unpartitioned source',
+                      bundle_fqid)
+        elif row_cache.max_size == 0:
+            log.debug('Not loading prefetched rows since the row cache is disabled')
+        else:
+            partition_prefix = bundle_fqid.uuid[:len(prefix.common) + prefix.partition]
+            partition = source, partition_prefix
+            with self._prefetch_lock:
+                partitions = self._prefetched_partitions()
+                try:
+                    loaded = partitions[partition]
+                except KeyError:
+                    loaded = partitions[partition] = Event()
+                    load = True
+                else:
+                    load = False
+            if load:
+                # Failed loads aren't retried. The rows will be retrieved on a
+                # per-bundle basis instead.
+                try:
+                    object_key = self._prefetch_object_key(source, partition_prefix)
+                    evictions = row_cache.evictions
+                    data = StorageService().get(object_key)
+                    num_rows = 0
+                    for entity_type, rows in json.loads(gzip.decompress(data)).items():
+                        table_name = self._full_table_name(source.spec, entity_type)
+                        row_cache.put(table_name, (
+                            (self._prefetched_row_key(source, entity_type, key), row)
+                            for key, row in rows
+                        ))
+                        num_rows += len(rows)
+                except StorageObjectNotFound:
+                    log.info('No rows were prefetched in partition %r of source %r',
+                             partition_prefix, source)
+                except Exception:
+                    log.warning('Failed to load prefetched rows in partition %r of source %r',
+                                partition_prefix, source, exc_info=True)
+                else:
+                    log.info('Loaded %i prefetched row(s) in partition %r of source %r',
+                             num_rows, partition_prefix, source)
+                    if row_cache.evictions > evictions:
+                        log.warning('The row cache of %i bytes is too small to hold the '
+                                    'prefetched rows of partition %r of source %r. Some of '
+                                    'them will be retrieved again. Consider increasing '
+                                    'AZUL_TDR_ROW_CACHE_SIZE.',
+                                    row_cache.max_size, partition_prefix, source)
+                finally:
+                    loaded.set()
+            else:
+                loaded.wait()
+
     def portal_db(self) -> Sequence[JSON]:
         return []
 
@@ -234,6 +576,29 @@ class TDRPlugin(RepositoryPlugin[TDR_BUNDLE, SOURCE_SPEC, SOURCE_REF, BUNDLE_FQI
     def _emulate_bundle(self, bundle_fqid: TDRBundleFQID) -> TDR_BUNDLE:
         raise NotImplementedError
 
+    def _prefetch(self,
+                  source: TDRSourceRef,
+                  prefix: str,
+                  rows: TDRPartitionRows
+                  ) -> None:
+        """
+        Add to the given rows those needed for emulating the bundles whose UUID
+        starts with the given prefix, using as few queries as possible. Stop
+        when adding rows fails. Only called if :attr:`_can_prefetch` is true.
+        """
+        raise NotImplementedError
+
+    def _prefetched_row_key(self,
+                            source: TDRSourceRef,
+                            entity_type: str,
+                            key: AnyJSON
+                            ) -> Hashable:
+        """
+        The key under which to cache a prefetched row, given the JSON
+        representation of that key as added by :meth:`_prefetch`.
+        """
+        return key
+
     def drs_client(self,
                    authentication: Authentication | None = None
                    ) -> DRSClient:
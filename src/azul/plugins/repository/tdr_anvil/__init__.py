@@ -1,15 +1,33 @@
-﻿import datetime
+﻿from array import (
+    array,
+)
+from collections import (
+    defaultdict,
+)
+from concurrent.futures import (
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+)
+import datetime
 from enum import (
     Enum,
 )
+import gzip
+import json
 import logging
 from operator import (
     itemgetter,
 )
+from threading import (
+    Lock,
+)
+import time
 from typing import (
     AbstractSet,
     Callable,
     Iterable,
+    TypeVar,
 )
 
 import attrs
@@ -18,12 +36,14 @@ from more_itertools import (
 )
 
 from azul import (
+    cache,
     cached_property,
     config,
     require,
     uuids,
 )
 from azul.bigquery import (
+    BigQueryRow,
     backtick,
 )
 from azul.drs import (
@@ -51,11 +71,16 @@ from azul.plugins.repository.tdr import (
     TDRBundleFQID,
     TDRPlugin,
 )
+from azul.service.storage_service import (
+    StorageObjectNotFound,
+    StorageService,
+)
 from azul.terra import (
     TDRSourceRef,
     TDRSourceSpec,
 )
 from azul.types import (
+    JSON,
     MutableJSON,
     MutableJSONs,
 )
@@ -65,11 +90,143 @@ from azul.uuids import (
 
 log = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
 Keys = AbstractSet[KeyReference]
 MutableKeys = set[KeyReference]
 KeysByType = dict[EntityType, AbstractSet[Key]]
 MutableKeysByType = dict[EntityType, set[Key]]
 KeyLinks = set[KeyLink]
+LinkQuery = Callable[[TDRSourceSpec, AbstractSet[Key]], KeyLinks]
+LinkQueries = list[tuple[LinkQuery, AbstractSet[Key]]]
+
+
+@attrs.define(kw_only=True)
+class QueryStats:
+    """
+    Instrumentation of the BigQuery queries made while emulating a bundle. The
+    counters may be updated concurrently.
+    """
+    #: The number of levels of the entity graph that were traversed
+    levels: int = 0
+
+    #: The number of queries made
+    queries: int = 0
+
+    #: The total time spent in those queries, in seconds. Concurrent queries
+    #: are counted separately, so this may exceed the elapsed time.
+    seconds: float = 0.0
+
+    _lock: Lock = attrs.field(factory=Lock, init=False, repr=False)
+
+    def timed(self, f: Callable[..., T], *args) -> T:
+        """
+        Return the result of invoking the given query function with the given
+        arguments, recording the query and its duration.
+        """
+        start = time.time()
+        try:
+            return f(*args)
+        finally:
+            duration = time.time() - start
+            with self._lock:
+                self.queries += 1
+                self.seconds += duration
+
+
+class LinkGraph:
+    """
+    An in-memory index of the links between the entities in an AnVIL snapshot.
+    For every link query made by the plugin, the index maps each key the query
+    could be made for to the links the query would return for that key. Keys
+    are encoded as integers and links as arrays of these integers, so the index
+    of a large snapshot remains reasonably compact.
+
+    >>> b = KeyReference(entity_type='anvil_biosample', key='b')
+    >>> d = KeyReference(entity_type='anvil_donor', key='d')
+    >>> g = LinkGraph()
+    >>> g.add('_upstream_from_biosamples', 'b', inputs=[d], outputs=[b])
+    >>> g = LinkGraph.from_json(json.loads(json.dumps(g.to_json())))
+
+    The graph answers the queries of the plugin
+
+    >>> links = g.follow([(Plugin._upstream_from_biosamples, {'b', 'c'}),
+    ...                   (Plugin._diagnoses_from_donors, {'d'})])
+    >>> links == {KeyLink(inputs={d}, outputs={b})}
+    True
+    """
+
+    def __init__(self):
+        self._refs: list[KeyReference] = []
+        self._ids: dict[KeyReference, int] = {}
+        # Each link is encoded as an array containing the ID of the activity or
+        # -1 if there is none, the number of inputs, the IDs of the inputs and
+        # the IDs of the outputs.
+        self._links: dict[str, dict[Key, list[array]]] = defaultdict(lambda: defaultdict(list))
+
+    def _id(self, ref: KeyReference) -> int:
+        try:
+            return self._ids[ref]
+        except KeyError:
+            id = len(self._refs)
+            self._refs.append(ref)
+            self._ids[ref] = id
+            return id
+
+    def add(self,
+            query: str,
+            key: Key,
+            *,
+            inputs: Iterable[KeyReference],
+            outputs: Iterable[KeyReference],
+            activity: KeyReference | None = None
+            ) -> None:
+        """
+        Record a link that the link query of the given name returns for the
+        given key.
+        """
+        inputs, outputs = list(map(self._id, inputs)), list(map(self._id, outputs))
+        activity = -1 if activity is None else self._id(activity)
+        self._links[query][key].append(array('l', [activity, len(inputs), *inputs, *outputs]))
+
+    def _decode(self, link: array) -> KeyLink:
+        activity, num_inputs = link[0], link[1]
+        refs = self._refs
+        return KeyLink(activity=None if activity == -1 else refs[activity],
+                       inputs={refs[i] for i in link[2:2 + num_inputs]},
+                       outputs={refs[i] for i in link[2 + num_inputs:]})
+
+    def follow(self, queries: LinkQueries) -> KeyLinks:
+        """
+        Return the union of the links that the given link queries of the
+        plugin would return.
+        """
+        return {
+            self._decode(link)
+            for query, keys in queries
+            for links in [self._links.get(query.__name__, {})]
+            for key in keys
+            for link in links.get(key, ())
+        }
+
+    def to_json(self) -> JSON:
+        return {
+            'refs': [[ref.entity_type, ref.key] for ref in self._refs],
+            'links': {
+                query: {key: [link.tolist() for link in links] for key, links in links_by_key.items()}
+                for query, links_by_key in self._links.items()
+            }
+        }
+
+    @classmethod
+    def from_json(cls, graph: JSON) -> 'LinkGraph':
+        self = cls()
+        for entity_type, key in graph['refs']:
+            self._id(KeyReference(entity_type=entity_type, key=key))
+        for query, links_by_key in graph['links'].items():
+            for key, links in links_by_key.items():
+                self._links[query][key] = [array('l', link) for link in links]
+        return self
 
 
 class BundleType(Enum):
@@ -270,34 +427,53 @@ class Plugin(TDRPlugin[TDRAnvilBundle, TDRSourceSpec, TDRSourceRef, TDRAnvilBund
     def _primary_bundle(self, bundle_fqid: TDRAnvilBundleFQID) -> TDRAnvilBundle:
         source = bundle_fqid.source
         bundle_entity = self._bundle_entity(bundle_fqid)
+        stats = QueryStats()
+        start = time.time()
 
         keys: MutableKeys = {bundle_entity}
         links: KeyLinks = set()
 
-        for method in [self._follow_downstream, self._follow_upstream]:
-            method: Callable[[TDRSourceSpec, KeysByType], KeyLinks]
-            n = len(keys)
-            frontier: Keys = keys
-            while frontier:
-                new_links = method(source.spec, self._consolidate_by_type(frontier))
-                links.update(new_links)
-                frontier = frozenset().union(*(link.all_entities for link in new_links)) - keys
-                keys.update(frontier)
-            log.debug('Found %r linked entities via %r', len(keys) - n, method)
-
-        keys_by_type: KeysByType = self._consolidate_by_type(keys)
-        if log.isEnabledFor(logging.DEBUG):
-            arg = keys_by_type
-        else:
-            arg = {entity_type: len(keys) for entity_type, keys in keys_by_type.items()}
-        log.info('Found %i entities linked to bundle %r: %r',
-                 len(keys), bundle_fqid.uuid, arg)
+        graph = self._link_graph(source) if config.tdr_anvil_link_graph else None
+
+        with ThreadPoolExecutor(max_workers=config.num_tdr_workers) as executor:
+            for method in [self._follow_downstream, self._follow_upstream]:
+                n = len(keys)
+                frontier: Keys = keys
+                while frontier:
+                    stats.levels += 1
+                    queries = method(self._consolidate_by_type(frontier))
+                    if graph is None:
+                        new_links = self._follow(executor, stats, source.spec, queries)
+                    else:
+                        new_links = graph.follow(queries)
+                    links.update(new_links)
+                    frontier = frozenset().union(*(link.all_entities for link in new_links)) - keys
+                    keys.update(frontier)
+                log.debug('Found %r linked entities via %r', len(keys) - n, method)
+
+            keys_by_type: KeysByType = self._consolidate_by_type(keys)
+            if log.isEnabledFor(logging.DEBUG):
+                arg = keys_by_type
+            else:
+                arg = {entity_type: len(keys) for entity_type, keys in keys_by_type.items()}
+            log.info('Found %i entities linked to bundle %r: %r',
+                     len(keys), bundle_fqid.uuid, arg)
+
+            futures = {
+                entity_type: executor.submit(stats.timed,
+                                             self._retrieve_entities,
+                                             source.spec,
+                                             entity_type,
+                                             typed_keys)
+                for entity_type, typed_keys in sorted(keys_by_type.items())
+                if typed_keys
+            }
 
         result = TDRAnvilBundle(fqid=bundle_fqid)
         entities_by_key: dict[KeyReference, EntityReference] = {}
-        for entity_type, typed_keys in sorted(keys_by_type.items()):
+        for entity_type, future in futures.items():
             pk_column = entity_type.removeprefix('anvil_') + '_id'
-            rows = self._retrieve_entities(source.spec, entity_type, typed_keys)
+            rows = future.result()
             if entity_type == 'anvil_donor':
                 # We expect that the foreign key `part_of_dataset_id` is
                 # redundant for biosamples and donors. To simplify our queries,
@@ -314,6 +490,10 @@ class Plugin(TDRPlugin[TDRAnvilBundle, TDRSourceSpec, TDRSourceRef, TDRAnvilBund
                 entities_by_key[key] = entity
                 result.add_entity(entity, self._version, row)
         result.add_links((link.to_entity_link(entities_by_key) for link in links))
+        log.info('Traversed %i level(s) of the graph for bundle %r with %i '
+                 'queries, taking %.3fs in BigQuery and %.3fs overall',
+                 stats.levels, bundle_fqid.uuid, stats.queries, stats.seconds,
+                 time.time() - start)
         return result
 
     def _supplementary_bundle(self, bundle_fqid: TDRAnvilBundleFQID) -> TDRAnvilBundle:
@@ -387,13 +567,10 @@ class Plugin(TDRPlugin[TDRAnvilBundle, TDRSourceSpec, TDRSourceRef, TDRAnvilBund
             result[e.entity_type].add(e.key)
         return result
 
-    def _follow_upstream(self,
-                         source: TDRSourceSpec,
-                         entities: KeysByType
-                         ) -> KeyLinks:
-        return set.union(
-            self._upstream_from_files(source, entities['anvil_file']),
-            self._upstream_from_biosamples(source, entities['anvil_biosample']),
+    def _follow_upstream(self, entities: KeysByType) -> LinkQueries:
+        return [
+            (self._upstream_from_files, entities['anvil_file']),
+            (self._upstream_from_biosamples, entities['anvil_biosample']),
             # The direction of the edges linking donors to diagnoses is
             # contentious. Currently, we model diagnoses as being upstream from
             # donors. This is counterintuitive, but has two important practical
@@ -420,17 +597,190 @@ class Plugin(TDRPlugin[TDRAnvilBundle, TDRSourceSpec, TDRSourceRef, TDRAnvilBund
             # entities that are upstream from donors are datasets, which do not
             # perform a traversal and are treated as being linked to every
             # entity in the bundle regardless of the edges in the graph.
-            self._diagnoses_from_donors(source, entities['anvil_donor'])
-        )
+            (self._diagnoses_from_donors, entities['anvil_donor'])
+        ]
 
-    def _follow_downstream(self,
-                           source: TDRSourceSpec,
-                           entities: KeysByType
-                           ) -> KeyLinks:
-        return set.union(
-            self._downstream_from_biosamples(source, entities['anvil_biosample']),
-            self._downstream_from_files(source, entities['anvil_file'])
-        )
+    def _follow_downstream(self, entities: KeysByType) -> LinkQueries:
+        return [
+            (self._downstream_from_biosamples, entities['anvil_biosample']),
+            (self._downstream_from_files, entities['anvil_file'])
+        ]
+
+    def _follow(self,
+                executor: Executor,
+                stats: QueryStats,
+                source: TDRSourceSpec,
+                queries: LinkQueries
+                ) -> KeyLinks:
+        """
+        Run the given queries concurrently and return the union of the links
+        they found. Queries for an empty set of keys are skipped.
+        """
+        futures = [
+            executor.submit(stats.timed, query, source, keys)
+            for query, keys in queries
+            if keys
+        ]
+        return set().union(*(future.result() for future in futures))
+
+    # The maximum size of the JSON representation of a link graph. Every
+    # contribution Lambda function container that emulates a primary bundle
+    # from a snapshot holds the graph of that snapshot in memory. The graphs
+    # of larger snapshots aren't saved and the bundles from those snapshots
+    # are emulated with one query per level of the entity graph.
+    _max_link_graph_size = 16 * 1024 * 1024
+
+    def prefetch_source(self, source: TDRSourceRef) -> None:
+        """
+        Build the link graph of the given snapshot and save it to the storage
+        bucket, from where every Lambda function container that emulates a
+        primary bundle from the snapshot loads it, once. A graph that is too
+        large, or that failed to build, isn't saved.
+        """
+        if config.tdr_anvil_link_graph:
+            start = time.time()
+            try:
+                graph = self._build_link_graph(source.spec)
+                data = json.dumps(graph.to_json()).encode()
+            except Exception:
+                log.warning('Failed to build link graph for source %r', source, exc_info=True)
+            else:
+                log.info('Built link graph of %i bytes for source %r in %.3fs',
+                         len(data), source, time.time() - start)
+                if len(data) > self._max_link_graph_size:
+                    log.warning('The link graph for source %r exceeds the maximum size of %i '
+                                'bytes and will not be used.',
+                                source, self._max_link_graph_size)
+                else:
+                    object_key = self._prefetch_object_key(source, 'link-graph')
+                    StorageService().put(object_key,
+                                         gzip.compress(data),
+                                         content_type='application/gzip')
+
+    # Guards the registry of link graphs. It is only held while the registry
+    # is accessed, never while a graph is being loaded.
+    _link_graph_lock = Lock()
+
+    @classmethod
+    @cache
+    def _link_graphs(cls) -> dict[str, Future[LinkGraph | None]]:
+        """
+        The link graphs that were or are being loaded, by snapshot ID. The
+        result of a future is None if no graph could be loaded for the snapshot.
+        """
+        return {}
+
+    def _link_graph(self, source: TDRSourceRef) -> LinkGraph | None:
+        """
+        Return the link graph of the given snapshot, or None if there is none.
+        The graph is loaded from the storage bucket once per Lambda function
+        container and snapshot. If another thread is loading the graph of the
+        same snapshot, wait for it to finish.
+        """
+        with self._link_graph_lock:
+            graphs = self._link_graphs()
+            try:
+                graph = graphs[source.id]
+            except KeyError:
+                graph = graphs[source.id] = Future()
+                load = True
+            else:
+                load = False
+        if load:
+            graph.set_result(self._load_link_graph(source))
+        return graph.result()
+
+    def _load_link_graph(self, source: TDRSourceRef) -> LinkGraph | None:
+        # Failed loads aren't retried. The bundles are emulated with one query
+        # per level of the entity graph instead.
+        object_key = self._prefetch_object_key(source, 'link-graph')
+        try:
+            data = StorageService().get(object_key)
+            graph = LinkGraph.from_json(json.loads(gzip.decompress(data)))
+        except StorageObjectNotFound:
+            log.info('There is no link graph for source %r', source)
+            return None
+        except Exception:
+            log.warning('Failed to load link graph for source %r', source, exc_info=True)
+            return None
+        else:
+            log.info('Loaded link graph for source %r', source)
+            return graph
+
+    def _build_link_graph(self, source: TDRSourceSpec) -> LinkGraph:
+        """
+        Build the link graph of the given snapshot by scanning the tables that
+        the link queries join. The links recorded for each key are the same as
+        those that the link query of the same name returns for that key.
+        """
+        graph = LinkGraph()
+
+        def scan(table_name: str, columns: Iterable[str]) -> Iterable[BigQueryRow]:
+            return self._run_sql(f'''
+                SELECT {', '.join(columns)}
+                FROM {backtick(self._full_table_name(source, table_name))}
+            ''')
+
+        for row in scan('anvil_biosample', ['biosample_id', 'donor_id', 'part_of_dataset_id']):
+            biosample_id = row['biosample_id']
+            biosample = KeyReference(entity_type='anvil_biosample', key=biosample_id)
+            dataset = KeyReference(entity_type='anvil_dataset', key=one(row['part_of_dataset_id']))
+            graph.add('_upstream_from_biosamples', biosample_id, inputs=[dataset], outputs=[biosample])
+            for donor_id in row['donor_id']:
+                donor = KeyReference(entity_type='anvil_donor', key=donor_id)
+                graph.add('_upstream_from_biosamples', biosample_id, inputs=[donor], outputs=[biosample])
+
+        for row in scan('anvil_diagnosis', ['donor_id', 'diagnosis_id']):
+            graph.add('_diagnoses_from_donors',
+                      row['donor_id'],
+                      inputs=[KeyReference(entity_type='anvil_diagnosis', key=row['diagnosis_id'])],
+                      outputs=[KeyReference(entity_type='anvil_donor', key=row['donor_id'])])
+
+        # Only links to generated files that exist are found upstream
+        file_ids = {row['file_id'] for row in scan('anvil_file', ['file_id'])}
+        for activity_table, uses_files, uses_biosamples in [
+            ('anvil_alignmentactivity', True, False),
+            ('anvil_assayactivity', False, True),
+            ('anvil_sequencingactivity', False, True),
+            ('anvil_variantcallingactivity', True, False),
+            ('anvil_activity', True, True)
+        ]:
+            pk_column = activity_table.removeprefix('anvil_') + '_id'
+            columns = [pk_column, 'generated_file_id']
+            if uses_files:
+                columns.append('used_file_id')
+            if uses_biosamples:
+                columns.append('used_biosample_id')
+            for row in scan(activity_table, columns):
+                activity = KeyReference(entity_type=activity_table, key=row[pk_column])
+                used_file_ids = row['used_file_id'] if uses_files else []
+                used_biosample_ids = row['used_biosample_id'] if uses_biosamples else []
+                inputs = [
+                    *(KeyReference(entity_type='anvil_file', key=key) for key in used_file_ids),
+                    *(KeyReference(entity_type='anvil_biosample', key=key) for key in used_biosample_ids)
+                ]
+                outputs = [
+                    KeyReference(entity_type='anvil_file', key=key)
+                    for key in row['generated_file_id']
+                ]
+                for output in outputs:
+                    if output.key in file_ids:
+                        graph.add('_upstream_from_files',
+                                  output.key,
+                                  activity=activity,
+                                  inputs=inputs,
+                                  outputs=[output])
+                for query, used_ids, entity_type in [
+                    ('_downstream_from_files', used_file_ids, 'anvil_file'),
+                    ('_downstream_from_biosamples', used_biosample_ids, 'anvil_biosample')
+                ]:
+                    for key in set(used_ids):
+                        graph.add(query,
+                                  key,
+                                  activity=activity,
+                                  inputs=[KeyReference(entity_type=entity_type, key=key)],
+                                  outputs=outputs)
+        return graph
 
     def _upstream_from_biosamples(self,
                                   source: TDRSourceSpec,
@@ -6,6 +6,7 @@ from concurrent.futures import (
 )
 from itertools import (
     islice,
+    pairwise,
 )
 import json
 import logging
@@ -15,6 +16,7 @@ from operator import (
 from typing import (
     Any,
     ClassVar,
+    Hashable,
     Iterable,
     cast,
 )
@@ -24,6 +26,7 @@ from furl import (
     furl,
 )
 from more_itertools import (
+    chunked,
     one,
 )
 
@@ -54,7 +57,9 @@ from azul.plugins.metadata.hca.bundle import (
 from azul.plugins.repository.tdr import (
     TDRBundle,
     TDRBundleFQID,
+    TDRPartitionRows,
     TDRPlugin,
+    TDRRowCacheStats,
 )
 from azul.strings import (
     single_quote as sq,
@@ -64,6 +69,7 @@ from azul.terra import (
     TDRSourceSpec,
 )
 from azul.types import (
+    AnyJSON,
     JSONs,
     is_optional,
 )
@@ -305,10 +311,16 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
                              query: str,
                              group_by: str
                              ) -> list[BigQueryRow]:
-        iter_rows = self._run_sql(query)
-        key = itemgetter(group_by)
-        rows = sorted(iter_rows, key=key)
-        require(len(set(map(key, rows))) == len(rows), 'Expected unique keys', group_by)
+        """
+        Run the given query, letting BigQuery sort the result by the given
+        column, and verify that the values in that column are unique. Since the
+        rows arrive sorted, the verification only needs to compare adjacent
+        rows.
+        """
+        rows = list(self._run_sql(query + f'ORDER BY {group_by}\n'))
+        keys = map(itemgetter(group_by), rows)
+        require(all(a < b for a, b in pairwise(keys)),
+                'Expected unique keys in ascending order', group_by)
         return rows
 
     def _emulate_bundle(self, bundle_fqid: TDRBundleFQID) -> TDRHCABundle:
@@ -316,7 +328,8 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
                               manifest={},
                               metadata={},
                               links={})
-        entities, root_entities, links_jsons = self._stitch_bundles(bundle)
+        stats = TDRRowCacheStats()
+        entities, root_entities, links_jsons = self._stitch_bundles(bundle, stats)
         bundle.links = self._merge_links(links_jsons)
 
         with ThreadPoolExecutor(max_workers=config.num_tdr_workers) as executor:
@@ -324,7 +337,8 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
                 entity_type: executor.submit(self._retrieve_entities,
                                              bundle.fqid.source.spec,
                                              entity_type,
-                                             entity_ids)
+                                             entity_ids,
+                                             stats)
                 for entity_type, entity_ids in entities.items()
             }
             for entity_type, future in futures.items():
@@ -343,10 +357,61 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
                     log.error('TDR worker failed to retrieve entities of type %r',
                               entity_type, exc_info=e)
                     raise e
+        log.info('Found %i row(s) in the cache and retrieved %i row(s) for bundle %r',
+                 stats.hits, stats.misses, bundle.fqid)
         return bundle
 
+    # The maximum number of entities retrieved by a single query while
+    # prefetching rows. Larger batches risk exceeding BigQuery's maximum
+    # query length.
+    _prefetch_batch_size = 1000
+
+    _can_prefetch = True
+
+    def _prefetch(self,
+                  source: TDRSourceRef,
+                  prefix: str,
+                  rows: TDRPartitionRows
+                  ) -> None:
+        spec = source.spec
+        links_rows = self._run_sql(f'''
+            SELECT {', '.join({'links_id', 'version', *TDRHCABundle.links_columns})}
+            FROM {backtick(self._full_table_name(spec, 'links'))}
+            WHERE STARTS_WITH(links_id, '{prefix}')
+        ''')
+        links = []
+        entities: EntitiesByType = defaultdict(set)
+        for row in links_rows:
+            # Drop the version so that the row matches the ones retrieved by
+            # _retrieve_entities()
+            row = dict(row)
+            version = self.format_version(row.pop('version'))
+            links.append(([row['links_id'], version], row))
+            project = EntityReference(entity_type='project', entity_id=row['project_id'])
+            for entity in Links.from_json(project, json.loads(row['content'])).all_entities():
+                entities[entity.entity_type].add(entity.entity_id)
+        if rows.add('links', links):
+            for entity_type, entity_ids in sorted(entities.items()):
+                pk_column = entity_type + '_id'
+                for batch in chunked(sorted(entity_ids), self._prefetch_batch_size):
+                    batch_rows = self._query_entities(spec, entity_type, set(batch))
+                    if not rows.add(entity_type, ((row[pk_column], row) for row in batch_rows)):
+                        return
+
+    def _prefetched_row_key(self,
+                            source: TDRSourceRef,
+                            entity_type: str,
+                            key: AnyJSON
+                            ) -> Hashable:
+        if entity_type == 'links':
+            uuid, version = key
+            return TDRBundleFQID(source=source, uuid=uuid, version=version)
+        else:
+            return key
+
     def _stitch_bundles(self,
-                        root_bundle: 'TDRHCABundle'
+                        root_bundle: 'TDRHCABundle',
+                        stats: TDRRowCacheStats | None = None
                         ) -> tuple[EntitiesByType, Entities, list[JSON]]:
         """
         Recursively follow dangling inputs to collect entities from upstream
@@ -364,7 +429,7 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
         batch_size = 1000
         while unprocessed:
             batch = set(islice(unprocessed, batch_size))
-            links = self._retrieve_links(batch)
+            links = self._retrieve_links(batch, stats)
             processed.update(batch)
             unprocessed -= batch
             stitched_links.extend(links.values())
@@ -398,14 +463,15 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
         return entities, root_entities, stitched_links
 
     def _retrieve_links(self,
-                        links_ids: set[TDRBundleFQID]
+                        links_ids: set[TDRBundleFQID],
+                        stats: TDRRowCacheStats | None = None
                         ) -> dict[TDRBundleFQID, JSON]:
         """
         Retrieve links entities from BigQuery and parse the `content` column.
         :param links_ids: Which links entities to retrieve.
         """
         source = one({fqid.source.spec for fqid in links_ids})
-        links = self._retrieve_entities(source, 'links', links_ids)
+        links = self._retrieve_entities(source, 'links', links_ids, stats)
         links = {
             # Copy the values so we can reassign `content` below
             fqid: dict(one(links_json
@@ -421,9 +487,12 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
                            source: TDRSourceSpec,
                            entity_type: EntityType,
                            entity_ids: set[EntityID] | set[BundleFQID],
+                           stats: TDRRowCacheStats | None = None
                            ) -> list[BigQueryRow]:
         """
         Efficiently retrieve multiple entities from BigQuery in a single query.
+        Entities that were retrieved previously are served from the row cache
+        and are not included in the query.
 
         :param source: Snapshot containing the entity table
 
@@ -431,8 +500,36 @@ class Plugin(TDRPlugin[TDRHCABundle, TDRSourceSpec, TDRSourceRef, TDRBundleFQID]
 
         :param entity_ids: For links, the fully qualified UUID and version of
                            each `links` entity. For other entities, just the UUIDs.
+
+        :param stats: If not None, count the cache hits and misses in this
+                      object
         """
         pk_column = entity_type + '_id'
+        table_name = self._full_table_name(source, entity_type)
+        row_cache = self._row_cache()
+        cached_rows, missing_ids = row_cache.get(table_name, entity_ids)
+        if stats is not None:
+            stats.update(hits=len(cached_rows), misses=len(missing_ids))
+        if missing_ids:
+            rows = self._query_entities(source, entity_type, missing_ids)
+            if entity_type == 'links':
+                fqids_by_uuid = {fqid.uuid: fqid for fqid in missing_ids}
+                row_cache.put(table_name, ((fqids_by_uuid[row[pk_column]], row) for row in rows))
+            else:
+                row_cache.put(table_name, ((row[pk_column], row) for row in rows))
+            if cached_rows:
+                rows.extend(cached_rows)
+                rows.sort(key=itemgetter(pk_column))
+        else:
+            rows = sorted(cached_rows, key=itemgetter(pk_column))
+        return rows
+
+    def _query_entities(self,
+                        source: TDRSourceSpec,
+                        entity_type: EntityType,
+                        entity_ids: set[EntityID] | set[BundleFQID],
+                        ) -> list[BigQueryRow]:
+        pk_column = entity_type + '_id'
         version_column = 'version'
         non_pk_columns = (
             TDRHCABundle.links_columns if entity_type == 'links'
@@ -42,6 +42,9 @@ from azul.deployment import (
 from azul.files import (
     write_file_atomically,
 )
+from azul.indexer.tally_buffer import (
+    TallyBuffer,
+)
 from azul.lambdas import (
     Lambdas,
 )
@@ -226,9 +229,11 @@ class Queues:
         # transience cannot be proven until all lambdas and their respective
         # retries repeatedly time out, but this would result in an unreasonably
         # long wait time. Waiting for just one retry is sufficient to
-        # accommodate the most probable scenarios for transient stalls.
+        # accommodate the most probable scenarios for transient stalls. The
+        # number of deferred tallies doesn't change while they are delayed.
         timeout = max(config.contribution_lambda_timeout(retry=True),
-                      config.aggregation_lambda_timeout(retry=True))
+                      config.aggregation_lambda_timeout(retry=True),
+                      config.deferred_aggregation_delay + config.aggregation_lambda_timeout(retry=False))
         queues = self.get_queues(config.work_queue_names)
         total_lengths = deque(maxlen=ceil(timeout / sleep_time))
         # Two minutes to safely accommodate SQS eventual consistency window of
@@ -239,6 +244,11 @@ class Queues:
         while True:
             # Determine queue lengths
             total_length, queue_lengths = self._get_queue_lengths(queues)
+            if config.tally_buffer:
+                # Tallies in the buffer will be queued by the next flush
+                num_buffered = TallyBuffer().count()
+                log.info('Counting %i entities in the tally buffer.', num_buffered)
+                total_length += num_buffered
             total_lengths.append(total_length)
             log.info('Counting %i messages in %i queues.',
                      total_length, len(queue_lengths))
@@ -4,15 +4,21 @@ from collections import (
 )
 from collections.abc import (
     Iterable,
+    Iterator,
 )
+import gzip
 from itertools import (
     chain,
 )
+import json
 import logging
 from operator import (
     attrgetter,
     itemgetter,
 )
+from tempfile import (
+    TemporaryFile,
+)
 from typing import (
     ClassVar,
     MutableSet,
@@ -329,6 +335,37 @@ def pfb_schema_from_replicas(replicas: Iterable[JSON]
     return keys, avro_pfb_schema(values)
 
 
+def spooled_pfb_schema_from_replicas(replicas: Iterable[JSON]
+                                     ) -> tuple[Iterable[JSON], Sequence[str], JSON]:
+    """
+    Same as :func:`pfb_schema_from_replicas` but without holding the replicas
+    in memory. While the schema is inferred, the replicas are spooled to a
+    compressed temporary file. The returned iterable yields them from that
+    file, in the original order, and can only be consumed once.
+    """
+    spool = TemporaryFile()
+    try:
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=1) as f:
+            def spooled():
+                for replica in replicas:
+                    f.write(json.dumps(replica).encode())
+                    f.write(b'\n')
+                    yield replica
+
+            replica_types, pfb_schema = pfb_schema_from_replicas(spooled())
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+
+    def unspooled() -> Iterator[JSON]:
+        with spool, gzip.GzipFile(fileobj=spool, mode='rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+    return unspooled(), replica_types, pfb_schema
+
+
 def avro_pfb_schema(azul_avro_schema: Iterable[JSON]) -> JSON:
     """
     The boilerplate Avro schema that comprises a PFB's schema is returned in
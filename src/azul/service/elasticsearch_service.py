@@ -7,14 +7,20 @@ from collections import (
 )
 from collections.abc import (
     Iterable,
+    Iterator,
     Mapping,
     Sequence,
 )
+from contextlib import (
+    contextmanager,
+)
 import json
 import logging
 from typing import (
     Any,
+    ClassVar,
     Generic,
+    NotRequired,
     Optional,
     TypeVar,
     TypedDict,
@@ -50,6 +56,9 @@ from azul import (
     reject,
     require,
 )
+from azul.caching import (
+    LRUCache,
+)
 from azul.es import (
     ESClientFactory,
 )
@@ -222,46 +231,85 @@ class FilterStage(_ElasticsearchStage[Response, Response]):
 
     def prepare_query(self, skip_field_paths: tuple[FieldPath] = ()) -> Query:
         """
-        Converts the given filters into an Elasticsearch DSL Query object.
-        """
-        filter_list = []
-        for field_path, relation_and_values in self.prepared_filters.items():
-            if field_path not in skip_field_paths:
-                relation, values = one(relation_and_values.items())
-                # Note that `is_not` is only used internally (for filtering by
-                # inaccessible sources)
-                if relation in ('is', 'is_not'):
-                    field_type = self.service.field_type(self.catalog, field_path)
-                    if isinstance(field_type, Nested):
-                        term_queries = []
-                        for nested_field, nested_value in one(values).items():
-                            nested_body = {dotted(field_path, nested_field, 'keyword'): nested_value}
-                            term_queries.append(Q('term', **nested_body))
-                        query = Q('nested', path=dotted(field_path), query=Q('bool', must=term_queries))
-                    else:
-                        query = Q('terms', **{dotted(field_path, 'keyword'): values})
-                        translated_none = field_type.to_index(None)
-                        if translated_none in values:
-                            # Note that at this point None values in filters have already
-                            # been translated e.g. {'is': ['~null']} and if the filter has a
-                            # None our query needs to find fields with None values as well
-                            # as absent fields
-                            absent_query = Q('bool', must_not=[Q('exists', field=dotted(field_path))])
-                            query = Q('bool', should=[query, absent_query])
-                    if relation == 'is_not':
-                        query = Q('bool', must_not=[query])
-                    filter_list.append(query)
-                elif relation in ('contains', 'within', 'intersects'):
-                    for value in values:
-                        value = value | {'relation': relation}
-                        filter_list.append(Q('range', **{dotted(field_path): value}))
-                else:
-                    assert False
+        Converts the given filters into an Elasticsearch DSL Query object,
+        omitting the filters on the given field paths.
+
+        The clauses for the individual filters are built only once per stage
+        and are shared by reference between the returned queries, and so are
+        the queries themselves. This matters because the aggregation stage asks
+        for one query per facet, while most facets aren't filtered on, so most
+        of those queries are identical. The returned queries must therefore not
+        be modified.
+        """
+        clauses = self._clauses
+        skipped = frozenset(p for p in skip_field_paths if p in clauses)
+        queries = self._queries
+        try:
+            query = queries[skipped]
+        except KeyError:
+            # Each iteration will AND the contents of the list
+            query_list = [
+                clause
+                for field_path, field_clauses in clauses.items()
+                if field_path not in skipped
+                for clause in field_clauses
+            ]
+            query = Q('bool', must=query_list)
+            queries[skipped] = query
+        return query
 
-        # Each iteration will AND the contents of the list
-        query_list = [Q('constant_score', filter=f) for f in filter_list]
+    @cached_property
+    def _queries(self) -> dict[frozenset[FieldPath], Query]:
+        return {}
 
-        return Q('bool', must=query_list)
+    @cached_property
+    def _clauses(self) -> dict[FieldPath, list[Query]]:
+        """
+        The query clauses for each filtered field path
+        """
+        return {
+            field_path: [
+                Q('constant_score', filter=query)
+                for query in self._prepare_filter(field_path, relation_and_values)
+            ]
+            for field_path, relation_and_values in self.prepared_filters.items()
+        }
+
+    def _prepare_filter(self,
+                        field_path: FieldPath,
+                        relation_and_values: Mapping[str, Sequence[PrimitiveJSON]]
+                        ) -> list[Query]:
+        relation, values = one(relation_and_values.items())
+        # Note that `is_not` is only used internally (for filtering by
+        # inaccessible sources)
+        if relation in ('is', 'is_not'):
+            field_type = self.service.field_type(self.catalog, field_path)
+            if isinstance(field_type, Nested):
+                term_queries = []
+                for nested_field, nested_value in one(values).items():
+                    nested_body = {dotted(field_path, nested_field, 'keyword'): nested_value}
+                    term_queries.append(Q('term', **nested_body))
+                query = Q('nested', path=dotted(field_path), query=Q('bool', must=term_queries))
+            else:
+                query = Q('terms', **{dotted(field_path, 'keyword'): values})
+                translated_none = field_type.to_index(None)
+                if translated_none in values:
+                    # Note that at this point None values in filters have already
+                    # been translated e.g. {'is': ['~null']} and if the filter has a
+                    # None our query needs to find fields with None values as well
+                    # as absent fields
+                    absent_query = Q('bool', must_not=[Q('exists', field=dotted(field_path))])
+                    query = Q('bool', should=[query, absent_query])
+            if relation == 'is_not':
+                query = Q('bool', must_not=[query])
+            return [query]
+        elif relation in ('contains', 'within', 'intersects'):
+            return [
+                Q('range', **{dotted(field_path): value | {'relation': relation}})
+                for value in values
+            ]
+        else:
+            assert False
 
 
 @attr.s(frozen=True, auto_attribs=True, kw_only=True)
@@ -438,9 +486,18 @@ class SlicingStage(_ElasticsearchStage[Response, Response]):
 
     def _prepared_slice(self) -> Optional[DocumentSlice]:
         if self.document_slice is None:
-            return self.plugin.document_slice(self.entity_type)
+            document_slice = self.plugin.document_slice(self.entity_type)
         else:
-            return self.document_slice
+            document_slice = self.document_slice
+        if config.incremental_aggregation:
+            # The state for incremental aggregation is of no use to the service
+            # and can be much larger than the rest of the aggregate
+            if document_slice is None:
+                document_slice = DocumentSlice(excludes=['aggregate_state'])
+            elif 'includes' not in document_slice:
+                excludes = document_slice.get('excludes', [])
+                document_slice = DocumentSlice(excludes=[*excludes, 'aggregate_state'])
+        return document_slice
 
 
 # FIXME: Elminate Eliminate reliance on Elasticsearch DSL
@@ -508,6 +565,7 @@ class ResponsePagination(TypedDict):
     previous: Optional[str]
     sort: str
     order: str
+    approximate: NotRequired[bool]
 
 
 ResponseTriple = tuple[JSONs, ResponsePagination, JSON]
@@ -526,6 +584,14 @@ class PaginationStage(_ElasticsearchStage[JSON, ResponseTriple]):
 
     filters: Filters
 
+    #: If False, Elasticsearch stops counting the hits at the threshold below
+    #: and reports that number as a lower bound of the total. Counting all hits
+    #: can take much longer than retrieving a page of them.
+    exact_total: bool = True
+
+    #: The default threshold used by Elasticsearch
+    total_hits_threshold: ClassVar[int] = 10000
+
     def prepare_request(self, request: Search) -> Search:
         sort_order = self.pagination.order
         sort_field = self.plugin.field_mapping[self.pagination.sort]
@@ -572,9 +638,8 @@ class PaginationStage(_ElasticsearchStage[JSON, ResponseTriple]):
         else:
             request = request.sort(*sort(sort_order))
 
-        # FIXME: Remove this or change to 10000 (the default)
-        #        https://github.com/DataBiosphere/azul/issues/3770
-        request = request.extra(track_total_hits=True)
+        track_total_hits = True if self.exact_total else self.total_hits_threshold
+        request = request.extra(track_total_hits=track_total_hits)
 
         assert isinstance(self.peek_ahead, bool), type(self.peek_ahead)
         # fetch one more than needed to see if there's a "next page".
@@ -607,9 +672,8 @@ class PaginationStage(_ElasticsearchStage[JSON, ResponseTriple]):
 
     def _process_pagination(self, response: JSON) -> MutableJSON:
         total = response['hits']['total']
-        # FIXME: Handle other relations
-        #        https://github.com/DataBiosphere/azul/issues/3770
-        assert total['relation'] == 'eq'
+        relation = total['relation']
+        assert relation in ('eq', 'gte'), relation
         pages = -(-total['value'] // self.pagination.size)
 
         # ... else use search_after/search_before pagination
@@ -648,14 +712,17 @@ class PaginationStage(_ElasticsearchStage[JSON, ResponseTriple]):
                                   filters=json.dumps(self.filters.explicit))
             return None if url is None else str(url)
 
-        return ResponsePagination(count=count,
-                                  total=total['value'],
-                                  size=pagination.size,
-                                  next=page_link(previous=False),
-                                  previous=page_link(previous=True),
-                                  pages=pages,
-                                  sort=pagination.sort,
-                                  order=pagination.order)
+        response_pagination = ResponsePagination(count=count,
+                                                 total=total['value'],
+                                                 size=pagination.size,
+                                                 next=page_link(previous=False),
+                                                 previous=page_link(previous=True),
+                                                 pages=pages,
+                                                 sort=pagination.sort,
+                                                 order=pagination.order)
+        if relation == 'gte':
+            response_pagination['approximate'] = True
+        return response_pagination
 
 
 class ElasticsearchService(DocumentService):
@@ -664,6 +731,35 @@ class ElasticsearchService(DocumentService):
     def _es_client(self) -> Elasticsearch:
         return ESClientFactory.get()
 
+    #: The number of seconds for which the UUID of an index is cached. The
+    #: UUID only changes when an index is deleted and recreated under the same
+    #: name, which is part of a reindex that takes much longer than this.
+    index_uuid_ttl = 60
+
+    @cached_property
+    def _index_uuids(self) -> LRUCache[str, str]:
+        return LRUCache(maxsize=1024, ttl=self.index_uuid_ttl)
+
+    def index_uuids(self, index_names: Iterable[str]) -> dict[str, str]:
+        """
+        Return the UUID of each of the given indices, distinguishing an index
+        from an earlier one by the same name. Only the UUIDs not already cached
+        are retrieved, using a single request.
+        """
+        uuids = {
+            index_name: self._index_uuids.get(index_name)
+            for index_name in index_names
+        }
+        missing = [index_name for index_name, uuid in uuids.items() if uuid is None]
+        if missing:
+            settings = self._es_client.indices.get_settings(index=','.join(missing),
+                                                            name='index.uuid')
+            for index_name in missing:
+                uuid = settings[index_name]['settings']['index']['uuid']
+                self._index_uuids.put(index_name, uuid)
+                uuids[index_name] = uuid
+        return uuids
+
     def create_chain(self,
                      *,
                      catalog: CatalogName,
@@ -704,3 +800,39 @@ class ElasticsearchService(DocumentService):
                       index=str(IndexName.create(catalog=catalog,
                                                  qualifier=entity_type,
                                                  doc_type=doc_type)))
+
+    @contextmanager
+    def point_in_time(self,
+                      catalog: CatalogName,
+                      entity_type: str,
+                      doc_type: DocumentType = DocumentType.aggregate,
+                      *,
+                      keep_alive: str
+                      ) -> Iterator[str]:
+        """
+        Open a point in time (PIT) on the index containing documents of the
+        given entity and document types, in the given catalog, and return its
+        ID. The PIT is closed upon exit from the context, even on failure.
+
+        :param keep_alive: How long Elasticsearch should keep the PIT alive
+                           between requests using it, e.g. '1m'
+        """
+        index_name = IndexName.create(catalog=catalog,
+                                      qualifier=entity_type,
+                                      doc_type=doc_type)
+        response = self._es_client.open_point_in_time(index=str(index_name),
+                                                      keep_alive=keep_alive)
+        pit_id = response['id']
+        try:
+            yield pit_id
+        finally:
+            self._es_client.close_point_in_time(body={'id': pit_id})
+
+    def create_pit_request(self, pit_id: str, *, keep_alive: str) -> Search:
+        """
+        Create an Elasticsearch request against the given point in time. Such
+        a request can be paged through with `search_after`, sorting by
+        `_shard_doc`.
+        """
+        return Search(using=self._es_client).extra(pit={'id': pit_id,
+                                                        'keep_alive': keep_alive})
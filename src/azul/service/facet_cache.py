@@ -0,0 +1,187 @@
+from collections.abc import (
+    Iterable,
+)
+import hashlib
+import json
+import logging
+from typing import (
+    Optional,
+)
+
+from elasticsearch import (
+    TransportError,
+)
+from elasticsearch_dsl import (
+    MultiSearch,
+    Search,
+)
+
+from azul import (
+    CatalogName,
+    cached_property,
+    config,
+)
+from azul.caching import (
+    LRUCache,
+)
+from azul.es import (
+    ESClientFactory,
+)
+from azul.indexer.document import (
+    DocumentType,
+    IndexName,
+)
+from azul.service import (
+    Filters,
+)
+from azul.service.elasticsearch_service import (
+    ElasticsearchService,
+)
+from azul.service.storage_service import (
+    StorageObjectNotFound,
+    StorageService,
+)
+from azul.types import (
+    AnyJSON,
+    AnyMutableJSON,
+)
+
+log = logging.getLogger(__name__)
+
+
+class FacetCache:
+    """
+    A cache for the aggregations in the responses to search and summary
+    requests, i.e., the facets and the summary of the entities matching a set
+    of filters. An in-process LRU tier is optionally backed by a tier in the
+    storage bucket that is shared by all service Lambda instances.
+
+    Cached entries are keyed on the catalog, the entity type, the normalized
+    filters, the accessible sources, and the current generation of the
+    aggregate index for the entity type. The generation changes whenever an
+    aggregate is written to or removed from that index and becomes visible to
+    searches, which implicitly invalidates all entries for that index.
+    """
+    key_prefix = 'facets'
+
+    @cached_property
+    def _entries(self) -> LRUCache[str, bytes]:
+        return LRUCache(maxsize=config.facet_cache_size)
+
+    @cached_property
+    def _storage_service(self) -> StorageService:
+        return StorageService()
+
+    def generations(self,
+                    service: ElasticsearchService,
+                    catalog: CatalogName,
+                    entity_types: Iterable[str],
+                    *,
+                    preference: str
+                    ) -> Optional[dict[str, str]]:
+        """
+        Return the current generation of the aggregate index for each of the
+        given entity types, using a single multi-search request, or None if
+        the generations couldn't be determined, e.g., because an index is
+        missing.
+
+        The replicas of a shard refresh independently, so a generation only
+        describes the replica it was read from. The requests whose results are
+        cached under the generation should therefore be made with the same
+        search preference, which routes them to the same replicas.
+
+        The generation combines the UUID of the index, the number of documents
+        in it and the largest sequence number among them. Elasticsearch assigns
+        a new sequence number to every write, larger than that of any prior
+        write to the same shard. Aggregate indices consist of a single primary
+        shard, so every write increments the maximum. The counts are read from
+        index structures instead of individual documents, and a search with no
+        hits is served from the shard request cache until the next refresh,
+        which makes this much cheaper than the aggregations it guards. The UUID
+        distinguishes an index from an earlier one by the same name, as the
+        sequence numbers start over when an index is recreated.
+        """
+        entity_types = list(entity_types)
+        index_names = [
+            str(IndexName.create(catalog=catalog,
+                                 qualifier=entity_type,
+                                 doc_type=DocumentType.aggregate))
+            for entity_type in entity_types
+        ]
+        request = MultiSearch(using=ESClientFactory.get())
+        for index_name in index_names:
+            search = Search(index=index_name)
+            search = search.extra(size=0, track_total_hits=True)
+            search = search.params(preference=preference)
+            search.aggs.metric('max_seq_no', 'max', field='_seq_no')
+            request = request.add(search)
+        try:
+            uuids = service.index_uuids(index_names)
+            responses = request.execute()
+        except TransportError:
+            log.warning('Failed to determine index generations, bypassing facet cache',
+                        exc_info=True)
+            return None
+        return {
+            entity_type: '%s:%i:%s' % (uuids[index_name],
+                                       response.hits.total.value,
+                                       response.aggregations.max_seq_no.value)
+            for entity_type, index_name, response in zip(entity_types, index_names, responses)
+        }
+
+    def key(self,
+            *,
+            catalog: CatalogName,
+            entity_type: str,
+            kind: str,
+            filters: Filters,
+            generation: str
+            ) -> str:
+        """
+        Return the cache key for the aggregations of the given kind, like
+        'facets' or 'summary', or for another kind of result derived from the
+        same filters, like the 'total' number of hits.
+        """
+        explicit = {
+            facet: {
+                relation: sorted(values, key=json.dumps)
+                for relation, values in filter.items()
+            }
+            for facet, filter in filters.explicit.items()
+        }
+        key = json.dumps([
+            catalog,
+            entity_type,
+            kind,
+            explicit,
+            sorted(filters.source_ids),
+            generation
+        ], sort_keys=True)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[AnyMutableJSON]:
+        value = self._entries.get(key)
+        if value is None and config.shared_facet_cache:
+            try:
+                value = self._storage_service.get(self._object_key(key))
+            except StorageObjectNotFound:
+                pass
+            else:
+                self._entries.put(key, value)
+        if value is None:
+            log.info('Facet cache miss for key %r', key)
+            return None
+        else:
+            log.info('Facet cache hit for key %r', key)
+            return json.loads(value)
+
+    def put(self, key: str, result: AnyJSON) -> None:
+        value = json.dumps(result).encode()
+        self._entries.put(key, value)
+        if config.shared_facet_cache:
+            self._storage_service.put(self._object_key(key),
+                                      value,
+                                      content_type='application/json')
+
+    def _object_key(self, key: str) -> str:
+        return f'{self.key_prefix}/{key}.json'
@@ -5,11 +5,19 @@ from abc import (
 import base64
 from collections import (
     defaultdict,
+    deque,
 )
 from collections.abc import (
     Iterable,
     Mapping,
 )
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from contextlib import (
+    closing,
+)
 from copy import (
     deepcopy,
 )
@@ -18,6 +26,7 @@ from datetime import (
     datetime,
 )
 from hashlib import (
+    blake2b,
     sha256,
 )
 from inspect import (
@@ -30,6 +39,7 @@ from io import (
 import itertools
 from itertools import (
     chain,
+    islice,
 )
 import json
 import logging
@@ -48,6 +58,7 @@ from tempfile import (
 )
 import time
 from typing import (
+    Callable,
     IO,
     Optional,
     Protocol,
@@ -65,18 +76,21 @@ import attrs
 from bdbag import (
     bdbag_api,
 )
+from elasticsearch import (
+    RequestError,
+)
 from elasticsearch_dsl import (
     Q,
     Search,
 )
 from elasticsearch_dsl.response import (
     Hit,
+    Response,
 )
 from furl import (
     furl,
 )
 from more_itertools import (
-    chunked,
     one,
 )
 import msgpack
@@ -106,6 +120,7 @@ from azul.indexer.document import (
     DocumentType,
     FieldPath,
     FieldTypes,
+    IndexName,
     null_str,
 )
 from azul.json import (
@@ -776,6 +791,41 @@ class ManifestService(ElasticsearchService):
 Cells = dict[str, str]
 
 
+@attrs.frozen(kw_only=True)
+class ColumnExtractor:
+    """
+    Extracts the value of a manifest column from the values of a field in a
+    list of entities. The type of the field is resolved when the extractor is
+    created, not for every cell.
+    """
+    field_name: str
+    column_name: str
+    to_tsv: Callable[[AnyJSON], str]
+    column_joiner: str
+
+    def __call__(self, entities: JSONs) -> str:
+        field_name, to_tsv = self.field_name, self.to_tsv
+        values = set()
+        for entity in entities:
+            try:
+                field_value = entity[field_name]
+            except KeyError:
+                pass
+            else:
+                if isinstance(field_value, list):
+                    values.update(
+                        to_tsv(field_sub_value)
+                        for field_sub_value in field_value
+                        if field_sub_value is not None
+                    )
+                else:
+                    values.add(to_tsv(field_value))
+        assert not any(self.column_joiner in value for value in values)
+        # FIXME: The slice is a hotfix. Reconsider.
+        #        https://github.com/DataBiosphere/azul/issues/2649
+        return (' ' + self.column_joiner + ' ').join(sorted(values)[:100])
+
+
 class ManifestGenerator(metaclass=ABCMeta):
     """
     A generator for manifests. A manifest is an exhaustive representation of
@@ -968,7 +1018,7 @@ class ManifestGenerator(metaclass=ABCMeta):
         """
         git_commit = config.lambda_git_status['commit']
         filter_string = repr(sort_frozen(freeze(self.filters.explicit)))
-        content_hash = str(self.manifest_content_hash)
+        content_hash = self.manifest_content_hash
         catalog = self.catalog
         format = self.format()
         manifest_hash_input = [
@@ -1060,49 +1110,48 @@ class ManifestGenerator(metaclass=ABCMeta):
         Extract columns in `column_mapping` from `entities` and insert values
         into `row`.
         """
+        for extractor in self._column_extractors(field_path, column_mapping):
+            column_name = extractor.column_name
+            assert column_name not in row, f'Column mapping defines {column_name} twice'
+            row[column_name] = extractor(entities)
+
+    def _column_extractors(self,
+                           field_path: FieldPath,
+                           column_mapping: ColumnMapping
+                           ) -> list[ColumnExtractor]:
+        """
+        Return an extractor for each column in `column_mapping`, in the order
+        of the mapping, for entities at the given path.
+        """
         field_types = self._field_types
         for field in field_path:
             field_types = field_types[field]
 
-        def convert(field_name, field_value):
+        def converter(field_name: str) -> Callable[[AnyJSON], str]:
             try:
                 field_type = field_types[field_name]
             except KeyError:
                 if field_name == 'file_url':
                     field_type = null_str
                 else:
-                    raise
+                    # Only fail if the field actually occurs in an entity
+                    def fail(_):
+                        raise KeyError(field_name)
+
+                    return fail
             else:
                 if isinstance(field_type, list):
                     field_type = one(field_type)
-            return field_type.to_tsv(field_value)
-
-        def validate(field_value: str) -> str:
-            assert self.column_joiner not in field_value
-            return field_value
-
-        for field_name, column_name in column_mapping.items():
-            if column_name is not None:
-                assert column_name not in row, f'Column mapping defines {column_name} twice'
-                column_value = []
-                for entity in entities:
-                    try:
-                        field_value = entity[field_name]
-                    except KeyError:
-                        pass
-                    else:
-                        if isinstance(field_value, list):
-                            column_value += [
-                                validate(convert(field_name, field_sub_value))
-                                for field_sub_value in field_value
-                                if field_sub_value is not None
-                            ]
-                        else:
-                            column_value.append(validate(convert(field_name, field_value)))
-                # FIXME: The slice is a hotfix. Reconsider.
-                #        https://github.com/DataBiosphere/azul/issues/2649
-                column_value = self.padded_joiner.join(sorted(set(column_value))[:100])
-                row[column_name] = column_value
+            return field_type.to_tsv
+
+        return [
+            ColumnExtractor(field_name=field_name,
+                            column_name=column_name,
+                            to_tsv=converter(field_name),
+                            column_joiner=self.column_joiner)
+            for field_name, column_name in column_mapping.items()
+            if column_name is not None
+        ]
 
     def _get_entities(self, field_path: FieldPath, doc: JSON) -> JSONs:
         """
@@ -1131,7 +1180,53 @@ class ManifestGenerator(metaclass=ABCMeta):
                                           **args))
 
     @cached_property
-    def manifest_content_hash(self) -> int:
+    def manifest_content_hash(self) -> str:
+        """
+        A value that changes whenever the documents matching the filters
+        change.
+
+        Every write to a document in Elasticsearch assigns a new sequence
+        number to that document, larger than that of any earlier write to the
+        same shard. Statistics over the sequence numbers of the matching
+        documents therefore reflect writes, deletions and changes to the
+        matching set, and are computed from doc values instead of each
+        document's source, which makes them cheap enough to compute on every
+        request. Documents that were rewritten without a change in content
+        produce a different value, which only costs a cache miss. Since the
+        sequence numbers start over when an index is recreated, e.g., during a
+        reindex, the value also includes the UUID of the index.
+        """
+        try:
+            return self._manifest_content_generation()
+        except RequestError:
+            log.warning('Failed to compute content generation for manifest, '
+                        'falling back to content hash', exc_info=True)
+            return str(self._manifest_content_hash())
+
+    def _manifest_content_generation(self) -> str:
+        start_time = time.time()
+        request = self._create_request()
+        request.aggs.metric('generation', 'stats', field='_seq_no')
+        request = request.extra(size=0)
+        response = request.execute()
+        assert len(response.hits) == 0
+        stats = response.aggregations.generation
+        index_name = str(IndexName.create(catalog=self.catalog,
+                                          qualifier=self.entity_type,
+                                          doc_type=DocumentType.aggregate))
+        index_uuid = self.service.index_uuids([index_name])[index_name]
+        generation = ':'.join([
+            index_uuid,
+            *(
+                str(stats[k])
+                for k in ['count', 'min', 'max', 'sum']
+            )
+        ])
+        log.info('Manifest content generation %r was computed in %.3fs using filters %r.',
+                 generation, time.time() - start_time, self.filters)
+        return generation
+
+    def _manifest_content_hash(self) -> int:
         log.debug('Computing content hash for manifest using filters %r ...', self.filters)
         start_time = time.time()
         request = self._create_request()
@@ -1207,6 +1302,7 @@ class PagedManifestGenerator(ManifestGenerator):
     @abstractmethod
     def write_page_to(self,
                       partition: ManifestPartition,
+                      response: Response,
                       output: IO[str]
                       ) -> ManifestPartition:
         """
@@ -1216,6 +1312,9 @@ class PagedManifestGenerator(ManifestGenerator):
 
         :param partition: the current partition
 
+        :param response: the response to the paged request for the current
+                         page, as created by `_create_paged_request`
+
         :param output: the stream to write to
         """
         raise NotImplementedError
@@ -1252,10 +1351,25 @@ class PagedManifestGenerator(ManifestGenerator):
             partition = partition.first_page()
         with BytesIO() as buffer:
             with TextIOWrapper(buffer, encoding='utf-8', write_through=True) as text_buffer:
-                while True:
-                    partition = self.write_page_to(partition, output=text_buffer)
-                    if partition.is_last_page or buffer.tell() > self.part_size:
-                        break
+                # A worker fetches the next page while the current one is
+                # written. At most two pages are held in memory at any time.
+                # Each partition is uploaded as a single part, so that the
+                # size of a manifest is only limited by the maximum number of
+                # parts times the partition size.
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    page: Future[Response]
+                    page = executor.submit(self._fetch_page, partition.search_after)
+                    while True:
+                        response = page.result()
+                        if response.hits:
+                            search_after = self._search_after(response.hits[-1])
+                            page = executor.submit(self._fetch_page, search_after)
+                        partition = self.write_page_to(partition, response, output=text_buffer)
+                        if partition.is_last_page or buffer.tell() > self.part_size:
+                            break
+                    # The page prefetched beyond the end of the partition is
+                    # discarded
+                    page.cancel()
 
                 def upload_part():
                     buffer.seek(0)
@@ -1275,11 +1389,14 @@ class PagedManifestGenerator(ManifestGenerator):
 
     page_size = 500
 
-    def _create_paged_request(self, partition: ManifestPartition) -> Search:
+    def _fetch_page(self, search_after: Optional[tuple[str, str]]) -> Response:
+        return self._create_paged_request(search_after).execute()
+
+    def _create_paged_request(self, search_after: Optional[tuple[str, str]]) -> Search:
         pagination = Pagination(sort='entryId',
                                 order='asc',
                                 size=self.page_size,
-                                search_after=partition.search_after)
+                                search_after=search_after)
         pipeline = self._create_pipeline()
         # Only needs this to satisfy the type constraints
         pipeline = ToDictStage(service=self.service,
@@ -1434,10 +1551,13 @@ class CurlManifestGenerator(PagedManifestGenerator):
 
     def write_page_to(self,
                       partition: ManifestPartition,
+                      response: Response,
                       output: IO[str]
                       ) -> ManifestPartition:
 
-        def _write(file: JSON, is_related_file: bool = False):
+        lines = []
+
+        def _write(file: JSON, bundle_uuid: str, is_related_file: bool = False):
             name = file['name']
             # Related files are indexed differently than normal files (they
             # don't have their own document but are listed inside the main
@@ -1454,16 +1574,11 @@ class CurlManifestGenerator(PagedManifestGenerator):
 
             file_url = self._azul_file_url(file, args)
             if file_url is None:
-                output.write(f"# File {file['uuid']!r}, version {file['version']!r} is "
+                lines.append(f"# File {file['uuid']!r}, version {file['version']!r} is "
                              f"currently not available in catalog {self.catalog!r}.\n\n")
             else:
-                # To prevent overwriting one file with another one of the same name
-                # but different content we nest each file in a folder using the
-                # bundle UUID. Because a file can belong to multiple bundles we use
-                # the one with the most recent version.
-                bundle = max(cast(JSONs, doc['bundles']), key=itemgetter('version', 'uuid'))
-                output_name = self._sanitize_path(bundle['uuid'] + '/' + name)
-                output.write(f'url={self._option(file_url)}\n'
+                output_name = self._sanitize_path(bundle_uuid + '/' + name)
+                lines.append(f'url={self._option(file_url)}\n'
                              f'output={self._option(output_name)}\n\n')
 
         if partition.page_index == 0:
@@ -1478,17 +1593,22 @@ class CurlManifestGenerator(PagedManifestGenerator):
             output.write('\n\n'.join(curl_options))
             output.write('\n\n')
 
-        request = self._create_paged_request(partition)
-        response = request.execute()
         if response.hits:
             hit = None
             for hit in response.hits:
                 doc = self._hit_to_doc(hit)
                 file = one(cast(JSONs, doc['contents']['files']))
-                _write(file)
+                # To prevent overwriting one file with another one of the same
+                # name but different content we nest each file in a folder
+                # using the bundle UUID. Because a file can belong to multiple
+                # bundles we use the one with the most recent version.
+                bundle = max(cast(JSONs, doc['bundles']), key=itemgetter('version', 'uuid'))
+                _write(file, bundle['uuid'])
                 for related_file in file['related_files']:
-                    _write(related_file, is_related_file=True)
+                    _write(related_file, bundle['uuid'], is_related_file=True)
             assert hit is not None
+            # The lines for a page are written in one go
+            output.write(''.join(lines))
             return partition.next_page(file_name=None,
                                        search_after=self._search_after(hit))
         else:
@@ -1613,22 +1733,66 @@ class CompactManifestGenerator(PagedManifestGenerator):
             ('contents', 'files', 'related_files')
         ]
 
+    @cached_property
+    def _column_names(self) -> list[str]:
+        column_mappings = self.manifest_config.values()
+        column_mappings = (d.values() for d in column_mappings)
+        column_names = list(filter(None, chain.from_iterable(column_mappings)))
+        duplicates = {name for name in column_names if column_names.count(name) > 1}
+        assert not duplicates, f'Column mapping defines {duplicates} twice'
+        return column_names
+
+    _files_path: FieldPath = ('contents', 'files')
+
+    @cached_property
+    def _extraction_plan(self) -> list[tuple[FieldPath, list[tuple[int, ColumnExtractor]]]]:
+        """
+        For each field path in the manifest config, the extractor of every
+        column populated from the entities at that path, along with the index
+        of that column in a row. The plan is compiled once per generator, since
+        the manifest config doesn't change between pages.
+        """
+        column_index = {column_name: i for i, column_name in enumerate(self._column_names)}
+        return [
+            (field_path, [
+                (column_index[extractor.column_name], extractor)
+                for extractor in self._column_extractors(field_path, column_mapping)
+            ])
+            for field_path, column_mapping in self.manifest_config.items()
+        ]
+
+    @cached_property
+    def _related_file_extraction_plan(self) -> list[tuple[int, ColumnExtractor]]:
+        """
+        The columns of the row for a related file that differ from those of the
+        row for the file it is related to.
+        """
+        column_index = {column_name: i for i, column_name in enumerate(self._column_names)}
+        field_path = (*self._files_path, 'related_files')
+        try:
+            column_mapping = self.manifest_config[self._files_path]
+        except KeyError:
+            return []
+        else:
+            return [
+                (column_index[extractor.column_name], extractor)
+                for extractor in self._column_extractors(field_path, column_mapping)
+            ]
+
     def write_page_to(self,
                       partition: ManifestPartition,
+                      response: Response,
                       output: IO[str]
                       ) -> ManifestPartition:
-        column_mappings = self.manifest_config.values()
-        column_mappings = (d.values() for d in column_mappings)
-        column_names = list(filter(None, chain.from_iterable(column_mappings)))
-        writer = csv.DictWriter(output, column_names, dialect='excel-tab')
+        writer = csv.writer(output, dialect='excel-tab')
 
         if partition.page_index == 0:
-            writer.writeheader()
+            writer.writerow(self._column_names)
 
-        request = self._create_paged_request(partition)
-        response = request.execute()
         if response.hits:
             project_short_names = set()
+            rows = []
+            num_columns = len(self._column_names)
             hit = None
             for hit in response.hits:
                 doc = self._hit_to_doc(hit)
@@ -1638,35 +1802,34 @@ class CompactManifestGenerator(PagedManifestGenerator):
                     project = one(cast(JSONs, contents['projects']))
                     short_names = project['project_short_name']
                     project_short_names.update(short_names)
-                row = {}
+                row = [''] * num_columns
                 related_rows = []
-                for field_path, column_mapping in self.manifest_config.items():
+                for field_path, extractors in self._extraction_plan:
                     entities = self._get_entities(field_path, doc)
-                    if field_path == ('contents', 'files'):
-                        file = copy_json(one(entities))
+                    if field_path == self._files_path:
+                        # The extractors only read top-level fields, so a
+                        # shallow copy of the file entity is sufficient
+                        file = dict(one(entities))
                         file['file_url'] = self._azul_file_url(file)
                         entities = [file]
-                    self._extract_fields(field_path=field_path,
-                                         entities=entities,
-                                         column_mapping=column_mapping,
-                                         row=row)
-                    if field_path == ('contents', 'files'):
-                        file = copy_json(one(entities))
                         if 'related_files' in file:
-                            field_path = (*field_path, 'related_files')
+                            file = dict(file)
                             for related_file in file['related_files']:
-                                related_row = {}
                                 file.update(related_file)
                                 file['file_url'] = self._azul_file_url(file)
-                                self._extract_fields(field_path=field_path,
-                                                     entities=[file],
-                                                     column_mapping=column_mapping,
-                                                     row=related_row)
-                                related_rows.append(related_row)
-                writer.writerow(row)
-                for related in related_rows:
-                    row.update(related)
-                    writer.writerow(row)
+                                related_rows.append([
+                                    (i, extractor([file]))
+                                    for i, extractor in self._related_file_extraction_plan
+                                ])
+                    for i, extractor in extractors:
+                        row[i] = extractor(entities)
+                rows.append(row)
+                for related_row in related_rows:
+                    row = row.copy()
+                    for i, value in related_row:
+                        row[i] = value
+                    rows.append(row)
+            writer.writerows(rows)
             assert hit is not None
             file_name = project_short_names.pop() if len(project_short_names) == 1 else None
             return partition.next_page(file_name=file_name,
@@ -1981,6 +2144,11 @@ class BDBagManifestGenerator(FileBasedManifestGenerator):
             bundle_tsv_writer.writerow(row)
 
 
+#: A page of the replicas of a batch, and the request for the remaining
+#: replicas of that batch, if any
+ReplicaPage = tuple[list[Hit], Optional[Search]]
+
+
 class VerbatimManifestGenerator(FileBasedManifestGenerator, metaclass=ABCMeta):
 
     @property
@@ -2022,36 +2190,100 @@ class VerbatimManifestGenerator(FileBasedManifestGenerator, metaclass=ABCMeta):
             yield self.ReplicaKeys(hub_id=hit['entity_id'],
                                    replica_id=one(one(hit['contents'][hub_type])['document_id']))
 
+    #: The maximum number of batches of hub keys joined concurrently
+    replica_join_concurrency = 4
+
+    #: The number of replicas a batch of hub keys should ideally join with. The
+    #: size of each batch is adapted to the number of replicas observed per
+    #: key in previous batches.
+    replica_batch_hits = 10_000
+
+    #: Bounds for the number of hub keys per batch. The upper bound is the
+    #: default value of the `index.max_terms_count` setting, the maximum
+    #: number of terms in each of the two `terms` queries made per batch.
+    min_replica_batch_size = 100
+    max_replica_batch_size = 65_536
+
+    #: The number of replicas retrieved per request while paging through the
+    #: replicas of a batch
+    replica_page_size = 1000
+
+    #: The maximum number of replicas held in memory for each batch. The
+    #: replicas of a batch that joins with more are retrieved in several steps.
+    max_replica_batch_hits = 2 * replica_batch_hits
+
+    pit_keep_alive = '5m'
+
     def _all_replicas(self) -> Iterable[JSON]:
-        emitted_replica_ids = set()
-        page_size = 100
-        for page in chunked(self._replica_keys(), page_size):
-            num_replicas = 0
-            num_new_replicas = 0
-            for replica in self._join_replicas(page):
-                num_replicas += 1
-                # A single replica may have many hubs. To prevent replicas from
-                # being emitted more than once, we need to keep track of
-                # replicas already emitted.
-                replica_id = replica.meta.id
-                if replica_id not in emitted_replica_ids:
-                    num_new_replicas += 1
-                    yield replica.to_dict()
-                    # Note that this will be zero for replicas that use implicit
-                    # hubs, in which case there are actually many hubs
-                    explicit_hub_count = len(replica.hub_ids)
-                    # We don't have to track the IDs of replicas with only one
-                    # hub, since we know that there are no other hubs that could
-                    # cause their re-emission.
-                    if explicit_hub_count != 1:
-                        emitted_replica_ids.add(replica_id)
-            log.info('Found %d replicas (%d already emitted) from page of %d hubs',
-                     num_replicas, num_replicas - num_new_replicas, len(page))
-
-    def _join_replicas(self, keys: Iterable[ReplicaKeys]) -> Iterable[Hit]:
-        request = self.service.create_request(catalog=self.catalog,
-                                              entity_type='replica',
-                                              doc_type=DocumentType.replica)
+        # To save memory, we track 16-byte digests of the replica IDs instead
+        # of the IDs themselves. The chance of a collision is negligible.
+        emitted_replica_ids: set[bytes] = set()
+        num_keys, num_hits = 0, 0
+
+        def batch_size() -> int:
+            if num_hits == 0:
+                return self.min_replica_batch_size
+            else:
+                size = int(self.replica_batch_hits * num_keys / num_hits)
+                return max(self.min_replica_batch_size,
+                           min(self.max_replica_batch_size, size))
+
+        # All batches are joined using the same point in time (PIT), instead
+        # of a scroll context per batch
+        with (
+            closing(iter(self._replica_keys())) as keys,
+            self.service.point_in_time(catalog=self.catalog,
+                                       entity_type='replica',
+                                       doc_type=DocumentType.replica,
+                                       keep_alive=self.pit_keep_alive) as pit_id,
+            ThreadPoolExecutor(max_workers=self.replica_join_concurrency) as executor
+        ):
+            futures: deque[tuple[int, Future[ReplicaPage]]] = deque()
+
+            def submit() -> bool:
+                batch = list(islice(keys, batch_size()))
+                if batch:
+                    future = executor.submit(self._join_replicas, pit_id, batch)
+                    futures.append((len(batch), future))
+                return bool(batch)
+
+            while len(futures) < self.replica_join_concurrency and submit():
+                pass
+            while futures:
+                num_batch_keys, future = futures.popleft()
+                replicas, remainder = future.result()
+                num_hits += len(replicas)
+                if remainder is None:
+                    num_keys += num_batch_keys
+                    submit()
+                else:
+                    # The remaining replicas of the batch must be emitted
+                    # before those of any subsequent batch
+                    future = executor.submit(self._page_replicas, remainder)
+                    futures.appendleft((num_batch_keys, future))
+                num_new_replicas = 0
+                for replica in replicas:
+                    # A single replica may have many hubs. To prevent replicas
+                    # from being emitted more than once, we need to keep track
+                    # of replicas already emitted.
+                    replica_id = blake2b(replica.meta.id.encode(), digest_size=16).digest()
+                    if replica_id not in emitted_replica_ids:
+                        num_new_replicas += 1
+                        yield replica.to_dict()
+                        # Note that this will be zero for replicas that use
+                        # implicit hubs, in which case there are actually many
+                        # hubs
+                        explicit_hub_count = len(replica.hub_ids)
+                        # We don't have to track the IDs of replicas with only
+                        # one hub, since we know that there are no other hubs
+                        # that could cause their re-emission.
+                        if explicit_hub_count != 1:
+                            emitted_replica_ids.add(replica_id)
+                log.info('Found %d replicas (%d already emitted) from batch of %d hubs',
+                         len(replicas), len(replicas) - num_new_replicas, num_batch_keys)
+
+    def _join_replicas(self, pit_id: str, keys: Iterable[ReplicaKeys]) -> ReplicaPage:
+        request = self.service.create_pit_request(pit_id, keep_alive=self.pit_keep_alive)
         hub_ids, replica_ids = set(), set()
         for key in keys:
             hub_ids.add(key.hub_id)
@@ -2060,7 +2292,19 @@ class VerbatimManifestGenerator(FileBasedManifestGenerator, metaclass=ABCMeta):
             {'terms': {'hub_ids.keyword': list(hub_ids)}},
             {'terms': {'entity_id.keyword': list(replica_ids)}}
         ]))
-        return request.scan()
+        request = request.sort('_shard_doc').extra(size=self.replica_page_size)
+        return self._page_replicas(request)
+
+    def _page_replicas(self, request: Search) -> ReplicaPage:
+        replicas = []
+        while True:
+            hits = request.execute().hits
+            replicas.extend(hits)
+            if len(hits) < self.replica_page_size:
+                return replicas, None
+            request = request.extra(search_after=list(hits[-1].meta.sort))
+            if len(replicas) >= self.max_replica_batch_hits:
+                return replicas, request
 
 
 class JSONLVerbatimManifestGenerator(VerbatimManifestGenerator):
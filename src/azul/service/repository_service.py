@@ -15,13 +15,18 @@ from typing import (
     Optional,
     TYPE_CHECKING,
 )
+from uuid import (
+    uuid4,
+)
 
+import attr
 import elasticsearch
 from elasticsearch_dsl import (
     Search,
 )
 from elasticsearch_dsl.response import (
     Hit,
+    Response,
 )
 from more_itertools import (
     first,
@@ -31,6 +36,7 @@ from more_itertools import (
 from azul import (
     CatalogName,
     cache,
+    cached_property,
     config,
 )
 from azul.plugins import (
@@ -43,8 +49,10 @@ from azul.service import (
     Filters,
 )
 from azul.service.elasticsearch_service import (
+    ElasticsearchChain,
     ElasticsearchService,
     ElasticsearchStage,
+    FilterStage,
     IndexNotFoundError,
     Pagination,
     PaginationStage,
@@ -52,6 +60,9 @@ from azul.service.elasticsearch_service import (
     ToDictStage,
     _ElasticsearchStage,
 )
+from azul.service.facet_cache import (
+    FacetCache,
+)
 from azul.types import (
     AnyMutableJSON,
     JSON,
@@ -89,12 +100,120 @@ class SummaryResponseStage(ElasticsearchStage[JSON, MutableJSON],
         return request
 
 
+@attr.s(frozen=True, auto_attribs=True, kw_only=True)
+class FacetCacheStage(_ElasticsearchStage[MutableJSON, MutableJSON]):
+    """
+    Inject the given cached aggregations into the response or, if there are
+    none, place the aggregations from the response into the cache. In the
+    former case, the chain should not include an aggregation stage.
+    """
+    facet_cache: FacetCache
+    key: str
+    aggs: Optional[MutableJSON]
+
+    def prepare_request(self, request: Search) -> Search:
+        return request
+
+    def process_response(self, response: MutableJSON) -> MutableJSON:
+        if self.aggs is None:
+            try:
+                aggs = response['aggregations']
+            except KeyError:
+                pass
+            else:
+                self.facet_cache.put(self.key, aggs)
+        else:
+            response['aggregations'] = self.aggs
+        return response
+
+
+@attr.s(frozen=True, auto_attribs=True, kw_only=True)
+class TotalHitsStage(_ElasticsearchStage[MutableJSON, MutableJSON]):
+    """
+    If the total number of hits in the response is a lower bound, replace it
+    with the exact total, counted in a separate request whose result is cached
+    under the given key. The chain should include the given filter stage. The
+    count is made with the given search preference, like the request that
+    determined the generation in the key.
+    """
+    filter_stage: FilterStage
+    facet_cache: FacetCache
+    key: str
+    preference: str
+
+    @classmethod
+    def create_and_wrap(cls,
+                        chain: ElasticsearchChain[Response, MutableJSON],
+                        *,
+                        facet_cache: FacetCache,
+                        key: str,
+                        preference: str
+                        ) -> ElasticsearchChain[Response, MutableJSON]:
+        filter_stage = one(s for s in chain.stages() if isinstance(s, FilterStage))
+        stage = cls(service=filter_stage.service,
+                    catalog=filter_stage.catalog,
+                    entity_type=filter_stage.entity_type,
+                    filter_stage=filter_stage,
+                    facet_cache=facet_cache,
+                    key=key,
+                    preference=preference)
+        return stage.wrap(chain)
+
+    def prepare_request(self, request: Search) -> Search:
+        return request
+
+    def process_response(self, response: MutableJSON) -> MutableJSON:
+        total = response['hits']['total']
+        if total['relation'] != 'eq':
+            value = self.facet_cache.get(self.key)
+            if value is None:
+                assert isinstance(self.service, ElasticsearchService)
+                request = self.service.create_request(self.catalog, self.entity_type)
+                request = request.query(self.filter_stage.prepare_query())
+                request = request.params(preference=self.preference)
+                value = request.count()
+                self.facet_cache.put(self.key, value)
+            response['hits']['total'] = {'value': value, 'relation': 'eq'}
+        return response
+
+
 class RepositoryService(ElasticsearchService):
 
     @cache
     def repository_plugin(self, catalog: CatalogName) -> RepositoryPlugin:
         return RepositoryPlugin.load(catalog).create(catalog)
 
+    @cached_property
+    def facet_cache(self) -> Optional[FacetCache]:
+        return FacetCache() if config.facet_cache_size else None
+
+    def _generations(self,
+                     catalog: CatalogName,
+                     entity_types: Sequence[str],
+                     *,
+                     preference: str
+                     ) -> Optional[Mapping[str, str]]:
+        """
+        The current generation of the aggregate index for each of the given
+        entity types, or None if the facet cache is disabled or unavailable.
+        Requests whose results are cached under these generations must be made
+        with the same search preference.
+        """
+        if self.facet_cache is None:
+            return None
+        else:
+            return self.facet_cache.generations(self,
+                                                catalog,
+                                                entity_types,
+                                                preference=preference)
+
+    def _search_preference(self) -> str:
+        """
+        A search preference for the requests made on behalf of a single
+        request to the service, routing them to the same shard replicas.
+        """
+        return str(uuid4())
+
     def search(self,
                *,
                catalog: CatalogName,
@@ -227,15 +346,45 @@ class RepositoryService(ElasticsearchService):
                             catalog=catalog,
                             entity_type=entity_type).wrap(chain)
 
+        preference = None
         if aggregate:
-            chain = plugin.aggregation_stage.create_and_wrap(chain)
+            preference = self._search_preference()
+            generations = self._generations(catalog, [entity_type], preference=preference)
+            if generations is None:
+                chain = plugin.aggregation_stage.create_and_wrap(chain)
+            else:
+                key = self.facet_cache.key(catalog=catalog,
+                                           entity_type=entity_type,
+                                           kind='facets',
+                                           filters=filters,
+                                           generation=generations[entity_type])
+                aggs = self.facet_cache.get(key)
+                if aggs is None:
+                    chain = plugin.aggregation_stage.create_and_wrap(chain)
+                chain = FacetCacheStage(service=self,
+                                        catalog=catalog,
+                                        entity_type=entity_type,
+                                        facet_cache=self.facet_cache,
+                                        key=key,
+                                        aggs=aggs).wrap(chain)
+                if not config.exact_total_hits:
+                    key = self.facet_cache.key(catalog=catalog,
+                                               entity_type=entity_type,
+                                               kind='total',
+                                               filters=filters,
+                                               generation=generations[entity_type])
+                    chain = TotalHitsStage.create_and_wrap(chain,
+                                                           facet_cache=self.facet_cache,
+                                                           key=key,
+                                                           preference=preference)
 
         chain = PaginationStage(service=self,
                                 catalog=catalog,
                                 entity_type=entity_type,
                                 pagination=pagination,
                                 peek_ahead=True,
-                                filters=filters).wrap(chain)
+                                filters=filters,
+                                exact_total=config.exact_total_hits).wrap(chain)
 
         response_stage_cls = plugin.search_response_stage
         if TYPE_CHECKING:  # work around https://youtrack.jetbrains.com/issue/PY-44728
@@ -246,6 +395,8 @@ class RepositoryService(ElasticsearchService):
 
         request = self.create_request(catalog, entity_type)
         request = chain.prepare_request(request)
+        if preference is not None:
+            request = request.params(preference=preference)
         try:
             response = request.execute(ignore_cache=True)
         except elasticsearch.NotFoundError as e:
@@ -265,11 +416,15 @@ class RepositoryService(ElasticsearchService):
         response_stage = plugin.summary_response_stage()
 
         aggs_by_authority = response_stage.aggs_by_authority
+        preference = self._search_preference()
+        generations = self._generations(catalog, list(aggs_by_authority), preference=preference)
 
         def summary(entity_type):
             return entity_type, self._summary(catalog=catalog,
                                               entity_type=entity_type,
-                                              filters=filters)
+                                              filters=filters,
+                                              generations=generations,
+                                              preference=preference)
 
         with ThreadPoolExecutor(max_workers=len(aggs_by_authority)) as executor:
             aggs = dict(executor.map(summary, aggs_by_authority))
@@ -287,8 +442,22 @@ class RepositoryService(ElasticsearchService):
                  *,
                  catalog: CatalogName,
                  entity_type: str,
-                 filters: Filters
+                 filters: Filters,
+                 generations: Optional[Mapping[str, str]] = None,
+                 preference: Optional[str] = None
                  ) -> MutableJSON:
+        if generations is None:
+            key = None
+        else:
+            key = self.facet_cache.key(catalog=catalog,
+                                       entity_type=entity_type,
+                                       kind='summary',
+                                       filters=filters,
+                                       generation=generations[entity_type])
+            result = self.facet_cache.get(key)
+            if result is not None:
+                return result
+
         plugin = self.metadata_plugin(catalog)
         chain = self.create_chain(catalog=catalog,
                                   entity_type=entity_type,
@@ -300,6 +469,8 @@ class RepositoryService(ElasticsearchService):
                             entity_type=entity_type).wrap(chain)
         chain = plugin.summary_aggregation_stage.create_and_wrap(chain)
         request = chain.prepare_request(self.create_request(catalog, entity_type))
+        if preference is not None:
+            request = request.params(preference=preference)
 
         response = request.execute(ignore_cache=True)
         assert len(response.hits) == 0
@@ -309,6 +480,8 @@ class RepositoryService(ElasticsearchService):
 
         result = chain.process_response(response)
 
+        if key is not None:
+            self.facet_cache.put(key, result)
         return result
 
     def get_data_file(self,
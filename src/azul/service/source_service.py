@@ -16,6 +16,10 @@ from azul import (
 from azul.auth import (
     Authentication,
 )
+from azul.caching import (
+    LRUCache,
+    SingleFlight,
+)
 from azul.deployment import (
     aws,
 )
@@ -49,6 +53,25 @@ class Expired(CacheMiss):
 
 
 class SourceService:
+    """
+    Source IDs are cached in two tiers. The local tier is private to each
+    instance of this class and shared by the threads using that instance.
+    Entries in that tier expire quickly so as to limit the time during which
+    the instances in different Lambda containers disagree. The shared tier is a
+    DynamoDB table. Concurrent local cache misses for the same key are
+    coalesced into a single lookup in the shared tier and, if that misses too,
+    a single request to the repository.
+    """
+
+    # Timespan in seconds that sources persist in the local cache
+    local_expiration = 5
+
+    def __init__(self):
+        super().__init__()
+        # Not lazily initialized as the first request may come from more than
+        # one thread at once
+        self._local_cache = LRUCache(maxsize=1024, ttl=self.local_expiration)
+        self._lookups = SingleFlight()
 
     @cache
     def _repository_plugin(self, catalog: CatalogName) -> RepositoryPlugin:
@@ -58,8 +81,6 @@ class SourceService:
                         catalog: CatalogName,
                         authentication: Optional[Authentication]
                         ) -> set[str]:
-        plugin = self._repository_plugin(catalog)
-
         cache_key = (
             catalog,
             '' if authentication is None else authentication.identity()
@@ -67,11 +88,30 @@ class SourceService:
         joiner = ':'
         assert not any(joiner in c for c in cache_key), cache_key
         cache_key = joiner.join(cache_key)
+        source_ids = self._local_cache.get(cache_key)
+        if source_ids is None:
+            source_ids = self._lookups.do(cache_key, lambda: self._lookup(catalog,
+                                                                          cache_key,
+                                                                          authentication))
+        else:
+            log.info('Source ID cache hit (local) for catalog %r', catalog)
+        return set(source_ids)
+
+    def _lookup(self,
+                catalog: CatalogName,
+                cache_key: str,
+                authentication: Optional[Authentication]
+                ) -> frozenset[str]:
         try:
-            source_ids = set(self._get(cache_key))
+            source_ids = frozenset(self._get(cache_key))
         except CacheMiss:
-            source_ids = plugin.list_source_ids(authentication)
+            log.info('Source ID cache miss for catalog %r', catalog)
+            plugin = self._repository_plugin(catalog)
+            source_ids = frozenset(plugin.list_source_ids(authentication))
             self._put(cache_key, list(source_ids))
+        else:
+            log.info('Source ID cache hit (shared) for catalog %r', catalog)
+        self._local_cache.put(cache_key, source_ids)
         return source_ids
 
     def list_sources(self,
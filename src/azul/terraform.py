@@ -730,6 +730,17 @@ class Chalice:
             resource['source_code_hash'] = '${filebase64sha256("%s")}' % package_zip
             resource['filename'] = package_zip
 
+        # Chalice doesn't support partial batch responses, allowing an SQS event
+        # handler to report the failure of individual messages in a batch. With
+        # this setting, a handler that returns nothing or raises an exception
+        # still succeeds or fails the entire batch, as it would without it.
+        #
+        # https://docs.aws.amazon.com/lambda/latest/dg/services-sqs-errorhandling.html#services-sqs-batchfailurereporting
+        #
+        for resource in resources.get('aws_lambda_event_source_mapping', {}).values():
+            assert 'function_response_types' not in resource, resource
+            resource['function_response_types'] = ['ReportBatchItemFailures']
+
         for resource_type, argument in [
             ('aws_cloudwatch_event_rule', 'name'),
             ('aws_cloudwatch_event_target', 'target_id')
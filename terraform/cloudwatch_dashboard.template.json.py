@@ -1745,6 +1745,77 @@ dashboard_body = {
                 'title': 'Lambda timeout rate [%]',
                 'view': 'timeSeries'
             }
+        },
+        {
+            'height': 6,
+            'width': 12,
+            'y': 72,
+            'x': 0,
+            'type': 'log',
+            'properties': {
+                'query': dedent(f'''\
+                    SOURCE '/aws/lambda/{config.indexer_function_name('aggregate')}'
+                    | SOURCE '/aws/lambda/{config.indexer_function_name('aggregate_retry')}'
+                    | filter @message like /Scheduled \\d+ tallies for \\d+ entities/
+                    | parse 'Scheduled * tallies for * entities: * referred, * deferred, * of which for cost'
+                      as tallies, entities, referred, deferred, expensive
+                    | stats sum(tallies) / sum(entities) as Coalescing,
+                            sum(deferred) / sum(entities) as Deferral,
+                            sum(expensive) / sum(entities) as Cost_deferral
+                            by bin(5min)
+                '''),
+                'region': config.region,
+                'stacked': False,
+                'title': 'Aggregation scheduling ratios',
+                'view': 'timeSeries'
+            }
+        },
+        {
+            'height': 6,
+            'width': 12,
+            'y': 72,
+            'x': 12,
+            'type': 'metric',
+            'properties': {
+                'metrics': [
+                    [
+                        {
+                            'expression': 'm2 / m1',
+                            'label': 'Deferral',
+                            'id': 'e1',
+                            'region': config.region
+                        }
+                    ],
+                    [
+                        'AWS/SQS',
+                        'NumberOfMessagesReceived',
+                        'QueueName',
+                        config.tallies_queue_name(),
+                        {
+                            'id': 'm1',
+                            'visible': False,
+                            'region': config.region
+                        }
+                    ],
+                    [
+                        'AWS/SQS',
+                        'NumberOfMessagesSent',
+                        'QueueName',
+                        config.deferred_tallies_queue_name(),
+                        {
+                            'id': 'm2',
+                            'visible': False,
+                            'region': config.region
+                        }
+                    ]
+                ],
+                'view': 'timeSeries',
+                'stacked': False,
+                'region': config.region,
+                'title': 'Tally deferral ratio',
+                'period': 300,
+                'stat': 'Sum'
+            }
         }
     ]
 }
@@ -1,6 +1,9 @@
 from azul import (
     config,
 )
+from azul.indexer.tally_buffer import (
+    TallyBuffer,
+)
 from azul.service.source_service import (
     SourceService,
 )
@@ -44,6 +47,17 @@ emit_tf(
                             "attribute_name": SourceService.ttl_attribute,
                             "enabled": True
                         }
+                    },
+                    "tally_buffer": {
+                        "name": config.dynamo_tally_buffer_table_name,
+                        "billing_mode": "PAY_PER_REQUEST",
+                        "hash_key": TallyBuffer.key_attribute,
+                        "attribute": [
+                            {
+                                "name": TallyBuffer.key_attribute,
+                                "type": "S"
+                            }
+                        ]
                     }
                 }
             }
@@ -29,19 +29,49 @@ tf_config = {
         'aws_s3_bucket_lifecycle_configuration': {
             'storage': {
                 'bucket': '${aws_s3_bucket.storage.id}',
-                'rule': {
-                    'id': 'manifests',
-                    'status': 'Enabled',
-                    'filter': {
-                        'prefix': 'manifests/'
+                'rule': [
+                    {
+                        'id': 'manifests',
+                        'status': 'Enabled',
+                        'filter': {
+                            'prefix': 'manifests/'
+                        },
+                        'expiration': {
+                            'days': config.manifest_expiration
+                        },
+                        'abort_incomplete_multipart_upload': {
+                            'days_after_initiation': 1
+                        }
                     },
-                    'expiration': {
-                        'days': config.manifest_expiration
+                    {
+                        # Entries in the shared tier of the facet cache become
+                        # unreachable as soon as the index they were computed
+                        # from changes.
+                        'id': 'facets',
+                        'status': 'Enabled',
+                        'filter': {
+                            'prefix': 'facets/'
+                        },
+                        'expiration': {
+                            'days': 1
+                        }
                     },
-                    'abort_incomplete_multipart_upload': {
-                        'days_after_initiation': 1
+                    {
+                        # Rows prefetched from TDR snapshots are only needed
+                        # until the notifications for the bundles in the
+                        # partition they were prefetched from have been
+                        # handled, which is bounded by the retention period of
+                        # the notifications queue.
+                        'id': 'tdr',
+                        'status': 'Enabled',
+                        'filter': {
+                            'prefix': 'tdr/'
+                        },
+                        'expiration': {
+                            'days': 7
+                        }
                     }
-                }
+                ]
             }
         },
         'aws_s3_bucket_logging': {
@@ -41,6 +41,20 @@ emit_tf(
                         }
                         for retry in (False, True)
                     },
+                    # Tallies in this queue are delayed and then returned to
+                    # the tallies queue. Since forwarding a tally is unlikely to
+                    # fail for reasons specific to the tally, there is no
+                    # dead-letter queue and failed tallies are retried until
+                    # they expire. Unlike the tallies queues, this is a
+                    # standard queue, since only those can be received in
+                    # batches of more than ten messages, which increases the
+                    # chances of consolidating tallies for the same entity.
+                    config.unqual_deferred_tallies_queue_name(): {
+                        "name": config.deferred_tallies_queue_name(),
+                        "delay_seconds": config.deferred_aggregation_delay,
+                        "visibility_timeout_seconds": config.aggregation_lambda_timeout(retry=False) + 10,
+                        "message_retention_seconds": 7 * 24 * 60 * 60
+                    },
                     config.unqual_notifications_queue_name(fail=True): {
                         "name": config.notifications_queue_name(fail=True),
                         "message_retention_seconds": 14 * 24 * 60 * 60,
@@ -38,11 +38,15 @@ from azul.indexer.document import (
 from azul.logging import (
     configure_test_logging,
 )
+from azul.plugins.metadata.anvil.bundle import (
+    KeyReference,
+)
 from azul.plugins.repository import (
     tdr_anvil,
 )
 from azul.plugins.repository.tdr_anvil import (
     BundleType,
+    QueryStats,
     TDRAnvilBundle,
     TDRAnvilBundleFQID,
 )
@@ -59,6 +63,9 @@ from indexer import (
 from indexer.test_tdr import (
     TDRPluginTestCase,
 )
+from service import (
+    StorageServiceTestCase,
+)
 
 
 # noinspection PyPep8Naming
@@ -129,6 +136,7 @@ class AnvilIndexerTestCase(AnvilCannedBundleTestCase, IndexerTestCase):
 
 
 class TestAnvilIndexer(AnvilIndexerTestCase,
+                       StorageServiceTestCase,
                        TDRPluginTestCase[tdr_anvil.Plugin],
                        DUOSTestCase):
 
@@ -184,6 +192,103 @@ class TestAnvilIndexer(AnvilIndexerTestCase,
                 self.assertEqual(canned_bundle.entities, bundle.entities)
                 self.assertEqual(canned_bundle.links, bundle.links)
 
+    def test_link_graph(self):
+        source_ref = self.source
+        self._make_mock_tdr_tables(source_ref)
+        plugin = self.plugin_for_source_spec(source_ref.spec)
+        bundle_fqid = self.primary_bundle()
+        canned_bundle = self._load_canned_bundle(bundle_fqid)
+        keys = defaultdict(set)
+        for entity, row in canned_bundle.entities.items():
+            pk_column = entity.entity_type.removeprefix('anvil_') + '_id'
+            keys[entity.entity_type].add(row[pk_column])
+        # Every link query must return the same links from the graph as it does
+        # from BigQuery, including for keys that aren't linked to anything
+        graph = plugin._build_link_graph(source_ref.spec)
+        for query, entity_type in [
+            (plugin._upstream_from_biosamples, 'anvil_biosample'),
+            (plugin._upstream_from_files, 'anvil_file'),
+            (plugin._diagnoses_from_donors, 'anvil_donor'),
+            (plugin._downstream_from_biosamples, 'anvil_biosample'),
+            (plugin._downstream_from_files, 'anvil_file')
+        ]:
+            with self.subTest(query=query.__name__):
+                query_keys = keys[entity_type] | {'no-such-key'}
+                self.assertEqual(query(source_ref.spec, query_keys),
+                                 graph.follow([(query, query_keys)]))
+        with patch.object(type(config), 'tdr_anvil_link_graph', new=True):
+            # A graph that is too large isn't saved, and the bundle is emulated
+            # without it
+            for max_size, message in [
+                (0, 'There is no link graph'),
+                (plugin._max_link_graph_size, 'Loaded link graph')
+            ]:
+                with self.subTest(max_size=max_size):
+                    with patch.object(type(plugin), '_max_link_graph_size', new=max_size):
+                        plugin.prefetch_source(source_ref)
+                    plugin._link_graphs().clear()
+                    with self.assertLogs(tdr_anvil.log, level='INFO') as logs:
+                        bundle = plugin.fetch_bundle(bundle_fqid)
+                    self.assertTrue(any(r.getMessage().startswith(message) for r in logs.records))
+                    assert isinstance(bundle, TDRAnvilBundle)
+                    self.assertEqual(canned_bundle.entities, bundle.entities)
+                    self.assertEqual(canned_bundle.links, bundle.links)
+        plugin._link_graphs().clear()
+
+    def test_query_stats(self):
+        source_ref = self.source
+        self._make_mock_tdr_tables(source_ref)
+        plugin = self.plugin_for_source_spec(source_ref.spec)
+
+        # Each link query is paired with the keys of the entity type it follows
+        entities = plugin._consolidate_by_type({
+            KeyReference(entity_type='anvil_biosample', key='b'),
+            KeyReference(entity_type='anvil_donor', key='d'),
+            KeyReference(entity_type='anvil_file', key='f')
+        })
+        for method, expected in [
+            (plugin._follow_upstream, [
+                ('_upstream_from_files', {'f'}),
+                ('_upstream_from_biosamples', {'b'}),
+                ('_diagnoses_from_donors', {'d'})
+            ]),
+            (plugin._follow_downstream, [
+                ('_downstream_from_biosamples', {'b'}),
+                ('_downstream_from_files', {'f'})
+            ])
+        ]:
+            with self.subTest(method=method.__name__):
+                queries = method(entities)
+                self.assertEqual(expected, [(query.__name__, keys) for query, keys in queries])
+
+        # The recorded statistics reflect the queries actually made
+        timed = QueryStats.timed
+        queries = []
+
+        def record_query(self, f, *args):
+            queries.append(f.__name__)
+            return timed(self, f, *args)
+
+        with (
+            patch.object(type(config), 'tdr_anvil_link_graph', new=False),
+            patch.object(QueryStats, 'timed', record_query),
+            self.assertLogs(tdr_anvil.log, level='INFO') as logs
+        ):
+            bundle = plugin.fetch_bundle(self.primary_bundle())
+        assert isinstance(bundle, TDRAnvilBundle)
+        record = one(r for r in logs.records if r.msg.startswith('Traversed '))
+        levels, bundle_uuid, num_queries, seconds, elapsed = record.args
+        self.assertEqual(self.primary_bundle().uuid, bundle_uuid)
+        # At least one level in each direction, the last of which yields no
+        # new entities
+        self.assertGreaterEqual(levels, 2)
+        self.assertEqual(len(queries), num_queries)
+        # One query per entity type in the bundle, and at least one link query
+        entity_types = {entity.entity_type for entity in bundle.entities}
+        self.assertEqual(len(entity_types), queries.count('_retrieve_entities'))
+        self.assertGreater(num_queries, len(entity_types))
+        self.assertLessEqual(seconds, elapsed * num_queries)
+
 
 class TestAnvilIndexerWithIndexesSetUp(AnvilIndexerTestCase):
     """
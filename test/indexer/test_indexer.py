@@ -16,7 +16,9 @@ from copy import (
 )
 from itertools import (
     chain,
+    islice,
 )
+import json
 import re
 from typing import (
     Iterable,
@@ -39,6 +41,7 @@ from elasticsearch import (
 )
 from more_itertools import (
     bucket,
+    chunked,
     ilen,
     one,
 )
@@ -54,11 +57,16 @@ from azul.collections import (
 from azul.indexer import (
     Bundle,
     BundlePartition,
+    SourcedBundleFQID,
+)
+from azul.indexer.aggregate import (
+    NotMergeable,
 )
 from azul.indexer.document import (
     CataloguedEntityReference,
     Contribution,
     ContributionCoordinates,
+    Document,
     DocumentType,
     EntityReference,
     EntityType,
@@ -267,7 +275,7 @@ class TestDCP1Indexer(DCP1IndexerTestCase):
             < bundle_sizes[1][1]
         )
 
-        field_types = self.index_service.catalogued_field_types()
+        translators = self.index_service.catalogued_field_translators()
         aggregate_cls = self.metadata_plugin.aggregate_class()
         for bundle_fqid, num_contribs, num_replicas in bundle_sizes:
             with self.subTest(num_contribs=num_contribs):
@@ -284,10 +292,10 @@ class TestDCP1Indexer(DCP1IndexerTestCase):
                     for hit in hits:
                         qualifier, doc_type = self._parse_index_name(hit)
                         if doc_type is DocumentType.aggregate:
-                            doc = aggregate_cls.from_index(field_types, hit)
+                            doc = aggregate_cls.from_index(translators, hit)
                             self.assertNotEqual(doc.contents, {})
                         elif doc_type is DocumentType.contribution:
-                            doc = Contribution.from_index(field_types, hit)
+                            doc = Contribution.from_index(translators, hit)
                             self.assertEqual(bundle_fqid.upcast(), doc.coordinates.bundle)
                             self.assertFalse(doc.coordinates.deleted)
                         elif doc_type is DocumentType.replica:
@@ -313,7 +321,7 @@ class TestDCP1Indexer(DCP1IndexerTestCase):
                     for hit in hits:
                         qualifier, doc_type = self._parse_index_name(hit)
                         if doc_type is DocumentType.contribution:
-                            doc = Contribution.from_index(field_types, hit)
+                            doc = Contribution.from_index(translators, hit)
                             docs_by_entity[doc.entity].append(doc)
                             self.assertEqual(bundle_fqid.upcast(), doc.coordinates.bundle)
                         else:
@@ -459,12 +467,116 @@ class TestDCP1IndexerWithIndexesSetUp(DCP1IndexerTestCase):
                                     fr'.*_aggregate/_create/{doc_id}.*')
             self.assertTrue(any(message_re.fullmatch(message) for message in logs.output))
 
+    def test_sliced_contribution_reads(self):
+        """
+        Reading contributions in concurrent slices must yield the same
+        contributions, in the same order, as reading them serially.
+        """
+        bundle = self._load_canned_bundle(self.new_bundle)
+        tallies = dict(self._write_transforms(bundle))
+
+        def read(concurrency: int, limit: Optional[int] = None) -> JSONs:
+            with (
+                patch.object(type(config),
+                             'contribution_read_concurrency',
+                             new=concurrency),
+                patch.object(type(config),
+                             'contribution_page_size',
+                             new=1)
+            ):
+                contributions = self.index_service._read_contributions(tallies)
+                contributions = list(islice(contributions, limit))
+            return [c.to_json() for c in contributions]
+
+        expected = read(1)
+        self.assertGreater(len(expected), 1)
+        for concurrency in 2, 4:
+            with self.subTest(concurrency=concurrency):
+                self.assertEqual(expected, read(concurrency))
+        # The threads reading the slices must not block on a full queue once
+        # the contributions are no longer consumed
+        with self.subTest(concurrency=2, limit=1):
+            self.assertEqual(expected[:1], read(2, limit=1))
+
+    def test_bulk_rejections(self):
+        """
+        Documents rejected by Elasticsearch in a bulk request must be retried
+        without rewriting the documents that were accepted.
+        """
+        bundle_fqid = self.bundle_fqid(uuid='2a87dc5c-0c3c-4d91-a348-5d784ab48b92',
+                                       version='2018-03-29T10:39:45.437487Z')
+        bundle = self._load_canned_bundle(bundle_fqid)
+        bundle = DSSBundle(fqid=bundle_fqid,
+                           manifest=bundle.manifest,
+                           metadata=bundle.metadata,
+                           links=bundle.links)
+        send_chunk = IndexWriter._send_chunk
+        rejected = set()
+        writes = Counter()
+
+        def mock_send_chunk(writer, chunk):
+            items, accepted = {}, []
+            for i, (doc, _) in enumerate(chunk):
+                # Reject every other document, but only once
+                if i % 2 or doc.coordinates in rejected:
+                    accepted.append(i)
+                    writes[doc.coordinates] += 1
+                else:
+                    rejected.add(doc.coordinates)
+                    items[i] = {
+                        'status': 429,
+                        'error': {'type': 'es_rejected_execution_exception'}
+                    }
+            if accepted:
+                items.update(zip(accepted, send_chunk(writer, [chunk[i] for i in accepted])))
+            return [items[i] for i in range(len(chunk))]
+
+        with (
+            patch.object(IndexWriter, '_send_chunk', new=mock_send_chunk),
+            patch.object(IndexWriter, 'bulk_rejection_delays', new=(0,))
+        ):
+            self._index_bundle(bundle)
+        self.assertGreater(len(rejected), 0)
+        self.assertEqual({1}, set(writes.values()))
+        hits = self._get_all_hits()
+        self._assert_hit_counts(hits, num_contribs=258, num_replicas=263)
+
     def test_deletion_before_addition(self):
         self._index_canned_bundle(self.new_bundle, delete=True)
         self._assert_index_counts(just_deletion=True)
         self._index_canned_bundle(self.new_bundle)
         self._assert_index_counts(just_deletion=False)
 
+    def test_bulk_index(self):
+        """
+        Bulk indexing should produce the same documents as indexing each bundle
+        individually.
+        """
+        bundle_fqids = [self.old_bundle, self.new_bundle]
+        for bundle_fqid in bundle_fqids:
+            self._index_canned_bundle(bundle_fqid)
+        expected_hits = self._get_all_hits()
+        self.index_service.delete_indices(self.catalog)
+        self.index_service.create_indices(self.catalog)
+
+        def fetch_bundle(_catalog, bundle_fqid):
+            bundle_fqid = one(
+                b
+                for b in bundle_fqids
+                if (b.uuid, b.version) == (bundle_fqid['uuid'], bundle_fqid['version'])
+            )
+            return self._load_canned_bundle(bundle_fqid)
+
+        with patch.object(IndexService, 'fetch_bundle', side_effect=fetch_bundle):
+            num_documents = self.index_service.bulk_index(self.catalog,
+                                                          [b.to_json() for b in bundle_fqids],
+                                                          executor=ThreadPoolExecutor(2),
+                                                          batch_size=1,
+                                                          aggregation_batch_size=2)
+        hits = self._get_all_hits()
+        self.assertElasticEqual(expected_hits, hits)
+        self.assertGreaterEqual(num_documents, len(hits))
+
     def _assert_index_counts(self, *, just_deletion: bool):
         # Two files, a project, a cell suspension, a sample, and a bundle
         num_old_contribs = 6
@@ -2012,6 +2124,87 @@ class TestDCP1IndexerWithIndexesSetUp(DCP1IndexerTestCase):
                 else:
                     assert False, doc_type
 
+    def test_incremental_aggregation(self):
+        """
+        Index, supersede and delete bundles with incremental aggregation
+        enabled and assert that the resulting aggregates are the same as those
+        of a full aggregation of the resulting contributions.
+        """
+        bundles = [
+            # Two bundles for the same project
+            self.bundle_fqid(uuid='1fd499c5-f397-4bff-9af0-eb42c37d5fbe',
+                             version='2021-03-18T11:38:49.884000Z'),
+            self.bundle_fqid(uuid='0722b70c-6778-423d-8fe9-869e2a515d35',
+                             version='2021-03-18T11:38:49.863000Z'),
+            # Two more bundles for another project
+            self.bundle_fqid(uuid='dcccb551-4766-4210-966c-f9ee25d19190',
+                             version='2018-10-18T20:46:55.866661Z'),
+            self.bundle_fqid(uuid='411cd8d5-5990-43cd-84cc-6c7796b8a76d',
+                             version='2018-10-18T20:46:55.866661Z')
+        ]
+        bundles = list(map(self._load_canned_bundle, bundles))
+        superseded_bundle, deleted_bundle, _, unbounded_bundle = bundles
+        superseding_bundle = DSSBundle(fqid=self.bundle_fqid(uuid=superseded_bundle.uuid,
+                                                             version='2021-03-19T11:38:49.884000Z'),
+                                       manifest=deepcopy(superseded_bundle.manifest),
+                                       metadata=deepcopy(superseded_bundle.metadata),
+                                       links=deepcopy(superseded_bundle.links))
+
+        def aggregates() -> dict[str, JSON]:
+            return {
+                hit['_index'] + '/' + hit['_id']: hit['_source']
+                for hit in self._get_all_hits()
+                if self._parse_index_name(hit)[1] is DocumentType.aggregate
+            }
+
+        with (
+            patch.object(type(config),
+                         'incremental_aggregation',
+                         new_callable=PropertyMock,
+                         return_value=True),
+            self.assertLogs(index_service_log, level='INFO') as logs
+        ):
+            for bundle in bundles:
+                if bundle is unbounded_bundle:
+                    with patch.object(IndexService, '_max_state_size', new=0):
+                        self._index_bundle(bundle)
+                else:
+                    self._index_bundle(bundle)
+            self._index_bundle(superseding_bundle)
+            self._index_bundle(deleted_bundle, delete=True)
+
+        messages = [record.getMessage() for record in logs.records]
+        num_updated = sum(
+            record.args[0]
+            for record in logs.records
+            if record.msg.startswith('Updated %i out of %i aggregate(s) incrementally')
+        )
+        self.assertGreater(num_updated, 0)
+        for message in [
+            'since its size of',
+            'since some of the new contributions supersede other contributions',
+            'since some of the new contributions are deletions'
+        ]:
+            self.assertTrue(any(message in m for m in messages), message)
+
+        incremental_aggregates = aggregates()
+        self.assertTrue(any('aggregate_state' in a for a in incremental_aggregates.values()))
+
+        # Rebuild every aggregate from all of its contributions
+        tallies = {}
+        for key in incremental_aggregates.keys():
+            index_name, entity_id = key.split('/')
+            entity = CataloguedEntityReference(catalog=self.catalog,
+                                               entity_type=IndexName.parse(index_name).qualifier,
+                                               entity_id=entity_id)
+            tallies[entity] = 0
+        self.index_service.aggregate(tallies)
+        rebuilt_aggregates = aggregates()
+
+        for aggregate in incremental_aggregates.values():
+            aggregate.pop('aggregate_state', None)
+        self.assertElasticEqual(rebuilt_aggregates, incremental_aggregates)
+
     def test_files_content_description(self):
         bundle_fqid = self.bundle_fqid(uuid='ffac201f-4b1c-4455-bd58-19c1a9e863b4',
                                        version='2019-10-09T17:07:35.528600Z')
@@ -2167,14 +2360,15 @@ class TestDCP1IndexerWithIndexesSetUp(DCP1IndexerTestCase):
                           hub_ids=[],
                           coordinates=coordinates)
 
-        for case, hub_ids, expected_hub_ids in [
-            ('New replica', ['1', '1'], ['1']),
-            ('Additional hub IDs', ['3', '2', '1'], ['1', '2', '3']),
-            ('Redundant hub IDs', ['1', '2'], ['1', '2', '3'])
+        for case, hub_ids, expected_hub_ids, expected_written in [
+            ('New replica', ['1', '1'], ['1'], 1),
+            ('Additional hub IDs', ['3', '2', '1'], ['1', '2', '3'], 1),
+            ('Redundant hub IDs', ['1', '2'], ['1', '2', '3'], 0)
         ]:
             with self.subTest(case):
                 replica.hub_ids[:] = hub_ids
-                self.index_service.replicate(self.catalog, [replica])
+                num_written = self.index_service.replicate(self.catalog, [replica])
+                self.assertEqual(expected_written, num_written)
                 hit = one(self._get_all_hits())
                 self.assertEqual(hit['_id'], coordinates.document_id)
                 self.assertEqual(hit['_source']['hub_ids'], expected_hub_ids)
@@ -2303,6 +2497,110 @@ class TestIndexManagement(AzulUnitTestCase):
                     assert mismatch is None
 
 
+class TestFieldTranslator(DCP1CannedBundleTestCase):
+
+    def test_translation(self):
+        """
+        The compiled translator must be equivalent to the generic, interpreting
+        implementation of field translation.
+        """
+        index_service = IndexService()
+        field_types = index_service.field_types(self.catalog)
+        translator = index_service.field_translator(self.catalog)
+        self.assertIs(translator, index_service.field_translator(self.catalog))
+        bundle_fqids = [
+            SourcedBundleFQID(source=self.source,
+                              uuid='aaa96233-bf27-44c7-82df-b4dc15ad4d9d',
+                              version='2018-11-02T11:33:44.698028Z'),
+            SourcedBundleFQID(source=self.source,
+                              uuid='2a87dc5c-0c3c-4d91-a348-5d784ab48b92',
+                              version='2018-03-29T10:39:45.437487Z'),
+            SourcedBundleFQID(source=self.source,
+                              uuid='587d74b4-1075-4bbf-b96a-4d1ede0481b2',
+                              version='2018-10-10T02:23:43.182000Z')
+        ]
+        for bundle_fqid in bundle_fqids:
+            bundle = self._load_canned_bundle(bundle_fqid)
+            for delete in False, True:
+                with self.subTest(bundle=bundle_fqid.uuid, delete=delete):
+                    transforms = index_service.deep_transform(self.catalog, bundle, delete=delete)
+                    contributions = [c for cs, _ in transforms for c in cs]
+                    self.assertGreater(len(contributions), 0)
+                    for contribution in contributions:
+                        doc = contribution.to_json()
+                        expected = Document.translate_fields(doc, field_types, forward=True)
+                        actual = translator.to_index(doc)
+                        self.assertEqual(expected, actual)
+                        doc = actual
+                        expected = Document.translate_fields(doc, field_types, forward=False)
+                        actual = translator.from_index(doc)
+                        self.assertEqual(expected, actual)
+
+    def test_plugin_reload(self):
+        index_service = IndexService()
+        translator = index_service.field_translator(self.catalog)
+        index_service.metadata_plugin.cache_clear()
+        self.assertIsNot(translator, index_service.field_translator(self.catalog))
+
+
+class TestIncrementalAggregation(DCP1CannedBundleTestCase):
+
+    def test_merge(self):
+        """
+        Folding entities into the saved state of an aggregator must yield the
+        same result as aggregating all entities at once.
+        """
+        index_service = IndexService()
+        transformers = {
+            transformer_cls.entity_type(): transformer_cls
+            for transformer_cls in index_service.transformer_types(self.catalog)
+        }
+        translator = index_service.field_translator(self.catalog)
+        serializer = elasticsearch.serializer.JSONSerializer()
+        bundle_fqids = [
+            SourcedBundleFQID(source=self.source,
+                              uuid='aaa96233-bf27-44c7-82df-b4dc15ad4d9d',
+                              version='2018-11-02T11:33:44.698028Z'),
+            SourcedBundleFQID(source=self.source,
+                              uuid='2a87dc5c-0c3c-4d91-a348-5d784ab48b92',
+                              version='2018-03-29T10:39:45.437487Z'),
+            SourcedBundleFQID(source=self.source,
+                              uuid='587d74b4-1075-4bbf-b96a-4d1ede0481b2',
+                              version='2018-10-10T02:23:43.182000Z')
+        ]
+        entities: dict[tuple[EntityType, EntityType], JSONs] = defaultdict(list)
+        for bundle_fqid in bundle_fqids:
+            bundle = self._load_canned_bundle(bundle_fqid)
+            for contributions, _ in index_service.deep_transform(self.catalog, bundle, delete=False):
+                for contribution in contributions:
+                    # Aggregators operate on contributions read from the index
+                    doc = serializer.dumps(translator.to_index(contribution.to_json()))
+                    doc = translator.from_index(json.loads(doc))
+                    entity_type = contribution.entity.entity_type
+                    for inner_entity_type, inner_entities in doc['contents'].items():
+                        entities[entity_type, inner_entity_type].extend(inner_entities)
+        num_merged = 0
+        for (entity_type, inner_entity_type), inner_entities in entities.items():
+            transformer = transformers[entity_type]
+            aggregator = transformer.aggregator(inner_entity_type)
+            if aggregator is None:
+                continue
+            with self.subTest(entity_type=entity_type, inner_entity_type=inner_entity_type):
+                expected = aggregator.aggregate(inner_entities)
+                actual, state = [], None
+                try:
+                    for chunk in chunked(inner_entities, 3):
+                        actual, state = aggregator.merge(state, chunk)
+                        # The state must survive a round trip through JSON
+                        state = json.loads(json.dumps(state))
+                except NotMergeable:
+                    pass
+                else:
+                    self.assertEqual(expected, actual)
+                    num_merged += 1
+        self.assertGreater(num_merged, 0)
+
+
 def get(v):
     return one(v) if isinstance(v, list) else v
 
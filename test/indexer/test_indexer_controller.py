@@ -2,6 +2,7 @@ from bisect import (
     insort,
 )
 from collections import (
+    Counter,
     defaultdict,
 )
 from functools import (
@@ -14,6 +15,7 @@ from unittest.mock import (
     call,
     patch,
 )
+import uuid
 
 from chalice.app import (
     SQSRecord,
@@ -41,6 +43,7 @@ from azul.indexer import (
 )
 from azul.indexer.document import (
     Contribution,
+    EntityReference,
 )
 from azul.indexer.index_controller import (
     IndexController,
@@ -97,6 +100,7 @@ class TestIndexController(DCP1IndexerTestCase, SqsTestCase):
 
     def _mock_sqs_record(self, body, *, attempts: int = 1):
         event_dict = {
+            'messageId': str(uuid.uuid4()),
             'body': json.dumps(body),
             'receiptHandle': 'ThisWasARandomString',
             'attributes': {'ApproximateReceiveCount': attempts}
@@ -119,6 +123,10 @@ class TestIndexController(DCP1IndexerTestCase, SqsTestCase):
     def _tallies_retry_queue(self):
         return self.controller._tallies_queue(retry=True)
 
+    @property
+    def _deferred_tallies_queue(self):
+        return self.controller._deferred_tallies_queue()
+
     def _read_queue(self, queue) -> JSONs:
         messages = self.queue_manager.read_messages(queue)
         # For unknown reasons, Moto 4.0.6 requires reading the queues a second
@@ -314,6 +322,152 @@ class TestIndexController(DCP1IndexerTestCase, SqsTestCase):
         self.assertEqual([], self._read_queue(self._tallies_retry_queue))
         self.assertEqual([], self._read_queue(self._tallies_queue))
 
+    def test_contribute_batch(self):
+        """
+        Contribution of a batch of two bundles and one bundle that fails to be
+        fetched. The contributions of the two good bundles are written together
+        and their tallies are consolidated per entity. Only the message
+        referencing the bad bundle is reported as failed.
+        """
+        self._create_mock_queues()
+        source = DSSSourceRef.for_dss_source('foo_source:/0')
+        fqids = [
+            DSSBundleFQID(source=source,
+                          uuid='56a338fe-7554-4b5d-96a2-7df127a7640b',
+                          version='2018-03-28T15:10:23.074974Z'),
+            DSSBundleFQID(source=source,
+                          uuid='b2216048-7eaa-45f4-8077-5a3fb4204953',
+                          version='2018-03-29T10:40:41.822717Z')
+        ]
+        bad_fqid = DSSBundleFQID(source=source,
+                                 uuid='d18eb8b1-4b32-4de7-b4d7-8b9bb7e1b9c4',
+                                 version='2018-03-29T10:40:41.822717Z')
+        bundles = {
+            fqid: self._load_canned_bundle(fqid)
+            for fqid in fqids
+        }
+
+        expected_tallies = Counter()
+        for bundle in bundles.values():
+            contributions, _ = self.index_service.transform(self.catalog,
+                                                            bundle,
+                                                            delete=False)
+            for contribution in contributions:
+                expected_tallies[contribution.entity] += 1
+        expected_digest = defaultdict(list)
+        for entity, num_contributions in expected_tallies.items():
+            insort(expected_digest[entity.entity_type], num_contributions)
+        # The two bundles contribute to the same project
+        self.assertEqual([2], expected_digest['projects'])
+
+        def fetch_bundle(fqid):
+            try:
+                return bundles[fqid]
+            except KeyError:
+                raise RuntimeError('Bundle not found', fqid)
+
+        mock_plugin = MagicMock()
+        mock_plugin.fetch_bundle.side_effect = fetch_bundle
+        mock_plugin.resolve_bundle.side_effect = DSSBundleFQID.from_json
+        mock_plugin.sources = [source]
+        event = [
+            self._mock_sqs_record(dict(action='add',
+                                       catalog=self.catalog,
+                                       notification=self.client.notification(fqid)))
+            for fqid in [*fqids, bad_fqid]
+        ]
+        with patch.dict(os.environ, AZUL_CONTRIBUTION_BATCH_SIZE=str(len(event))):
+            with patch.object(IndexService, 'repository_plugin', return_value=mock_plugin):
+                response = self.controller.contribute(event)
+
+        expected_response = {
+            'batchItemFailures': [
+                {'itemIdentifier': event[-1].to_dict()['messageId']}
+            ]
+        }
+        self.assertEqual(expected_response, response)
+        tallies = self._read_queue(self._tallies_queue)
+        self.assertEqual(expected_digest, self._digest_tallies(tallies))
+
+        # Writing the same bundles again results in overwrites, each of which
+        # is tallied with a count of zero
+        with patch.dict(os.environ, AZUL_CONTRIBUTION_BATCH_SIZE=str(len(event))):
+            with patch.object(IndexService, 'repository_plugin', return_value=mock_plugin):
+                response = self.controller.contribute(event[:-1])
+        self.assertEqual({'batchItemFailures': []}, response)
+        tallies = self._read_queue(self._tallies_queue)
+        self.assertEqual(expected_tallies.keys(), {
+            EntityReference(entity_type=tally['entity_type'],
+                            entity_id=tally['entity_id'])
+            for tally in tallies
+        })
+        self.assertEqual({0}, {tally['num_contributions'] for tally in tallies})
+
+    def test_deferred_aggregation(self):
+        """
+        The single tally for an entity that is expensive to aggregate should be
+        moved to the deferred tallies queue. Deferred tallies should be
+        consolidated and deferred again while they keep growing, but only a
+        limited number of times.
+        """
+        self._create_mock_queues()
+        threshold = 10
+
+        def tally(entity_type, entity_id, num_contributions):
+            return dict(catalog=self.catalog,
+                        entity_type=entity_type,
+                        entity_id=entity_id,
+                        num_contributions=num_contributions)
+
+        cheap = tally('files', str(uuid.uuid4()), 1)
+        expensive = tally('projects', str(uuid.uuid4()), threshold + 1)
+        event = [self._mock_sqs_record(cheap), self._mock_sqs_record(expensive)]
+        with (
+            patch.dict(os.environ, AZUL_DEFERRED_AGGREGATION_THRESHOLD=str(threshold)),
+            patch.object(IndexService, 'aggregate') as aggregate
+        ):
+            self.controller.aggregate(event)
+            aggregate.assert_called_once()
+            (tallies,), _ = aggregate.call_args
+            self.assertEqual([1], list(tallies.values()))
+            self.assertEqual([], self._read_queue(self._tallies_queue))
+            deferred = one(self._read_queue(self._deferred_tallies_queue))
+            self.assertEqual(dict(expensive, deferrals=1), deferred)
+
+            # A retry is never deferred
+            aggregate.reset_mock()
+            self.controller.aggregate([self._mock_sqs_record(expensive)], retry=True)
+            aggregate.assert_called_once()
+            self.assertEqual([], self._read_queue(self._deferred_tallies_queue))
+
+            # Two tallies were deferred for the same entity, so its tallies are
+            # still growing and its aggregation is deferred again ...
+            for deferrals in range(1, self.controller.max_tally_deferrals):
+                event = [self._mock_sqs_record(deferred), self._mock_sqs_record(dict(expensive, deferrals=1))]
+                self.controller.requeue_deferred_tallies(event)
+                self.assertEqual([], self._read_queue(self._tallies_queue))
+                deferred = one(self._read_queue(self._deferred_tallies_queue))
+                self.assertEqual(deferrals + 1, deferred['deferrals'])
+            self.assertEqual((threshold + 1) * self.controller.max_tally_deferrals,
+                             deferred['num_contributions'])
+
+            # ... but only a limited number of times
+            event = [self._mock_sqs_record(deferred), self._mock_sqs_record(dict(expensive, deferrals=1))]
+            self.controller.requeue_deferred_tallies(event)
+            self.assertEqual([], self._read_queue(self._deferred_tallies_queue))
+            requeued = one(self._read_queue(self._tallies_queue))
+            self.assertEqual(self.controller.max_tally_deferrals, requeued['deferrals'])
+
+            # A tally that was deferred before is aggregated, however expensive
+            aggregate.reset_mock()
+            self.controller.aggregate([self._mock_sqs_record(requeued)])
+            aggregate.assert_called_once()
+            self.assertEqual([], self._read_queue(self._deferred_tallies_queue))
+
+        # A single deferred tally is returned to the tallies queue right away
+        self.controller.requeue_deferred_tallies([self._mock_sqs_record(dict(cheap, deferrals=1))])
+        self.assertEqual([dict(cheap, deferrals=1)], self._read_queue(self._tallies_queue))
+
     def _digest_tallies(self, tallies):
         entities = defaultdict(list)
         for tally in tallies:
@@ -0,0 +1,83 @@
+from typing import (
+    Mapping,
+)
+from unittest.mock import (
+    patch,
+)
+
+from moto import (
+    mock_dynamodb,
+)
+from mypy_boto3_dynamodb.literals import (
+    ScalarAttributeTypeType,
+)
+
+from azul.indexer.document import (
+    CataloguedEntityReference,
+)
+from azul.indexer.tally_buffer import (
+    Tallies,
+    TallyBuffer,
+)
+from azul.time import (
+    SpecificRemainingTime,
+)
+from dynamodb_test_case import (
+    DynamoDBTestCase,
+)
+
+
+@mock_dynamodb
+class TestTallyBuffer(DynamoDBTestCase):
+
+    def _dynamodb_table_name(self) -> str:
+        return TallyBuffer.table_name
+
+    def _dynamodb_atttributes(self) -> Mapping[str, ScalarAttributeTypeType]:
+        return {TallyBuffer.key_attribute: 'S'}
+
+    def _dynamodb_hash_key(self) -> str:
+        return TallyBuffer.key_attribute
+
+    def _entity(self, entity_type: str, entity_id: str) -> CataloguedEntityReference:
+        return CataloguedEntityReference(catalog='test',
+                                         entity_type=entity_type,
+                                         entity_id=entity_id)
+
+    def test_tally_buffer(self):
+        buffer = TallyBuffer()
+        project = self._entity('projects', '1')
+        file = self._entity('files', '2')
+        sample = self._entity('samples', '3')
+        buffer.add({project: 1, file: 1})
+        buffer.add({project: 1, sample: 0})
+        buffer.add({project: 2})
+        self.assertEqual(3, buffer.count())
+
+        flushed = []
+
+        def fail(_tallies: Tallies):
+            raise RuntimeError()
+
+        def remaining_time():
+            return SpecificRemainingTime(60)
+
+        with self.assertRaises(RuntimeError):
+            buffer.flush(fail, remaining_time())
+        self.assertEqual(3, buffer.count())
+
+        # Without enough time left, the tallies stay in the buffer
+        self.assertEqual(0, buffer.flush(flushed.append, SpecificRemainingTime(0)))
+        self.assertEqual([], flushed)
+        self.assertEqual(3, buffer.count())
+
+        with patch.object(TallyBuffer, 'flush_batch_size', 2):
+            self.assertEqual(3, buffer.flush(flushed.append, remaining_time()))
+        self.assertEqual(0, buffer.count())
+        self.assertEqual([2, 1], list(map(len, flushed)))
+        expected = {project: 4, file: 1, sample: 0}
+        self.assertEqual(expected, {k: v for page in flushed for k, v in page.items()})
+
+        flushed.clear()
+        self.assertEqual(0, buffer.flush(flushed.append, remaining_time()))
+        self.assertEqual([], flushed)
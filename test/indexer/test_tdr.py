@@ -75,6 +75,10 @@ from azul.plugins.repository import (
 )
 from azul.plugins.repository.tdr import (
     TDRPlugin,
+    TDRRowCache,
+)
+from azul.service.storage_service import (
+    StorageObjectNotFound,
 )
 from azul.plugins.repository.tdr_hca import (
     TDRBundleFQID,
@@ -88,6 +92,9 @@ from azul.terra import (
     TerraClient,
     TerraCredentialsProvider,
 )
+from azul.time import (
+    SpecificRemainingTime,
+)
 from azul.types import (
     AnyJSON,
     JSON,
@@ -105,6 +112,9 @@ from indexer import (
     CannedFileTestCase,
     DCP2CannedBundleTestCase,
 )
+from service import (
+    StorageServiceTestCase,
+)
 
 log = get_test_logger(__name__)
 
@@ -258,6 +268,7 @@ class TDRPluginTestCase(TDRTestCase,
 
 
 class TestTDRHCAPlugin(DCP2CannedBundleTestCase,
+                       StorageServiceTestCase,
                        TDRPluginTestCase[tdr_hca.Plugin]):
 
     @classmethod
@@ -322,11 +333,112 @@ class TestTDRHCAPlugin(DCP2CannedBundleTestCase,
                 SET content = {json.dumps(links_content)!r}
                 WHERE links_id = "{links_id}"
             ''')
+            # The row cache assumes immutable snapshots
+            plugin._row_cache().clear()
             # Invoke code under test
             with self.assertRaises(RequirementError):
                 self._test_fetch_bundle(bundle,
                                         load_tables=False)  # Avoid resetting tables to canned state
 
+    def test_row_cache(self):
+        bundle = self._load_canned_bundle(self.bundle_fqid)
+        plugin = self.plugin_for_source_spec(bundle.fqid.source.spec)
+        plugin._row_cache().clear()
+        num_rows = len(bundle.metadata) + 1  # the links entity isn't in metadata
+        for cached, retrieved in [(0, num_rows), (num_rows, 0)]:
+            with self.subTest(cached=cached, retrieved=retrieved):
+                with self.assertLogs(plugin_log, level=logging.INFO) as cm:
+                    self._test_fetch_bundle(bundle, load_tables=cached == 0)
+                message = (f'Found {cached} row(s) in the cache and '
+                           f'retrieved {retrieved} row(s) for bundle')
+                self.assertTrue(any(r.getMessage().startswith(message) for r in cm.records))
+
+    def _partition_prefix(self, bundle: TDRHCABundle) -> str:
+        prefix = bundle.fqid.source.spec.prefix
+        return bundle.uuid[:len(prefix.common) + prefix.partition]
+
+    def test_prefetch(self):
+        bundle = self._load_canned_bundle(self.bundle_fqid)
+        source = bundle.fqid.source
+        plugin = self.plugin_for_source_spec(source.spec)
+        partition_prefix = self._partition_prefix(bundle)
+        num_rows = len(bundle.metadata) + 1
+        self._make_mock_tdr_tables(source)
+        with patch.object(type(config), 'tdr_prefetch', new=True):
+            for prefetch in [False, True]:
+                with self.subTest(prefetch=prefetch):
+                    plugin._row_cache().clear()
+                    plugin._prefetched_partitions().clear()
+                    with self.assertLogs('azul.plugins.repository', level=logging.INFO) as cm:
+                        if prefetch:
+                            plugin.prefetch_partition(source,
+                                                      partition_prefix,
+                                                      SpecificRemainingTime(60))
+                        self._test_fetch_bundle(bundle, load_tables=False)
+                    messages = [r.getMessage() for r in cm.records]
+                    if prefetch:
+                        self.assertTrue(any(m.startswith('Prefetched ') for m in messages))
+                        self.assertTrue(any(m.startswith('Loaded ') for m in messages))
+                        cached, retrieved = num_rows, 0
+                    else:
+                        self.assertTrue(any(m.startswith('No rows were prefetched ') for m in messages))
+                        cached, retrieved = 0, num_rows
+                    message = (f'Found {cached} row(s) in the cache and '
+                               f'retrieved {retrieved} row(s) for bundle')
+                    self.assertTrue(any(m.startswith(message) for m in messages))
+
+    def test_prefetch_limits(self):
+        bundle = self._load_canned_bundle(self.bundle_fqid)
+        source = bundle.fqid.source
+        plugin = self.plugin_for_source_spec(source.spec)
+        partition_prefix = self._partition_prefix(bundle)
+        object_key = plugin._prefetch_object_key(source, partition_prefix)
+        self._make_mock_tdr_tables(source)
+        with patch.object(type(config), 'tdr_prefetch', new=True):
+            for remaining_time, row_cache_size in [(0, config.tdr_row_cache_size), (60, 1)]:
+                with self.subTest(remaining_time=remaining_time, row_cache_size=row_cache_size):
+                    with (
+                        patch.object(type(config), 'tdr_row_cache_size', new=row_cache_size),
+                        self.assertLogs('azul.plugins.repository', level=logging.WARNING) as cm
+                    ):
+                        plugin.prefetch_partition(source,
+                                                  partition_prefix,
+                                                  SpecificRemainingTime(remaining_time))
+                    message = f'Prefetching rows in partition {partition_prefix!r}'
+                    self.assertTrue(any(r.getMessage().startswith(message) for r in cm.records))
+                    # Nothing was prefetched, so nothing was saved
+                    with self.assertRaises(StorageObjectNotFound):
+                        self.storage_service.get(object_key)
+
+    def test_prefetch_eviction(self):
+        bundle = self._load_canned_bundle(self.bundle_fqid)
+        source = bundle.fqid.source
+        plugin = self.plugin_for_source_spec(source.spec)
+        row_cache = TDRRowCache(max_size=config.tdr_row_cache_size)
+        self._make_mock_tdr_tables(source)
+        with (
+            patch.object(type(config), 'tdr_prefetch', new=True),
+            patch.object(type(plugin), '_row_cache', return_value=row_cache)
+        ):
+            plugin.prefetch_partition(source,
+                                      self._partition_prefix(bundle),
+                                      SpecificRemainingTime(60))
+            plugin._prefetched_partitions().clear()
+            with self.assertNoLogs('azul.plugins.repository', level=logging.WARNING):
+                self._test_fetch_bundle(bundle, load_tables=False)
+            self.assertEqual(0, row_cache.evictions)
+
+            # A cache that is just too small to hold all prefetched rows
+            row_cache_size = row_cache._size
+            row_cache.clear()
+            row_cache.max_size = row_cache_size - 1
+            plugin._prefetched_partitions().clear()
+            with self.assertLogs('azul.plugins.repository', level=logging.WARNING) as cm:
+                self._test_fetch_bundle(bundle, load_tables=False)
+            self.assertGreater(row_cache.evictions, 0)
+            message = 'The row cache of %i bytes is too small' % row_cache.max_size
+            self.assertTrue(any(r.getMessage().startswith(message) for r in cm.records))
+
     def test_subgraph_stitching(self):
         downstream_uuid = '4426adc5-b3c5-5aab-ab86-51d8ce44dfbe'
         upstream_uuids = [
@@ -102,6 +102,7 @@ from azul.service.manifest_service import (
     ManifestService,
     PagedManifestGenerator,
     SignedManifestKey,
+    VerbatimManifestGenerator,
 )
 from azul.service.storage_service import (
     StorageService,
@@ -1360,7 +1361,15 @@ class TestManifests(DCP1ManifestTestCase, PFBTestCase):
                     'value': bundle.metadata[ref],
                 })
 
-        response = self._get_manifest(ManifestFormat.verbatim_jsonl, {})
+        # Force several concurrent batches of hub keys, and several pages of
+        # replicas per batch, retrieved in more than one step
+        with (
+            patch.object(VerbatimManifestGenerator, 'min_replica_batch_size', 1),
+            patch.object(VerbatimManifestGenerator, 'max_replica_batch_size', 1),
+            patch.object(VerbatimManifestGenerator, 'replica_page_size', 2),
+            patch.object(VerbatimManifestGenerator, 'max_replica_batch_hits', 3)
+        ):
+            response = self._get_manifest(ManifestFormat.verbatim_jsonl, {})
         self.assertEqual(200, response.status_code)
         self._assert_jsonl(expected, response)
 
@@ -1525,6 +1534,35 @@ class TestManifestCache(DCP1ManifestTestCase):
                 latest_bundle_key = generator.manifest_key()
                 self.assertEqual(latest_bundle_key, new_keys[format])
 
+    def test_hash_validity_after_reindex(self):
+        # A reindex takes much longer than the time for which the UUID of an
+        # index is cached, so we mustn't cache it here
+        self.addPatch(patch.object(ManifestService, 'index_uuid_ttl', 0))
+        bundle_uuid = 'aaa96233-bf27-44c7-82df-b4dc15ad4d9d'
+        filters = self._filters({'project': {'is': ['Single of human pancreas']}})
+        service = ManifestService(self.storage_service, self.app_module.app.file_url)
+
+        def manifest_keys() -> dict[ManifestFormat, ManifestKey]:
+            return {
+                format: ManifestGenerator.cls_for_format(format)(service,
+                                                                 self.catalog,
+                                                                 filters).manifest_key()
+                for format in ManifestFormat
+            }
+
+        old_keys = manifest_keys()
+        # Reindexing another version of the same bundle changes the content of
+        # the matching documents, but not their number or the sequence numbers
+        # assigned to them.
+        self._teardown_indices()
+        self.index_service.create_indices(self.catalog)
+        self._index_canned_bundle(self.bundle_fqid(uuid=bundle_uuid,
+                                                   version='2018-11-04T11:33:44.698028Z'))
+        new_keys = manifest_keys()
+        for format in ManifestFormat:
+            with self.subTest(format=format):
+                self.assertNotEqual(old_keys[format], new_keys[format])
+
     @patch.object(StorageService, '_time_until_object_expires')
     def test_get_cached_manifest(self, _time_until_object_expires: MagicMock):
         format = ManifestFormat.curl
@@ -1690,6 +1728,48 @@ class TestManifestPartitioning(DCP1ManifestTestCase, DocumentCloningTestCase):
         self.assertGreater(num_partitions, 1)
         self.assertGreater(len(content), (num_partitions - 1) * part_size)
 
+    def test_upload_failure(self):
+        format = ManifestFormat.compact
+        upload_part = StorageService.upload_multipart_part
+        num_uploads = 0
+
+        def flaky_upload_part(self, *args, **kwargs):
+            nonlocal num_uploads
+            num_uploads += 1
+            if num_uploads == 2:
+                raise RuntimeError('Simulated failure')
+            return upload_part(self, *args, **kwargs)
+
+        with (
+            patch.object(PagedManifestGenerator, 'part_size', 5 * 1024 * 1024),
+            patch.object(ManifestService, '_get_cached_manifest_file_name', return_value=None)
+        ):
+            expected, expected_num_partitions = self._get_manifest_object(format, filters={})
+            expected = requests.get(expected.location).content
+            filters = self._filters({})
+            partition = ManifestPartition.first()
+            num_failures, num_partitions = 0, 1
+            with patch.object(StorageService, 'upload_multipart_part', flaky_upload_part):
+                while True:
+                    try:
+                        partition = self._service.get_manifest(format=format,
+                                                               catalog=self.catalog,
+                                                               filters=filters,
+                                                               partition=partition)
+                    except RuntimeError:
+                        # The step function retries the failed step with the
+                        # same partition
+                        num_failures += 1
+                    else:
+                        if isinstance(partition, Manifest):
+                            break
+                        partition = ManifestPartition.from_json(partition.to_json())
+                        num_partitions += 1
+        self.assertEqual(1, num_failures)
+        self.assertGreater(num_partitions, 1)
+        self.assertEqual(expected_num_partitions, num_partitions)
+        self.assertEqual(expected, requests.get(partition.location).content)
+
 
 class AnvilManifestTestCase(ManifestTestCase, AnvilCannedBundleTestCase):
 
@@ -5,10 +5,14 @@ from itertools import (
 from operator import (
     itemgetter,
 )
+import os
 from typing import (
     Any,
     Optional,
 )
+from unittest import (
+    mock,
+)
 
 import attr
 from more_itertools import (
@@ -20,6 +24,12 @@ from azul.logging import (
     configure_test_logging,
     get_test_logger,
 )
+from azul.service.elasticsearch_service import (
+    PaginationStage,
+)
+from azul.service.repository_service import (
+    RepositoryService,
+)
 from indexer import (
     DCP1CannedBundleTestCase,
 )
@@ -146,3 +156,27 @@ class TestPagination(DCP1CannedBundleTestCase, DocumentCloningTestCase):
         self.assertEqual(index_size, sum(page_lengths))
         values = list(chain.from_iterable(page.values for page in pages))
         self.assertEqual(values, list(sorted(unique(values), reverse=reverse)))
+
+    @mock.patch.dict(os.environ, AZUL_EXACT_TOTAL_HITS='0')
+    @mock.patch.object(PaginationStage, 'total_hits_threshold', new=3)
+    def test_inexact_total(self):
+        self._add_docs(5)
+        url = self.base_url.set(path='/index/files',
+                                args=dict(catalog=self.catalog, size=2))
+        for cached, expected in [
+            (True, dict(total=5, pages=3)),
+            (False, dict(total=3, pages=2, approximate=True))
+        ]:
+            with self.subTest(cached=cached):
+                if cached:
+                    response = requests.get(str(url))
+                else:
+                    # Emulate an unavailable facet cache
+                    with mock.patch.object(RepositoryService, '_generations', return_value=None):
+                        response = requests.get(str(url))
+                response.raise_for_status()
+                pagination = response.json()['pagination']
+                self.assertEqual(2, pagination['count'])
+                self.assertIsNotNone(pagination['next'])
+                actual = {k: pagination.get(k) for k in ['total', 'pages', 'approximate']}
+                self.assertEqual({'approximate': None, **expected}, actual)
@@ -36,3 +36,17 @@ class TestPFB(PFBTestCase):
         avro_pfb.PFBEntity(id='a' * 254, name='foo', object={})
         with self.assertRaises(azul.RequirementError):
             avro_pfb.PFBEntity(id='a' * 255, name='foo', object={})
+
+    def test_spooled_replicas(self):
+        replicas = [
+            {
+                'replica_type': replica_type,
+                'contents': {'name': f'{replica_type}_{i}', 'size': i}
+            }
+            for i in range(100)
+            for replica_type in ['file', 'sample']
+        ]
+        expected = avro_pfb.pfb_schema_from_replicas(replicas)
+        spooled_replicas, *actual = avro_pfb.spooled_pfb_schema_from_replicas(iter(replicas))
+        self.assertEqual(expected, tuple(actual))
+        self.assertEqual(replicas, list(spooled_replicas))
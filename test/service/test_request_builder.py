@@ -5,6 +5,9 @@ from collections.abc import (
 import json
 
 import attr
+from more_itertools import (
+    one,
+)
 
 from azul import (
     CatalogName,
@@ -407,3 +410,44 @@ class TestRequestBuilder(DCP1CannedBundleTestCase, WebServiceTestCase):
         expected_output = json.dumps(expected_output, sort_keys=True)
         actual_output = json.dumps(aggregation.to_dict(), sort_keys=True)
         self.assertEqual(actual_output, expected_output)
+
+    def test_shared_queries(self):
+        """
+        Facets that aren't filtered on share the query, and the query for any
+        other facet shares the clauses.
+        """
+
+        class Service(self.Service):
+
+            def field_types(self, catalog: CatalogName) -> FieldTypes:
+                return {
+                    **super().field_types(catalog),
+                    'path': {'to': {'foo': null_str, 'bar': null_str, 'baz': null_str}}
+                }
+
+        class MockPlugin(self.MockPlugin):
+
+            @property
+            def field_mapping(self) -> Mapping[str, FieldPath]:
+                return {
+                    'sourceId': ('sources', 'id'),
+                    'foo': ('path', 'to', 'foo'),
+                    'bar': ('path', 'to', 'bar'),
+                    'baz': ('path', 'to', 'baz')
+                }
+
+            @property
+            def facets(self) -> Sequence[str]:
+                return ['foo', 'bar', 'baz']
+
+        service = Service(MockPlugin())
+        filters = Filters(explicit={'foo': {'is': ['a']}}, source_ids=set())
+        request = self._prepare_request(filters, True, service)
+        # noinspection PyProtectedMember
+        query = request._post_filter_proxy._proxied
+        foo, bar, baz = (request.aggs[facet].filter for facet in ['foo', 'bar', 'baz'])
+        self.assertIs(query, bar)
+        self.assertIs(query, baz)
+        self.assertIsNot(query, foo)
+        self.assertEqual(2, len(query.must))
+        self.assertIs(query.must[1], one(foo.must))
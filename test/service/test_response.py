@@ -73,6 +73,9 @@ from azul.plugins.metadata.hca import (
 from azul.plugins.metadata.hca.service.response import (
     HCASearchResponseStage,
 )
+from azul.service import (
+    facet_cache,
+)
 from azul.service.elasticsearch_service import (
     ResponsePagination,
 )
@@ -3529,6 +3532,25 @@ class TestResponseFields(IndexResponseTestCase):
             for hit in hits:
                 self.assertEqual(expected, one(hit['projects'])[field])
 
+    def test_facet_cache(self):
+        species = ['Homo sapiens', 'Mus musculus']
+        for path in ['/index/files', '/index/summary']:
+            responses = []
+            for values, outcome in [(species, 'miss'), (species[::-1], 'hit')]:
+                with self.subTest(path=path, outcome=outcome):
+                    filters = {'genusSpecies': {'is': values}}
+                    url = self.base_url.set(path=path,
+                                            args=dict(catalog=self.catalog,
+                                                      filters=json.dumps(filters)))
+                    with self.assertLogs(logger=facet_cache.log, level='INFO') as logs:
+                        response = requests.get(str(url))
+                    response.raise_for_status()
+                    responses.append(response.json())
+                    self.assertTrue(logs.output)
+                    for output in logs.output:
+                        self.assertIn(f'Facet cache {outcome}', output)
+            self.assertEqual(*responses)
+
 
 class TestUnpopulatedIndexResponse(IndexResponseTestCase):
 
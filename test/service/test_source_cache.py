@@ -1,3 +1,9 @@
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from threading import (
+    Event,
+)
 import time
 from typing import (
     Mapping,
@@ -49,3 +55,39 @@ class TestSourceCache(DynamoDBTestCase):
         time.sleep(self.wait + 1)
         with self.assertRaises(Expired):
             service._get(key)
+
+    @mock.patch.object(SourceService, attribute='local_expiration', new=wait)
+    def test_local_source_cache(self):
+        service = SourceService()
+        plugin = mock.MagicMock()
+        started, release = Event(), Event()
+
+        def list_source_ids(_authentication):
+            started.set()
+            release.wait()
+            return {'foo', 'bar'}
+
+        plugin.list_source_ids.side_effect = list_source_ids
+        expected = {'foo', 'bar'}
+        with mock.patch.object(SourceService, '_repository_plugin', return_value=plugin):
+            with mock.patch.object(SourceService, '_get', wraps=service._get) as _get:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    leader = executor.submit(service.list_source_ids, 'cat', None)
+                    started.wait()
+                    follower = executor.submit(service.list_source_ids, 'cat', None)
+                    while service._lookups.waiting('cat:') == 0:
+                        time.sleep(.01)
+                    release.set()
+                    self.assertEqual(expected, leader.result())
+                    self.assertEqual(expected, follower.result())
+                # Concurrent misses were coalesced into one lookup
+                self.assertEqual(1, _get.call_count)
+                self.assertEqual(1, plugin.list_source_ids.call_count)
+                # A subsequent request is served by the local cache
+                self.assertEqual(expected, service.list_source_ids('cat', None))
+                self.assertEqual(1, _get.call_count)
+                # An expired local entry is refreshed from the shared cache
+                time.sleep(self.wait + 1)
+                self.assertEqual(expected, service.list_source_ids('cat', None))
+                self.assertEqual(2, _get.call_count)
+                self.assertEqual(1, plugin.list_source_ids.call_count)
@@ -36,6 +36,8 @@ import azul.openapi.schema
 import azul.plugins.metadata.hca.indexer.transform
 import azul.plugins.metadata.hca.service.contributor_matrices
 import azul.plugins.repository.canned
+import azul.plugins.repository.tdr
+import azul.plugins.repository.tdr_anvil
 import azul.plugins.repository.tdr_hca
 import azul.service.drs_controller
 import azul.service.manifest_service
@@ -87,6 +89,8 @@ def load_tests(_loader, tests, _ignore):
         azul.openapi.schema,
         azul.plugins.metadata.hca.service.contributor_matrices,
         azul.plugins.repository.canned,
+        azul.plugins.repository.tdr,
+        azul.plugins.repository.tdr_anvil,
         azul.plugins.repository.tdr_hca,
         azul.plugins.metadata.hca.indexer.transform,
         azul.service.drs_controller,
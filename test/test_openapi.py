@@ -102,10 +102,12 @@ class TestAppSpecs(AzulUnitTestCase):
             'get': {'c': 'd'}
         }
 
+        @app.route('/foo', methods=['GET'], path_spec=path_spec, method_spec={'e': 'f'})
+        def route():
+            pass  # no coverage
+
         with self.assertRaises(AssertionError) as cm:
-            @app.route('/foo', methods=['GET'], path_spec=path_spec, method_spec={'e': 'f'})
-            def route():
-                pass  # no coverage
+            app.spec()
         self.assertEqual(str(cm.exception), 'Only specify method_spec once per route path and method')
 
     def test_multiple_routes(self):
@@ -157,6 +159,39 @@ class TestAppSpecs(AzulUnitTestCase):
                 pass
         self.assertEqual(str(cm.exception), 'Only specify path_spec once per route path')
 
+    def test_lazy_specs(self):
+        calls = []
+
+        def spec(name: str, value: str):
+            def f():
+                calls.append(name)
+                return {name: value}
+
+            return f
+
+        app = self.app(spec('foo', 'bar'))
+
+        @app.route('/foo', methods=['GET', 'PUT'], path_spec=spec('a', 'b'), method_spec=spec('c', 'd'))
+        def route():
+            pass  # no coverage
+
+        self.assertEqual([], calls, 'Specs should not be built when routes are registered')
+        expected_spec = {
+            'foo': 'bar',
+            'paths': {
+                '/foo': {
+                    'a': 'b',
+                    'get': {'c': 'd'},
+                    'put': {'c': 'd'}
+                }
+            },
+            'tags': [],
+            'servers': [{'url': 'https://fake.url/'}]
+        }
+        self.assertEqual(app.spec(), expected_spec)
+        self.assertEqual(app.spec(), expected_spec)
+        self.assertEqual(['foo', 'a', 'c'], calls, 'Each spec should be built exactly once')
+
     def test_shared_path_spec(self):
         """
         Assert that, when sharing the path_spec, routes don't overwrite each